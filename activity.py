@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from db_pool import get_pool
+from log_queue import WriteBehindQueue
+
+# Types d'événements enregistrés sur les mémoires
+EVENT_TYPES = ("vue", "telechargement")
+
+INSERT_EVENT_QUERY = "INSERT INTO evenements (type, memoire_id, user_id, date) VALUES (?, ?, ?, ?)"
+
+
+class ActivityCollector(WriteBehindQueue):
+    """Consultations et téléchargements des mémoires, écrits par lots en arrière-plan.
+
+    Les compteurs quotidiens (evenements_quotidiens) sont tenus à jour par
+    trigger, dans la transaction qui insère les événements.
+    """
+
+    def __init__(self, db_path=None, config=None):
+        super().__init__(db_path, INSERT_EVENT_QUERY, config)
+
+    def record(self, event_type, memoire_id, user_id=None):
+        """Enregistre un événement (horodaté maintenant, écrit plus tard)."""
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Type d'événement inconnu : {event_type}")
+        self.put((event_type, memoire_id, user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+
+def top_memoires(db_path=None, event_type="vue", days=30, limit=10):
+    """Classement des mémoires par nombre d'événements sur les days derniers jours.
+
+    days=None : depuis le début. Retourne un DataFrame (id, titre, auteurs, nombre).
+    """
+    debut = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d") if days else ""
+    with get_pool(db_path).connection() as conn:
+        return pd.read_sql_query("""
+        SELECT m.id, m.titre, m.auteurs, t.nombre
+        FROM (
+            SELECT memoire_id, SUM(nb) AS nombre
+            FROM evenements_quotidiens
+            WHERE jour >= ? AND type = ?
+            GROUP BY memoire_id
+            ORDER BY nombre DESC
+            LIMIT ?
+        ) t
+        JOIN memoires m ON m.id = t.memoire_id
+        ORDER BY t.nombre DESC
+        """, conn, params=(debut, event_type, limit))
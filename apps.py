@@ -1,15 +1,29 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+import altair as alt
 import os
+import re
 import hashlib
 import uuid
-import base64
 from datetime import datetime
 from io import BytesIO
 import time
-from storage import FileStorage
+from storage import create_storage, FileCache
 from database import db
+from db_pool import get_connection
+from pdf_extraction import PdfExtractionPipeline
+from file_server import FileServer
+from migrations import run_migrations
+from reference_cache import reference_cache
+from statistiques import check_statistics, rebuild_statistics
+from bulk_import import MemoireImporter
+from tiering import TieringJob
+from wal_shipping import LocalReplica, WalShipper
+from log_retention import LogRetentionJob, list_archives, query_logs
+from activity import ActivityCollector, top_memoires
+from instrumentation import histogram, metrics
+from config import WAL_SHIPPING_CONFIG
 
 # Configuration du thème global
 st.markdown("""
@@ -186,105 +200,95 @@ os.makedirs("data/memoires", exist_ok=True)
 # Chemin de la base de données
 DB_PATH = "data/memoires_db.sqlite"
 
-# Initialiser le stockage de fichiers
-storage = FileStorage()
+# Initialiser le stockage de fichiers (local ou S3 selon le chemin, voir STORAGE_CONFIG)
+@st.cache_resource
+def get_storage():
+    """Un seul stockage par processus : ses verrous sérialisent compress, warm et delete_file."""
+    return create_storage(DB_PATH)
+
+storage = get_storage()
+
+# Cache LRU partagé des PDFs téléchargés depuis les résultats de recherche
+@st.cache_resource
+def get_file_cache():
+    """Un seul cache par processus, partagé par toutes les sessions et conservé entre les reruns."""
+    return FileCache(storage)
+
+file_cache = get_file_cache()
+
+# Serveur de fichiers pour la consultation et le téléchargement des PDFs
+@st.cache_resource
+def get_file_server():
+    """Un seul serveur par processus : un second ne pourrait pas ouvrir le même port."""
+    server = FileServer(storage)
+    server.start()
+    return server
+
+file_server = get_file_server()
+
+# Pipeline d'extraction du texte des PDFs (processus en arrière-plan)
+@st.cache_resource
+def get_pdf_pipeline():
+    """Une seule pipeline par processus : le script est réexécuté à chaque interaction."""
+    return PdfExtractionPipeline(DB_PATH, storage)
+
+pdf_pipeline = get_pdf_pipeline()
+memoire_importer = MemoireImporter(DB_PATH, storage)
+
+# Recompression des PDFs locaux peu consultés (si activée, voir STORAGE_CONFIG["cold_tier"])
+@st.cache_resource
+def get_tiering_job():
+    """Un seul passage périodique par processus, sur le stockage partagé."""
+    job = TieringJob(storage.backends["local"], DB_PATH)
+    job.start()
+    return job
+
+tiering_job = get_tiering_job()
+
+# Sauvegarde continue de la base (si activée, voir WAL_SHIPPING_CONFIG)
+@st.cache_resource
+def get_wal_shipper():
+    """Un seul envoi par base et par processus : chaque instance suivrait sa propre
+    génération et supprimerait celles des autres (voir _prune_generations)."""
+    shipper = WalShipper(DB_PATH, LocalReplica(WAL_SHIPPING_CONFIG["replica_dir"]))
+    shipper.start()
+    return shipper
+
+wal_shipper = get_wal_shipper()
+
+# Archivage mensuel des anciens logs (voir LOG_RETENTION_CONFIG)
+@st.cache_resource
+def get_log_retention_job():
+    """Un seul archivage par processus : deux threads traiteraient les mêmes lots."""
+    job = LogRetentionJob(DB_PATH)
+    job.start()
+    return job
+
+log_retention_job = get_log_retention_job()
+
+# Consultations et téléchargements des mémoires, écrits par lots
+@st.cache_resource
+def get_activity():
+    """Un seul thread d'écriture par processus, comme le journal de database.db."""
+    collector = ActivityCollector(DB_PATH)
+    collector.start()
+    return collector
+
+activity = get_activity()
 
 # Fonction pour initialiser la base de données
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Créer la table utilisateurs si elle n'existe pas
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS utilisateurs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nom TEXT NOT NULL,
-        prenom TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        mot_de_passe TEXT NOT NULL,
-        role TEXT NOT NULL DEFAULT 'user',
-        date_naissance TEXT,
-        genre TEXT,
-        telephone TEXT,
-        date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Création de la table entites
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS entites (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nom TEXT NOT NULL UNIQUE
-    )
-    ''')
-    
-    # Création de la table filieres
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS filieres (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nom TEXT NOT NULL,
-        entite_id INTEGER NOT NULL,
-        FOREIGN KEY (entite_id) REFERENCES entites (id),
-        UNIQUE(nom, entite_id)
-    )
-    ''')
-    
-    # Création de la table sessions
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS sessions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        annee_universitaire TEXT NOT NULL UNIQUE
-    )
-    ''')
-    
-    # Création de la table memoires
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS memoires (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        titre TEXT NOT NULL,
-        auteurs TEXT NOT NULL,
-        encadreur TEXT NOT NULL,
-        resume TEXT,
-        fichier_url TEXT NOT NULL,
-        tags TEXT,
-        filiere_id INTEGER NOT NULL,
-        session_id INTEGER NOT NULL,
-        version TEXT,
-        date_ajout TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (filiere_id) REFERENCES filieres (id),
-        FOREIGN KEY (session_id) REFERENCES sessions (id)
-    )
-    ''')
-    
-    # Création de la table favoris
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS favoris (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        memoire_id INTEGER NOT NULL,
-        date_ajout TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES utilisateurs (id),
-        FOREIGN KEY (memoire_id) REFERENCES memoires (id),
-        UNIQUE(user_id, memoire_id)
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    """Met le schéma à jour (voir migrations.py)."""
+    run_migrations(DB_PATH)
 
 # Fonction pour ajouter un log
 def add_log(action, user_id=None):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("INSERT INTO logs (action, user_id, date) VALUES (?, ?, ?)", 
-             (action, user_id, date_now))
-    conn.commit()
-    conn.close()
+    # Écriture différée, par lots (voir log_queue.py)
+    db.add_log(action, user_id)
 
 # Fonction pour vérifier l'authentification
 def check_auth(email, password):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     
     try:
@@ -313,11 +317,12 @@ def check_auth(email, password):
 
 # Fonction pour ajouter une entité
 def add_entity(nom):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     try:
         c.execute("INSERT INTO entites (nom) VALUES (?)", (nom,))
         conn.commit()
+        reference_cache.invalidate()
         result = True
     except sqlite3.IntegrityError:
         result = False
@@ -326,14 +331,16 @@ def add_entity(nom):
 
 # Fonction pour récupérer toutes les entités
 def get_all_entities():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM entites ORDER BY nom", conn)
-    conn.close()
-    return df
+    def load():
+        conn = get_connection(DB_PATH)
+        df = pd.read_sql_query("SELECT * FROM entites ORDER BY nom", conn)
+        conn.close()
+        return df
+    return reference_cache.get("entites", load)
 
 # Fonction pour supprimer une entité
 def delete_entity(entity_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     # Vérifier si l'entité est utilisée dans une filière
     c.execute("SELECT COUNT(*) FROM filieres WHERE entite_id=?", (entity_id,))
@@ -346,15 +353,17 @@ def delete_entity(entity_id):
     c.execute("DELETE FROM entites WHERE id=?", (entity_id,))
     conn.commit()
     conn.close()
+    reference_cache.invalidate()
     return True, "Entité supprimée avec succès."
 
 # Fonction pour ajouter une filière
 def add_filiere(nom, entite_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     try:
         c.execute("INSERT INTO filieres (nom, entite_id) VALUES (?, ?)", (nom, entite_id))
         conn.commit()
+        reference_cache.invalidate()
         result = True, "Filière ajoutée avec succès."
     except sqlite3.IntegrityError:
         result = False, "Cette filière existe déjà pour cette entité."
@@ -363,20 +372,22 @@ def add_filiere(nom, entite_id):
 
 # Fonction pour récupérer toutes les filières
 def get_all_filieres():
-    conn = sqlite3.connect(DB_PATH)
-    query = """
-    SELECT f.id, f.nom, e.nom as entite_nom, f.entite_id 
-    FROM filieres f 
-    JOIN entites e ON f.entite_id = e.id 
-    ORDER BY e.nom, f.nom
-    """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    def load():
+        conn = get_connection(DB_PATH)
+        query = """
+        SELECT f.id, f.nom, e.nom as entite_nom, f.entite_id 
+        FROM filieres f 
+        JOIN entites e ON f.entite_id = e.id 
+        ORDER BY e.nom, f.nom
+        """
+        df = pd.read_sql_query(query, conn)
+        conn.close()
+        return df
+    return reference_cache.get("filieres", load)
 
 # Fonction pour supprimer une filière
 def delete_filiere(filiere_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     # Vérifier si la filière est utilisée dans un mémoire
     c.execute("SELECT COUNT(*) FROM memoires WHERE filiere_id=?", (filiere_id,))
@@ -389,15 +400,17 @@ def delete_filiere(filiere_id):
     c.execute("DELETE FROM filieres WHERE id=?", (filiere_id,))
     conn.commit()
     conn.close()
+    reference_cache.invalidate()
     return True, "Filière supprimée avec succès."
 
 # Fonction pour ajouter une session
 def add_session(annee):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     try:
         c.execute("INSERT INTO sessions (annee_universitaire) VALUES (?)", (annee,))
         conn.commit()
+        reference_cache.invalidate()
         result = True, "Session ajoutée avec succès."
     except sqlite3.IntegrityError:
         result = False, "Cette session existe déjà."
@@ -406,14 +419,16 @@ def add_session(annee):
 
 # Fonction pour récupérer toutes les sessions
 def get_all_sessions():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM sessions ORDER BY annee_universitaire DESC", conn)
-    conn.close()
-    return df
+    def load():
+        conn = get_connection(DB_PATH)
+        df = pd.read_sql_query("SELECT * FROM sessions ORDER BY annee_universitaire DESC", conn)
+        conn.close()
+        return df
+    return reference_cache.get("sessions", load)
 
 # Fonction pour supprimer une session
 def delete_session(session_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     # Vérifier si la session est utilisée dans un mémoire
     c.execute("SELECT COUNT(*) FROM memoires WHERE session_id=?", (session_id,))
@@ -426,6 +441,7 @@ def delete_session(session_id):
     c.execute("DELETE FROM sessions WHERE id=?", (session_id,))
     conn.commit()
     conn.close()
+    reference_cache.invalidate()
     return True, "Session supprimée avec succès."
 
 # Fonction pour sauvegarder un fichier PDF
@@ -438,31 +454,17 @@ def save_pdf(uploaded_file, filename):
 # Fonction pour sauvegarder le contenu d'un PDF dans la base de données
 def save_pdf_content(memoire_id, pdf_content):
     """Sauvegarde le contenu du PDF dans la base de données."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
     try:
-        # Supprimer l'ancien contenu s'il existe
-        c.execute("DELETE FROM pdf_content WHERE memoire_id = ?", (memoire_id,))
-        
-        # Insérer le nouveau contenu
-        for page in pdf_content:
-            c.execute("""
-            INSERT INTO pdf_content (memoire_id, page_num, content)
-            VALUES (?, ?, ?)
-            """, (memoire_id, page['page_num'], page['text']))
-        
-        conn.commit()
-        return True
+        pages = [(page['page_num'], page['text']) for page in pdf_content]
+        return pdf_pipeline.store_pages(memoire_id, pages)
     except Exception as e:
         st.error(f"Erreur lors de la sauvegarde du contenu: {str(e)}")
         return False
-    finally:
-        conn.close()
 
 # Fonction pour ajouter un mémoire
-def add_memoire(titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version):
-    conn = sqlite3.connect(DB_PATH)
+def add_memoire(titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version, fichier=None):
+    """fichier : PDF d'origine, réécrit s'il a été supprimé depuis sa sauvegarde (voir ensure_stored)."""
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     try:
         date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -473,17 +475,24 @@ def add_memoire(titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id
         (titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version, date_ajout) 
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version, date_now))
+        memoire_id = c.lastrowid
+        if fichier is not None:
+            storage.ensure_stored(fichier_url, fichier)
         
         conn.commit()
         result = True, "Mémoire ajouté avec succès."
     except Exception as e:
         result = False, f"Erreur lors de l'ajout du mémoire: {str(e)}"
     conn.close()
+    
+    # L'extraction du texte se fait en arrière-plan
+    if result[0]:
+        pdf_pipeline.enqueue(memoire_id, fichier_url)
     return result
 
 # Fonction pour récupérer tous les mémoires
 def get_all_memoires():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     query = """
     SELECT m.id, m.titre, m.auteurs, m.encadreur, m.resume, m.fichier_url, m.tags, 
            f.nom as filiere_nom, s.annee_universitaire, m.version, m.date_ajout,
@@ -505,7 +514,7 @@ def get_all_memoires():
 
 # Fonction pour supprimer un mémoire
 def delete_memoire(memoire_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     
     try:
@@ -514,26 +523,28 @@ def delete_memoire(memoire_id):
         result = c.fetchone()
         
         if result is None:
-            conn.close()
             return False, f"Mémoire avec ID {memoire_id} non trouvé dans la base de données."
         
         file_path = result[1]
         
-        # Supprimer d'abord les références dans la table favoris
+        # Supprimer d'abord les références dans les tables favoris et texte extrait
         c.execute("DELETE FROM favoris WHERE memoire_id = ?", (memoire_id,))
+        c.execute("DELETE FROM pdf_content WHERE memoire_id = ?", (memoire_id,))
+        c.execute("DELETE FROM extraction_jobs WHERE memoire_id = ?", (memoire_id,))
         
         # Supprimer le mémoire de la base de données
         c.execute("DELETE FROM memoires WHERE id = ?", (memoire_id,))
+        conn.commit()
         
-        # Supprimer le fichier PDF si nécessaire
-        if file_path and file_path.startswith("local://"):
+        # Supprimer le fichier PDF s'il n'est plus référencé (fichiers partagés entre doublons)
+        if file_path and storage.supports(file_path):
             try:
-                storage.delete_file(file_path)
+                if storage.delete_file(file_path):
+                    file_cache.invalidate(file_path)
             except Exception as e:
                 print(f"Avertissement: Erreur lors de la suppression du fichier: {e}")
                 # On continue même si la suppression du fichier échoue
         
-        conn.commit()
         return True, "Mémoire supprimé avec succès."
         
     except Exception as e:
@@ -542,21 +553,53 @@ def delete_memoire(memoire_id):
     finally:
         conn.close()
 
-# Fonction pour rechercher des mémoires
-def search_memoires(query, entity=None, filiere=None, session=None):
-    conn = sqlite3.connect(DB_PATH)
+# Fonction pour convertir une saisie utilisateur en requête FTS5
+def build_fts_query(query):
+    """Transforme la saisie en termes FTS5 préfixés (tous les termes sont requis)."""
+    terms = re.findall(r"\w+", query or "")
+    return " ".join(f'"{term}"*' for term in terms)
+
+# Colonnes retournées par les listes de mémoires
+MEMOIRE_COLUMNS = """
+    m.id, m.titre, m.auteurs, m.encadreur, m.resume, m.fichier_url, m.tags, 
+    f.nom as filiere_nom, s.annee_universitaire, m.version, m.date_ajout,
+    e.nom as entite_nom
+"""
+
+# Fonction pour construire les clauses communes aux recherches de mémoires
+def build_memoires_search(query, entity=None, filiere=None, session=None):
+    """
+    Retourne (clause FROM, conditions, paramètres, classé) pour une recherche.
     
+    Avec une saisie texte, la clause expose r.score (BM25, plus petit = plus
+    pertinent) calculé sur l'index FTS5.
+    """
     conditions = []
     params = []
     
-    # Construire la condition de recherche texte
-    if query:
-        text_search = """
-        (m.titre LIKE ? OR m.auteurs LIKE ? OR m.encadreur LIKE ? OR m.resume LIKE ? OR m.tags LIKE ?)
-        """
-        for _ in range(5):
-            params.append(f"%{query}%")
-        conditions.append(text_search)
+    # Construire la condition de recherche texte sur l'index FTS5
+    fts_query = build_fts_query(query)
+    if fts_query:
+        # Classement BM25 (titre et mots-clés pondérés plus fortement que le résumé)
+        sql = """
+    FROM (
+        SELECT rowid as memoire_id, bm25(memoires_fts, 10.0, 5.0, 3.0, 1.0, 5.0) as score
+        FROM memoires_fts
+        WHERE memoires_fts MATCH ?
+    ) r
+    JOIN memoires m ON m.id = r.memoire_id
+    """
+        params.append(fts_query)
+    else:
+        sql = """
+    FROM memoires m
+    """
+    
+    sql += """
+    JOIN filieres f ON m.filiere_id = f.id
+    JOIN sessions s ON m.session_id = s.id
+    JOIN entites e ON f.entite_id = e.id
+    """
     
     # Ajouter les filtres supplémentaires
     if entity:
@@ -571,36 +614,101 @@ def search_memoires(query, entity=None, filiere=None, session=None):
         conditions.append("s.id = ?")
         params.append(session)
     
+    return sql, conditions, params, bool(fts_query)
+
+# Fonction pour rechercher des mémoires
+def search_memoires(query, entity=None, filiere=None, session=None):
+    conn = get_connection(DB_PATH)
+    
+    from_sql, conditions, params, ranked = build_memoires_search(query, entity, filiere, session)
+    
     # Construire la requête SQL
-    sql = """
-    SELECT m.id, m.titre, m.auteurs, m.encadreur, m.resume, m.fichier_url, m.tags, 
-           f.nom as filiere_nom, s.annee_universitaire, m.version, m.date_ajout,
-           e.nom as entite_nom
-    FROM memoires m
-    JOIN filieres f ON m.filiere_id = f.id
-    JOIN sessions s ON m.session_id = s.id
-    JOIN entites e ON f.entite_id = e.id
-    """
+    sql = "SELECT " + MEMOIRE_COLUMNS + from_sql
     
     if conditions:
         sql += " WHERE " + " AND ".join(conditions)
     
-    sql += " ORDER BY m.date_ajout DESC"
+    if ranked:
+        sql += " ORDER BY r.score, m.date_ajout DESC"
+    else:
+        sql += " ORDER BY m.date_ajout DESC"
     
     df = pd.read_sql_query(sql, conn, params=params)
     conn.close()
     return df
 
+# Fonction pour récupérer une page de mémoires (pagination par curseur)
+def search_memoires_page(query=None, entity=None, filiere=None, session=None, page_size=10, cursor=None):
+    """
+    Retourne (page, total, curseur suivant) pour une recherche de mémoires.
+    
+    La pagination se fait par curseur (keyset) : sans saisie texte, sur
+    (date_ajout, id) du plus récent au plus ancien ; avec saisie texte, sur
+    (score, id) par pertinence. Le curseur suivant vaut None sur la dernière page.
+    """
+    conn = get_connection(DB_PATH)
+    
+    try:
+        from_sql, conditions, params, ranked = build_memoires_search(query, entity, filiere, session)
+        
+        # Nombre total de résultats
+        count_sql = "SELECT COUNT(*)" + from_sql
+        if conditions:
+            count_sql += " WHERE " + " AND ".join(conditions)
+        c = conn.cursor()
+        c.execute(count_sql, params)
+        total = c.fetchone()[0]
+        
+        # Page courante, à partir du curseur
+        page_conditions = list(conditions)
+        page_params = list(params)
+        if cursor is not None:
+            if ranked:
+                page_conditions.append("(r.score, m.id) > (?, ?)")
+            else:
+                page_conditions.append("(m.date_ajout, m.id) < (?, ?)")
+            page_params.extend(cursor)
+        
+        sort_column = "r.score" if ranked else "m.date_ajout"
+        sql = "SELECT " + MEMOIRE_COLUMNS + f", {sort_column} as sort_key" + from_sql
+        if page_conditions:
+            sql += " WHERE " + " AND ".join(page_conditions)
+        if ranked:
+            sql += " ORDER BY r.score, m.id"
+        else:
+            sql += " ORDER BY m.date_ajout DESC, m.id DESC"
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        sql += " LIMIT ?"
+        page_params.append(page_size + 1)
+        
+        df = pd.read_sql_query(sql, conn, params=page_params)
+        
+        next_cursor = None
+        if len(df) > page_size:
+            df = df.iloc[:page_size]
+            last = df.iloc[-1]
+            sort_key = float(last['sort_key']) if ranked else last['sort_key']
+            next_cursor = (sort_key, int(last['id']))
+        
+        return df.drop(columns=['sort_key']), total, next_cursor
+    except Exception as e:
+        print(f"Erreur lors de la récupération des mémoires : {e}")
+        return pd.DataFrame(), 0, None
+    finally:
+        conn.close()
+
 # Fonction pour obtenir les filieres d'une entité
 def get_filieres_by_entity(entity_id):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT id, nom FROM filieres WHERE entite_id=? ORDER BY nom", conn, params=(entity_id,))
-    conn.close()
-    return df
+    def load():
+        conn = get_connection(DB_PATH)
+        df = pd.read_sql_query("SELECT id, nom FROM filieres WHERE entite_id=? ORDER BY nom", conn, params=(entity_id,))
+        conn.close()
+        return df
+    return reference_cache.get(("filieres_par_entite", str(entity_id)), load)
 
 # Fonction pour obtenir le détail d'un mémoire
 def get_memoire_details(memoire_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     query = """
     SELECT m.id, m.titre, m.auteurs, m.encadreur, m.resume, m.fichier_url, m.tags, 
            f.nom as filiere_nom, s.annee_universitaire, m.version, m.date_ajout,
@@ -618,16 +726,22 @@ def get_memoire_details(memoire_id):
     return None
 
 # Fonction pour mettre à jour un mémoire
-def update_memoire(memoire_id, titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version):
-    conn = sqlite3.connect(DB_PATH)
+def update_memoire(memoire_id, titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version, fichier=None):
+    """fichier : nouveau PDF d'origine, réécrit s'il a été supprimé depuis sa sauvegarde."""
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     try:
         if fichier_url:  # Nouveau fichier PDF
+            c.execute("SELECT fichier_url FROM memoires WHERE id=?", (memoire_id,))
+            row = c.fetchone()
+            old_fichier_url = row[0] if row else None
             c.execute("""
             UPDATE memoires 
             SET titre=?, auteurs=?, encadreur=?, resume=?, fichier_url=?, tags=?, filiere_id=?, session_id=?, version=?
             WHERE id=?
             """, (titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version, memoire_id))
+            if fichier is not None:
+                storage.ensure_stored(fichier_url, fichier)
         else:  # Pas de nouveau fichier PDF
             c.execute("""
             UPDATE memoires 
@@ -640,40 +754,49 @@ def update_memoire(memoire_id, titre, auteurs, encadreur, resume, fichier_url, t
     except Exception as e:
         result = False, f"Erreur lors de la mise à jour du mémoire: {str(e)}"
     conn.close()
+    
+    # Nouveau PDF : libérer l'ancien fichier et relancer l'extraction du texte
+    if result[0] and fichier_url:
+        if old_fichier_url and old_fichier_url != fichier_url and storage.delete_file(old_fichier_url):
+            file_cache.invalidate(old_fichier_url)
+        pdf_pipeline.enqueue(memoire_id, fichier_url)
     return result
 
 # Fonction pour obtenir les statistiques
 def get_statistics():
-    conn = sqlite3.connect(DB_PATH)
+    """Lit les compteurs de la table statistiques (maintenus par triggers)."""
+    conn = get_connection(DB_PATH)
     stats = {}
     
     # Nombre total de mémoires
-    stats['total_memoires'] = pd.read_sql_query("SELECT COUNT(*) as count FROM memoires", conn).iloc[0]['count']
+    stats['total_memoires'] = pd.read_sql_query("""
+    SELECT COALESCE(MAX(nombre), 0) as count FROM statistiques WHERE dimension = 'total'
+    """, conn).iloc[0]['count']
     
     # Nombre de mémoires par entité
     stats['memoires_par_entite'] = pd.read_sql_query("""
-    SELECT e.nom, COUNT(*) as count 
-    FROM memoires m
-    JOIN filieres f ON m.filiere_id = f.id
-    JOIN entites e ON f.entite_id = e.id
-    GROUP BY e.nom
+    SELECT e.nom, s.nombre as count 
+    FROM statistiques s
+    JOIN entites e ON s.cle = e.id
+    WHERE s.dimension = 'entite' AND s.nombre > 0
     ORDER BY count DESC
     """, conn)
     
     # Nombre de mémoires par année
     stats['memoires_par_annee'] = pd.read_sql_query("""
-    SELECT s.annee_universitaire, COUNT(*) as count 
-    FROM memoires m
-    JOIN sessions s ON m.session_id = s.id
-    GROUP BY s.annee_universitaire
-    ORDER BY s.annee_universitaire DESC
+    SELECT se.annee_universitaire, s.nombre as count 
+    FROM statistiques s
+    JOIN sessions se ON s.cle = se.id
+    WHERE s.dimension = 'session' AND s.nombre > 0
+    ORDER BY se.annee_universitaire DESC
     """, conn)
     
     # Nombre de mémoires par filière
     stats['memoires_par_filiere'] = pd.read_sql_query("""
-    SELECT f.nom, COUNT(*) as count 
-    FROM memoires m
-    JOIN filieres f ON m.filiere_id = f.id
+    SELECT f.nom, SUM(s.nombre) as count 
+    FROM statistiques s
+    JOIN filieres f ON s.cle = f.id
+    WHERE s.dimension = 'filiere' AND s.nombre > 0
     GROUP BY f.nom
     ORDER BY count DESC
     LIMIT 10
@@ -682,24 +805,31 @@ def get_statistics():
     conn.close()
     return stats
 
+# Fonction pour enregistrer une consultation ou un téléchargement
+def track_event(event_type, memoire_id, once=False):
+    """Enregistre une consultation ou un téléchargement de l'utilisateur courant.
+    
+    once : une seule fois par session (affichage répété à chaque rerun).
+    """
+    if once:
+        deja_vus = st.session_state.setdefault("evenements_enregistres", set())
+        if (event_type, memoire_id) in deja_vus:
+            return
+        deja_vus.add((event_type, memoire_id))
+    activity.record(event_type, memoire_id, st.session_state.get("user_id"))
+
 # Fonction pour afficher un PDF intégré
-def display_pdf(file_path):
-    """Affiche un PDF dans l'interface."""
+def display_pdf(file_path, memoire_id=None):
+    """Affiche un PDF dans l'interface via un lien signé vers son stockage."""
     try:
-        if file_path.startswith("local://"):
-            # Récupérer le contenu du fichier depuis le stockage local
-            pdf_content = storage.get_file(file_path)
-            if pdf_content:
-                # Créer un conteneur pour le PDF
-                pdf_container = st.empty()
-                
-                # Encoder le contenu en base64
-                b64 = base64.b64encode(pdf_content).decode('utf-8')
-                
-                # Créer l'iframe avec le PDF
+        if storage.supports(file_path):
+            if storage.exists(file_path):
+                if memoire_id is not None:
+                    track_event("vue", memoire_id, once=True)
+                # Le navigateur charge le PDF par plages d'octets (serveur de fichiers ou S3)
                 pdf_display = f'''
                     <iframe
-                        src="data:application/pdf;base64,{b64}"
+                        src="{storage.presign(file_path)}"
                         width="100%"
                         height="800px"
                         type="application/pdf"
@@ -710,31 +840,22 @@ def display_pdf(file_path):
                 '''
                 
                 # Afficher le PDF
-                pdf_container.markdown(pdf_display, unsafe_allow_html=True)
+                st.markdown(pdf_display, unsafe_allow_html=True)
             else:
                 st.error("Impossible de récupérer le fichier PDF. Veuillez vérifier que le fichier existe.")
         else:
-            st.error("Format de fichier non supporté. Le chemin doit commencer par 'local://'")
+            st.error("Format de fichier non supporté : aucun stockage configuré pour ce chemin.")
     except Exception as e:
         st.error(f"Erreur lors de l'affichage du PDF: {str(e)}")
 
 # Fonction pour créer un lien de téléchargement
 def get_download_link(file_path, label):
-    """Crée un lien de téléchargement pour un fichier PDF."""
+    """Crée un lien HTML de téléchargement signé vers le stockage du fichier."""
     try:
-        if file_path.startswith("local://"):
-            # Récupérer le contenu du fichier depuis le stockage local
-            file_content = storage.get_file(file_path)
-            if file_content:
-                # Extraire le nom du fichier original
-                filename = os.path.basename(file_path.replace("local://", ""))
-                # Utiliser le composant de téléchargement natif de Streamlit
-                return st.download_button(
-                    label=label,
-                    data=file_content,
-                    file_name=filename,
-                    mime="application/pdf"
-                )
+        if storage.supports(file_path):
+            if storage.exists(file_path):
+                url = storage.presign(file_path, download=True)
+                return f'<a href="{url}" target="_blank">{label}</a>'
             else:
                 st.error("Impossible de récupérer le fichier PDF")
                 return None
@@ -745,7 +866,7 @@ def get_download_link(file_path, label):
 
 # Fonction pour inscrire un visiteur
 def register_visitor(nom, prenom, email, password, date_naissance, genre, telephone):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     try:
         # Vérifier si l'email existe déjà
@@ -773,7 +894,7 @@ def register_visitor(nom, prenom, email, password, date_naissance, genre, teleph
 
 # Fonction pour vérifier si un email existe
 def check_email_exists(email):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     c.execute("SELECT id FROM utilisateurs WHERE email=?", (email,))
     result = c.fetchone()
@@ -782,7 +903,7 @@ def check_email_exists(email):
 
 # Fonction pour mettre à jour le mot de passe
 def update_password(email, new_password):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     
     # Vérifier si l'utilisateur est un administrateur
@@ -804,58 +925,88 @@ def update_password(email, new_password):
         return False, f"Erreur lors de la mise à jour du mot de passe: {str(e)}"
 
 # Fonction pour rechercher dans le contenu des PDFs
-def search_in_pdf_content(query):
-    """Recherche dans le contenu des PDFs."""
-    if not query:
+def search_in_pdf_content(query, limit=20, offset=0, pages_per_memoire=3):
+    """
+    Recherche dans le contenu des PDFs via l'index FTS5 page par page.
+    
+    Les résultats sont groupés par mémoire (classés par meilleure page) et
+    paginés avec limit/offset ; chaque mémoire renvoie au plus
+    pages_per_memoire pages, avec un extrait généré par SQLite.
+    """
+    fts_query = build_fts_query(query)
+    if not fts_query:
         return pd.DataFrame()
         
-    conn = sqlite3.connect(DB_PATH)
-    search_query = f"%{query}%"
+    conn = get_connection(DB_PATH)
     
     try:
+        # Seuls les identifiants et scores des pages sont classés ; les extraits
+        # ne sont calculés que pour les pages de la page de résultats courante.
         sql = """
-        SELECT DISTINCT m.id, m.titre, m.auteurs, m.encadreur, m.resume, m.fichier_url, 
+        WITH hits AS (
+            SELECT pdf_content_fts.rowid AS content_id, bm25(pdf_content_fts) AS score
+            FROM pdf_content_fts
+            WHERE pdf_content_fts MATCH ?
+        ),
+        ranked AS (
+            SELECT pc.memoire_id, pc.page_num, h.content_id,
+                   ROW_NUMBER() OVER (PARTITION BY pc.memoire_id ORDER BY h.score) AS page_rank,
+                   MIN(h.score) OVER (PARTITION BY pc.memoire_id) AS best_score,
+                   COUNT(*) OVER (PARTITION BY pc.memoire_id) AS pages_trouvees
+            FROM hits h
+            JOIN pdf_content pc ON pc.id = h.content_id
+        ),
+        selection AS (
+            SELECT memoire_id, best_score, pages_trouvees
+            FROM ranked
+            WHERE page_rank = 1
+            ORDER BY best_score, memoire_id
+            LIMIT ? OFFSET ?
+        )
+        SELECT m.id, m.titre, m.auteurs, m.encadreur, m.resume, m.fichier_url, 
                m.tags, f.nom as filiere_nom, s.annee_universitaire, m.version, 
                m.date_ajout, e.nom as entite_nom,
-               pc.page_num,
-               pc.content as full_content,
-               substr(pc.content, max(0, instr(lower(pc.content), lower(?)) - 100), 200) as context
-        FROM memoires m
+               r.page_num, sel.pages_trouvees,
+               snippet(pdf_content_fts, 0, '**', '**', '...', 32) as context
+        FROM selection sel
+        JOIN ranked r ON r.memoire_id = sel.memoire_id AND r.page_rank <= ?
+        JOIN pdf_content_fts ON pdf_content_fts.rowid = r.content_id
+        JOIN memoires m ON m.id = sel.memoire_id
         JOIN filieres f ON m.filiere_id = f.id
         JOIN sessions s ON m.session_id = s.id
         JOIN entites e ON f.entite_id = e.id
-        JOIN pdf_content pc ON m.id = pc.memoire_id
-        WHERE lower(pc.content) LIKE lower(?)
-        ORDER BY m.date_ajout DESC
+        WHERE pdf_content_fts MATCH ?
+        ORDER BY sel.best_score, sel.memoire_id, r.page_rank
         """
         
-        df = pd.read_sql_query(sql, conn, params=(query, search_query))
-        
-        if not df.empty:
-            # Améliorer l'affichage du contexte
-            def highlight_context(row):
-                text = row['full_content']
-                query_lower = query.lower()
-                start_idx = text.lower().find(query_lower)
-                if start_idx != -1:
-                    start = max(0, start_idx - 100)
-                    end = min(len(text), start_idx + len(query) + 100)
-                    context = text[start:end]
-                    # Mettre en évidence le terme recherché
-                    context = context.replace(query, f"**{query}**")
-                    return f"...{context}..."
-                return row['context']
-            
-            df['context'] = df.apply(highlight_context, axis=1)
-            df = df.drop('full_content', axis=1)
-        
-        return df
+        return pd.read_sql_query(
+            sql, conn, params=(fts_query, limit, offset, pages_per_memoire, fts_query)
+        )
     except Exception as e:
         st.error(f"Erreur lors de la recherche dans le contenu PDF : {str(e)}")
         return pd.DataFrame()
     finally:
         conn.close()
 
+# Fonction pour compter les mémoires dont le contenu correspond à la recherche
+def count_pdf_content_matches(query):
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        return 0
+    
+    conn = get_connection(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute("""
+        SELECT COUNT(DISTINCT pc.memoire_id)
+        FROM pdf_content_fts
+        JOIN pdf_content pc ON pc.id = pdf_content_fts.rowid
+        WHERE pdf_content_fts MATCH ?
+        """, (fts_query,))
+        return c.fetchone()[0]
+    finally:
+        conn.close()
+
 def bulk_import_memoires(metadata_file, pdf_folder):
     """
     Importe en masse des mémoires à partir d'un fichier Excel/CSV et d'un dossier de PDFs.
@@ -879,8 +1030,7 @@ def bulk_import_memoires(metadata_file, pdf_folder):
             df = pd.read_excel(metadata_file)
         
         # Connexion à la base de données
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
+        conn = get_connection(DB_PATH)
         
         # Récupération des mappings filières et sessions
         filieres_df = pd.read_sql("SELECT id, nom FROM filieres", conn)
@@ -889,75 +1039,15 @@ def bulk_import_memoires(metadata_file, pdf_folder):
         sessions_df = pd.read_sql("SELECT id, annee_universitaire FROM sessions", conn)
         sessions_map = dict(zip(sessions_df['annee_universitaire'], sessions_df['id']))
         
-        # Compteurs pour le rapport
-        success_count = 0
-        error_count = 0
-        errors = []
+        conn.close()
         
-        # Traitement de chaque ligne
-        for idx, row in df.iterrows():
-            try:
-                # Vérification des champs obligatoires
-                if pd.isna(row['titre']) or pd.isna(row['auteurs']) or pd.isna(row['encadreur']) or \
-                   pd.isna(row['resume']) or pd.isna(row['filiere_nom']) or \
-                   pd.isna(row['annee_universitaire']) or pd.isna(row['nom_fichier']):
-                    raise ValueError(f"Ligne {idx+2}: Champs obligatoires manquants")
-                
-                # Vérification de l'existence de la filière
-                if row['filiere_nom'] not in filieres_map:
-                    raise ValueError(f"Ligne {idx+2}: Filière '{row['filiere_nom']}' non trouvée")
-                
-                # Vérification de l'existence de la session
-                if row['annee_universitaire'] not in sessions_map:
-                    raise ValueError(f"Ligne {idx+2}: Année universitaire '{row['annee_universitaire']}' non trouvée")
-                
-                # Vérification et traitement du fichier PDF
-                pdf_path = os.path.join(pdf_folder, row['nom_fichier'])
-                if not os.path.exists(pdf_path):
-                    raise ValueError(f"Ligne {idx+2}: Fichier PDF '{row['nom_fichier']}' non trouvé")
-                
-                # Copie et enregistrement du PDF
-                with open(pdf_path, 'rb') as pdf_file:
-                    new_filename = f"{uuid.uuid4()}.pdf"
-                    success, stored_path = storage.save_file(pdf_file, new_filename)
-                    
-                    if not success:
-                        raise ValueError(f"Ligne {idx+2}: Erreur lors de l'enregistrement du PDF")
-                
-                # Insertion dans la base de données
-                date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                c.execute("""
-                INSERT INTO memoires 
-                (titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version, date_ajout)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    row['titre'],
-                    row['auteurs'],
-                    row['encadreur'],
-                    row['resume'],
-                    stored_path,
-                    row.get('tags', ''),
-                    filieres_map[row['filiere_nom']],
-                    sessions_map[row['annee_universitaire']],
-                    row.get('version', ''),
-                    date_now
-                ))
-                
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                errors.append(str(e))
-                continue
+        # Validation, copie des PDFs et insertion par lots (voir bulk_import.py)
+        report = memoire_importer.run(df, pdf_folder, filieres_map, sessions_map)
         
-        conn.commit()
-        conn.close()
+        # Planifier l'extraction du texte des mémoires importés
+        pdf_pipeline.enqueue_missing()
         
-        return True, {
-            'success_count': success_count,
-            'error_count': error_count,
-            'errors': errors
-        }
+        return True, report
         
     except Exception as e:
         return False, str(e)
@@ -972,7 +1062,7 @@ def bulk_import_structure_and_memoires(structure_file, metadata_file, pdf_folder
     - sessions: annee_universitaire
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH)
         c = conn.cursor()
         
         # 1. Import des entités
@@ -1029,6 +1119,7 @@ def bulk_import_structure_and_memoires(structure_file, metadata_file, pdf_folder
                 sessions_map[row['annee_universitaire']] = c.fetchone()[0]
         
         conn.commit()
+        reference_cache.invalidate()
         
         # 4. Import des mémoires
         if metadata_file.name.endswith('.csv'):
@@ -1036,68 +1127,22 @@ def bulk_import_structure_and_memoires(structure_file, metadata_file, pdf_folder
         else:
             memoires_df = pd.read_excel(metadata_file)
         
-        success_count = 0
-        error_count = 0
-        errors = []
+        conn.close()
         
-        for idx, row in memoires_df.iterrows():
-            try:
-                # Vérification des champs obligatoires
-                if pd.isna(row['titre']) or pd.isna(row['auteurs']) or \
-                   pd.isna(row['encadreur']) or pd.isna(row['resume']) or \
-                   pd.isna(row['filiere_nom']) or pd.isna(row['annee_universitaire']) or \
-                   pd.isna(row['nom_fichier']):
-                    raise ValueError(f"Ligne {idx+2}: Champs obligatoires manquants")
-                
-                # Vérification du fichier PDF
-                pdf_path = os.path.join(pdf_folder, row['nom_fichier'])
-                if not os.path.exists(pdf_path):
-                    raise ValueError(f"Ligne {idx+2}: Fichier PDF '{row['nom_fichier']}' non trouvé")
-                
-                # Copie et enregistrement du PDF
-                with open(pdf_path, 'rb') as pdf_file:
-                    new_filename = f"{uuid.uuid4()}.pdf"
-                    success, stored_path = storage.save_file(pdf_file, new_filename)
-                    
-                    if not success:
-                        raise ValueError(f"Ligne {idx+2}: Erreur lors de l'enregistrement du PDF")
-                
-                # Insertion du mémoire
-                date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                c.execute("""
-                INSERT INTO memoires 
-                (titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version, date_ajout)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    row['titre'],
-                    row['auteurs'],
-                    row['encadreur'],
-                    row['resume'],
-                    stored_path,
-                    row.get('tags', ''),
-                    filieres_map[row['filiere_nom']],
-                    sessions_map[row['annee_universitaire']],
-                    row.get('version', ''),
-                    date_now
-                ))
-                
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                errors.append(str(e))
-                continue
+        # Validation, copie des PDFs et insertion par lots (voir bulk_import.py)
+        report = memoire_importer.run(memoires_df, pdf_folder, filieres_map, sessions_map)
         
-        conn.commit()
-        conn.close()
+        # Planifier l'extraction du texte des mémoires importés
+        pdf_pipeline.enqueue_missing()
         
         return True, {
             'entites_count': len(entites_map),
             'filieres_count': len(filieres_map),
             'sessions_count': len(sessions_map),
-            'memoires_success': success_count,
-            'memoires_error': error_count,
-            'errors': errors
+            'memoires_success': report['success_count'],
+            'memoires_skipped': report['skipped_count'],
+            'memoires_error': report['error_count'],
+            'errors': report['errors']
         }
         
     except Exception as e:
@@ -1108,6 +1153,9 @@ def bulk_import_structure_and_memoires(structure_file, metadata_file, pdf_folder
 # Initialiser la base de données
 init_db()
 
+# Reprendre les extractions interrompues par un redémarrage (au premier passage du processus)
+pdf_pipeline.resume_interrupted()
+
 # Session state pour l'authentification
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
@@ -1130,14 +1178,16 @@ def main():
     
     # Affichage conditionnel en fonction de l'authentification
     if not st.session_state.logged_in:
-        show_login_page()
+        with metrics.page_timer("Connexion"):
+            show_login_page()
     else:
         # Menu pour l'administrateur ou l'utilisateur normal
         with st.sidebar:
             if st.session_state.user_role == "admin":
                 menu = st.radio("Navigation", 
                     ["Accueil", "Recherche", "Statistiques", "Gestion des Entités", 
-                    "Gestion des Filières", "Gestion des Sessions", "Gestion des Mémoires", "Journal d'activité"])
+                    "Gestion des Filières", "Gestion des Sessions", "Gestion des Mémoires", "Journal d'activité",
+                    "Performance"])
             else:
                 menu = st.radio("Navigation", ["Accueil", "Recherche", "Statistiques"])
             
@@ -1153,7 +1203,7 @@ def main():
         # Création d'un conteneur principal pour le contenu
         main_container = st.container()
         
-        with main_container:
+        with main_container, metrics.page_timer(menu):
             # Navigation vers les différentes pages
             if menu == "Accueil":
                 show_home_page()
@@ -1171,6 +1221,8 @@ def main():
                 show_memoires_management()
             elif menu == "Journal d'activité" and st.session_state.user_role == "admin":
                 show_logs()
+            elif menu == "Performance" and st.session_state.user_role == "admin":
+                show_performance_page()
 
 def show_login_page():
     # Initialisation des variables de session si elles n'existent pas
@@ -1417,12 +1469,49 @@ def show_subtitle(text):
     """Fonction utilitaire pour afficher un sous-titre"""
     st.markdown(f'<h2 class="subtitle-text">{text}</h2>', unsafe_allow_html=True)
 
+def show_memoires_pagination(key, query=None, entity=None, filiere=None, session=None, page_size=10):
+    """
+    Récupère la page courante d'une recherche et affiche les boutons de navigation.
+    
+    Les curseurs des pages déjà vues sont conservés dans st.session_state[key]
+    pour pouvoir revenir en arrière ; ils sont réinitialisés quand la recherche change.
+    Retourne (page de mémoires, total).
+    """
+    search_params = (query, entity, filiere, session)
+    state = st.session_state.get(key)
+    if state is None or state['params'] != search_params:
+        state = {'params': search_params, 'cursors': [None]}
+        st.session_state[key] = state
+    
+    memoires, total, next_cursor = search_memoires_page(
+        query, entity, filiere, session, page_size=page_size, cursor=state['cursors'][-1]
+    )
+    
+    if total > page_size:
+        total_pages = (total + page_size - 1) // page_size
+        col1, col2, col3 = st.columns([1, 3, 1])
+        
+        with col1:
+            if st.button("◀️ Précédent", key=f"{key}_prev") and len(state['cursors']) > 1:
+                state['cursors'].pop()
+                st.rerun()
+        
+        with col2:
+            st.write(f"Page {len(state['cursors'])}/{total_pages}")
+        
+        with col3:
+            if st.button("Suivant ▶️", key=f"{key}_next") and next_cursor is not None:
+                state['cursors'].append(next_cursor)
+                st.rerun()
+    
+    return memoires, total
+
 def show_home_page():
     st.header("📚 Plateforme de Gestion des Mémoires Universitaires")
     st.write("Bienvenue sur la plateforme centrale des mémoires de soutenance de l'université.")
     
     st.subheader("Derniers mémoires ajoutés")
-    latest_memoires = get_all_memoires().head(5)
+    latest_memoires, _, _ = search_memoires_page(page_size=5)
     
     if len(latest_memoires) == 0:
         st.info("Aucun mémoire n'a encore été ajouté.")
@@ -1475,13 +1564,15 @@ def show_memoire_details(memoire_id):
     
     # Afficher les actions
     st.subheader("Actions")
-    if memoire['fichier_url'].startswith("local://"):
+    if storage.supports(memoire['fichier_url']):
         action_col1, action_col2 = st.columns(2)
         with action_col1:
-            st.markdown(get_download_link(memoire['fichier_url'], "📥 Télécharger le PDF"), unsafe_allow_html=True)
+            if st.button("📥 Télécharger le PDF"):
+                track_event("telechargement", memoire['id'])
+                st.markdown(get_download_link(memoire['fichier_url'], "Télécharger le PDF"), unsafe_allow_html=True)
         with action_col2:
             if st.button("📄 Consulter en ligne"):
-                display_pdf(memoire['fichier_url'])
+                display_pdf(memoire['fichier_url'], memoire['id'])
 
 def show_search_page():
     st.header("🔍 Recherche de Mémoires")
@@ -1497,6 +1588,8 @@ def show_search_page():
         with col2:
             search_button = st.button("🔍 Rechercher")
         
+        search_in_content = st.checkbox("Rechercher aussi dans le contenu des PDFs", key="search_in_content")
+        
         # Filtres avancés
         with st.expander("Filtres avancés"):
             filter_col1, filter_col2, filter_col3 = st.columns(3)
@@ -1534,12 +1627,18 @@ def show_search_page():
         
         # Exécution de la recherche
         if search_button or search_query:
-            results = search_memoires(search_query, 
-                                    selected_entity if selected_entity else None,
-                                    selected_filiere if selected_filiere else None,
-                                    selected_session if selected_session else None)
+            st.subheader("Résultats")
+            results, total = show_memoires_pagination(
+                "search_pagination",
+                search_query,
+                selected_entity if selected_entity else None,
+                selected_filiere if selected_filiere else None,
+                selected_session if selected_session else None
+            )
             
-            st.subheader(f"Résultats ({len(results)} mémoires trouvés)")
+            st.write(f"{total} mémoires trouvés.")
+            if build_fts_query(search_query):
+                st.caption("Résultats classés par pertinence (titre, auteurs, encadreur, résumé, mots-clés).")
             
             if len(results) == 0:
                 st.info("Aucun mémoire ne correspond à votre recherche.")
@@ -1558,19 +1657,28 @@ def show_search_page():
                             # Créer des colonnes pour les actions
                             action_cols = st.columns([1, 1])
                             
-                            # Colonne pour le téléchargement
+                            # Colonne pour le téléchargement (fichier lu seulement à la demande)
                             with action_cols[0]:
-                                if memoire['fichier_url'].startswith("local://"):
-                                    file_content = storage.get_file(memoire['fichier_url'])
-                                    if file_content:
-                                        filename = os.path.basename(memoire['fichier_url'].replace("local://", ""))
-                                        st.download_button(
-                                            "📥 Télécharger le PDF",
-                                            data=file_content,
-                                            file_name=filename,
-                                            mime="application/pdf",
-                                            key=f"download_{memoire['id']}"
-                                        )
+                                if storage.supports(memoire['fichier_url']):
+                                    prepare_key = f"prepare_download_{memoire['id']}"
+                                    if st.session_state.get(prepare_key, False):
+                                        file_content = file_cache.get(memoire['fichier_url'])
+                                        if file_content:
+                                            filename = os.path.basename(memoire['fichier_url'])
+                                            st.download_button(
+                                                "📥 Télécharger le PDF",
+                                                data=file_content,
+                                                file_name=filename,
+                                                mime="application/pdf",
+                                                key=f"download_{memoire['id']}",
+                                                on_click=track_event,
+                                                args=("telechargement", memoire['id'])
+                                            )
+                                        else:
+                                            st.error("Impossible de récupérer le fichier PDF")
+                                    elif st.button("📥 Préparer le téléchargement", key=f"prepare_{memoire['id']}", use_container_width=True):
+                                        st.session_state[prepare_key] = True
+                                        st.rerun()
                             
                             # Colonne pour la consultation
                             with action_cols[1]:
@@ -1579,7 +1687,49 @@ def show_search_page():
                             
                             # Afficher le PDF si demandé
                             if st.session_state.get(f"show_pdf_{memoire['id']}", False):
-                                display_pdf(memoire['fichier_url'])
+                                display_pdf(memoire['fichier_url'], memoire['id'])
+            
+            # Recherche dans le contenu des PDFs
+            if search_in_content and search_query:
+                show_pdf_content_results(search_query)
+
+def show_pdf_content_results(search_query):
+    """Affiche les pages de PDFs correspondant à la recherche, paginées par mémoire."""
+    results_per_page = 10
+    
+    # Revenir à la première page quand la recherche change
+    if st.session_state.get('content_search_query') != search_query:
+        st.session_state.content_search_query = search_query
+        st.session_state.content_search_page = 1
+    
+    total = count_pdf_content_matches(search_query)
+    st.subheader(f"Dans le contenu des PDFs ({total} mémoires trouvés)")
+    
+    if total == 0:
+        st.info("Aucune page de PDF ne correspond à votre recherche.")
+        return
+    
+    total_pages = (total + results_per_page - 1) // results_per_page
+    
+    col1, col2, col3 = st.columns([1, 3, 1])
+    with col1:
+        if st.button("◀️ Précédent", key="content_prev") and st.session_state.content_search_page > 1:
+            st.session_state.content_search_page -= 1
+    with col3:
+        if st.button("Suivant ▶️", key="content_next") and st.session_state.content_search_page < total_pages:
+            st.session_state.content_search_page += 1
+    with col2:
+        st.write(f"Page {st.session_state.content_search_page}/{total_pages}")
+    
+    offset = (st.session_state.content_search_page - 1) * results_per_page
+    pages = search_in_pdf_content(search_query, limit=results_per_page, offset=offset)
+    
+    for memoire_id, memoire_pages in pages.groupby('id', sort=False):
+        memoire = memoire_pages.iloc[0]
+        with st.expander(f"{memoire['titre']} - {memoire['auteurs']} ({memoire['pages_trouvees']} page(s) correspondante(s))"):
+            st.write(f"**Filière:** {memoire['filiere_nom']} - {memoire['entite_nom']}")
+            for _, page in memoire_pages.iterrows():
+                st.markdown(f"**Page {page['page_num']}** : {page['context']}")
 
 def show_statistics_page():
     st.header("📊 Statistiques")
@@ -1614,6 +1764,33 @@ def show_statistics_page():
                 st.bar_chart(chart_data.set_index('annee_universitaire'))
             else:
                 st.info("Aucune donnée disponible")
+        
+        st.subheader("Mémoires les plus consultés et téléchargés")
+        periodes = {"7 derniers jours": 7, "30 derniers jours": 30, "12 derniers mois": 365, "Depuis le début": None}
+        periode = st.selectbox("Période", list(periodes), index=1, key="classement_periode")
+        
+        col1, col2 = st.columns(2)
+        for col, event_type, titre in ((col1, "vue", "Consultations"), (col2, "telechargement", "Téléchargements")):
+            with col:
+                st.write(f"**{titre}**")
+                classement = top_memoires(DB_PATH, event_type, periodes[periode])
+                if classement.empty:
+                    st.info("Aucune donnée disponible")
+                else:
+                    classement = classement[['titre', 'auteurs', 'nombre']]
+                    classement.columns = ['Titre', 'Auteurs', titre]
+                    st.dataframe(classement, use_container_width=True, hide_index=True)
+        
+        if st.session_state.user_role == "admin":
+            with st.expander("Vérification des compteurs"):
+                if st.button("Vérifier et recalculer les compteurs"):
+                    ecarts = check_statistics(DB_PATH)
+                    rebuild_statistics(DB_PATH)
+                    add_log("Recalcul des compteurs de statistiques", st.session_state.user_id)
+                    if ecarts:
+                        st.warning(f"{len(ecarts)} compteur(s) incohérent(s) corrigé(s).")
+                    else:
+                        st.success("Les compteurs étaient cohérents ; ils ont été recalculés.")
 
 def show_entities_management():
     st.header("🏢 Gestion des Entités")
@@ -1891,7 +2068,8 @@ def show_memoires_management():
                             # Mise à jour du mémoire
                             success, message = update_memoire(
                                 memoire_id, titre, auteurs, encadreur, resume,
-                                pdf_path, tags, selected_filiere, selected_session, version
+                                pdf_path, tags, selected_filiere, selected_session, version,
+                                fichier=uploaded_pdf
                             )
                             
                             if success:
@@ -1908,7 +2086,7 @@ def show_memoires_management():
                 return
 
         # Sinon, afficher les onglets
-        tab1, tab2, tab3, tab4 = st.tabs(["Ajouter un mémoire", "Import en masse", "Import complet", "Liste des mémoires"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["Ajouter un mémoire", "Import en masse", "Import complet", "Liste des mémoires", "Extraction du texte"])
         
         with tab1:
             st.subheader("Ajouter un nouveau mémoire")
@@ -1999,7 +2177,8 @@ def show_memoires_management():
                                 # Ajouter le mémoire à la base de données
                                 success, message = add_memoire(
                                     titre, auteurs, encadreur, resume, pdf_path, 
-                                    tags, selected_filiere, selected_session, version
+                                    tags, selected_filiere, selected_session, version,
+                                    fichier=uploaded_pdf
                                 )
                                 
                                 if success:
@@ -2050,8 +2229,15 @@ def show_memoires_management():
                 - Vérifiez que les noms des filières correspondent exactement à ceux de la base
                 - Les années universitaires doivent déjà exister dans la base
                 - Les fichiers PDF doivent être nommés de manière unique
+                - Un import interrompu reprend là où il s'était arrêté : relancez-le avec le même fichier et le même dossier
                 """)
             
+            # Imports inachevés (fermeture du navigateur, redémarrage du serveur)
+            unfinished_imports = memoire_importer.get_unfinished_jobs()
+            if not unfinished_imports.empty:
+                with st.expander(f"⚠️ {len(unfinished_imports)} import(s) en cours ou interrompu(s)"):
+                    st.dataframe(unfinished_imports, use_container_width=True)
+            
             # Formulaire d'import
             with st.form("import_form"):
                 metadata_file = st.file_uploader(
@@ -2082,6 +2268,7 @@ def show_memoires_management():
                                 st.success(f"""
                                 Import terminé avec succès !
                                 - Mémoires importés : {result['success_count']}
+                                - Déjà importés lors d'un passage précédent : {result['skipped_count']}
                                 - Erreurs : {result['error_count']}
                                 """)
                                 
@@ -2140,6 +2327,7 @@ def show_memoires_management():
                 - L'import est transactionnel : en cas d'erreur, les changements sont annulés
                 - Les entités, filières et sessions existantes ne seront pas dupliquées
                 - Les erreurs sont reportées de manière détaillée
+                - Un import interrompu reprend là où il s'était arrêté : relancez-le avec les mêmes fichiers et le même dossier
                 """)
             
             # Formulaire d'import
@@ -2189,6 +2377,7 @@ def show_memoires_management():
                                 
                                 Mémoires :
                                 - Importés : {result['memoires_success']}
+                                - Déjà importés lors d'un passage précédent : {result['memoires_skipped']}
                                 - Erreurs : {result['memoires_error']}
                                 """)
                                 
@@ -2205,50 +2394,15 @@ def show_memoires_management():
             # Recherche simple
             search_query = st.text_input("Rechercher un mémoire", key="manage_search")
             
-            memoires = get_all_memoires()
-            
-            if search_query:
-                # Filtrer les mémoires par la recherche
-                memoires = memoires[
-                    memoires['titre'].str.contains(search_query, case=False) | 
-                    memoires['auteurs'].str.contains(search_query, case=False) |
-                    memoires['resume'].str.contains(search_query, case=False) |
-                    memoires['tags'].str.contains(search_query, case=False)
-                ]
+            memoires, total = show_memoires_pagination("manage_pagination", search_query)
             
             if memoires.empty:
                 st.info("Aucun mémoire trouvé.")
             else:
-                st.write(f"{len(memoires)} mémoires trouvés.")
-                
-                # Afficher les mémoires avec pagination
-                memoires_per_page = 10
-                total_pages = (len(memoires) + memoires_per_page - 1) // memoires_per_page
-                
-                if 'current_page' not in st.session_state:
-                    st.session_state.current_page = 1
-                
-                # Boutons de pagination
-                col1, col2, col3 = st.columns([1, 3, 1])
-                
-                with col1:
-                    if st.button("◀️ Précédent") and st.session_state.current_page > 1:
-                        st.session_state.current_page -= 1
-                
-                with col2:
-                    st.write(f"Page {st.session_state.current_page}/{total_pages}")
-                
-                with col3:
-                    if st.button("Suivant ▶️") and st.session_state.current_page < total_pages:
-                        st.session_state.current_page += 1
-                
-                # Calculer l'indice de début et de fin
-                start_idx = (st.session_state.current_page - 1) * memoires_per_page
-                end_idx = min(start_idx + memoires_per_page, len(memoires))
+                st.write(f"{total} mémoires trouvés.")
                 
                 # Afficher les mémoires de la page courante
-                for idx in range(start_idx, end_idx):
-                    memoire = memoires.iloc[idx]
+                for _, memoire in memoires.iterrows():
                     with st.expander(f"{memoire['titre']} - {memoire['auteurs']} ({memoire['annee_universitaire']})"):
                         st.write(f"**Encadreur:** {memoire['encadreur']}")
                         st.write(f"**Filière:** {memoire['filiere_nom']} - {memoire['entite_nom']}")
@@ -2260,7 +2414,7 @@ def show_memoires_management():
                         
                         # Téléchargement
                         with action_col1:
-                            if memoire['fichier_url'].startswith("local://"):
+                            if storage.supports(memoire['fichier_url']):
                                 st.markdown(get_download_link(memoire['fichier_url'], "📥 Télécharger le PDF"), unsafe_allow_html=True)
                         
                         # Modification
@@ -2302,37 +2456,192 @@ def show_memoires_management():
                                     if st.button("❌ Non", key=f"confirm_no_{memoire['id']}"):
                                         del st.session_state[confirm_key]
                                         st.rerun()
+        
+        with tab5:
+            st.subheader("Extraction du texte des PDFs")
+            st.write("Le texte des PDFs est extrait en arrière-plan pour la recherche dans le contenu.")
+            
+            progress = pdf_pipeline.get_progress()
+            total_jobs = sum(progress.values())
+            
+            metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
+            with metric_col1:
+                st.metric("En attente", progress['en_attente'])
+            with metric_col2:
+                st.metric("En cours", progress['en_cours'])
+            with metric_col3:
+                st.metric("Terminées", progress['termine'])
+            with metric_col4:
+                st.metric("En erreur", progress['erreur'])
+            
+            if total_jobs > 0:
+                st.progress(progress['termine'] / total_jobs, text=f"{progress['termine']}/{total_jobs} mémoires traités")
+            
+            action_col1, action_col2 = st.columns(2)
+            with action_col1:
+                if st.button("🔄 Actualiser", key="refresh_extraction"):
+                    st.rerun()
+            with action_col2:
+                if st.button("▶️ Relancer les extractions manquantes", key="retry_extraction"):
+                    count = pdf_pipeline.enqueue_missing(retry_errors=True)
+                    add_log(f"Relance de l'extraction du texte pour {count} mémoire(s)", st.session_state.user_id)
+                    st.success(f"{count} extraction(s) planifiée(s).")
+            
+            jobs = pdf_pipeline.get_jobs()
+            if jobs.empty:
+                st.info("Aucune extraction n'a encore été planifiée.")
+            else:
+                jobs.columns = ['ID', 'Titre', 'Statut', 'Pages extraites', 'Pages', 'Erreur', 'Mise à jour']
+                st.dataframe(jobs, use_container_width=True)
 
 def show_logs():
     st.header("📋 Journal d'activité")
     st.markdown("---")
     container = st.container()
     with container:
-        # Connexion à la base de données
-        conn = sqlite3.connect(DB_PATH)
+        # Inclure les entrées encore en file d'écriture
+        db.log_queue.flush()
         
-        # Récupération des logs avec noms d'utilisateurs
-        query = """
-        SELECT l.id, l.action, u.nom, l.date 
-        FROM logs l
-        LEFT JOIN utilisateurs u ON l.user_id = u.id
-        ORDER BY l.date DESC
-        LIMIT 100
-        """
-        logs = pd.read_sql_query(query, conn)
+        conn = get_connection(DB_PATH)
+        utilisateurs = dict(conn.execute(
+            "SELECT id, nom || ' ' || prenom FROM utilisateurs ORDER BY nom, prenom"
+        ).fetchall())
         conn.close()
         
-        # Affichage des logs
-        st.write("Dernières actions effectuées (100 maximum):")
+        # Filtres
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            periode = st.selectbox(
+                "Période", [None] + list_archives(),
+                format_func=lambda mois: "Récente" if mois is None else f"Archive {mois}",
+                key="logs_periode"
+            )
+        with col2:
+            user_id = st.selectbox(
+                "Utilisateur", [None, 0] + list(utilisateurs),
+                format_func=lambda uid: {None: "Tous", 0: "Visiteurs"}.get(uid) or utilisateurs[uid],
+                key="logs_user"
+            )
+        with col3:
+            action = st.text_input("Action contenant", key="logs_action")
+        col1, col2 = st.columns(2)
+        with col1:
+            date_from = st.date_input("Du", value=None, key="logs_du")
+        with col2:
+            date_to = st.date_input("Au", value=None, key="logs_au")
+        
+        # Pile des curseurs des pages déjà vues, remise à zéro quand un filtre change
+        filtres = (periode, user_id, action, date_from, date_to)
+        if st.session_state.get("logs_filtres") != filtres:
+            st.session_state.logs_filtres = filtres
+            st.session_state.logs_curseurs = [None]
+        curseurs = st.session_state.logs_curseurs
+        
+        logs, suivant = query_logs(
+            DB_PATH, user_id=user_id, action=action, date_from=date_from, date_to=date_to,
+            cursor=curseurs[-1], month=periode
+        )
         
-        if logs.empty:
+        if not logs:
             st.info("Aucune activité enregistrée.")
         else:
             # Formater le dataframe pour l'affichage
-            logs.columns = ['ID', 'Action', 'Utilisateur', 'Date']
+            logs = pd.DataFrame(logs, columns=['ID', 'Action', 'Utilisateur', 'Date'])
             logs['Utilisateur'] = logs['Utilisateur'].fillna('Visiteur')
             
             st.dataframe(logs, use_container_width=True)
+        
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if len(curseurs) > 1 and st.button("← Page précédente", key="logs_precedente"):
+                curseurs.pop()
+                st.rerun()
+        with col2:
+            st.caption(f"Page {len(curseurs)}")
+        with col3:
+            if suivant and st.button("Page suivante →", key="logs_suivante"):
+                curseurs.append(suivant)
+                st.rerun()
+        
+        # Activité archivée, résumée par jour
+        with st.expander("📊 Activité archivée par jour"):
+            conn = get_connection(DB_PATH)
+            quotidiens = pd.read_sql_query("""
+            SELECT jour, categorie, SUM(nb) AS nb
+            FROM logs_quotidiens
+            GROUP BY jour, categorie
+            ORDER BY jour DESC, nb DESC
+            LIMIT 500
+            """, conn)
+            conn.close()
+            if quotidiens.empty:
+                st.info("Aucun log archivé pour le moment.")
+            else:
+                quotidiens.columns = ['Jour', 'Action', 'Nombre']
+                st.dataframe(quotidiens, use_container_width=True)
+
+def show_performance_page():
+    st.header("⏱️ Performance")
+    st.markdown("---")
+    container = st.container()
+    with container:
+        if not metrics.enabled:
+            st.info("Les mesures sont désactivées (INSTRUMENTATION=0).")
+            return
+        st.caption(
+            f"Mesures en mémoire depuis le démarrage du serveur : "
+            f"{metrics.config['max_queries']} dernières requêtes, {metrics.config['max_pages']} derniers rendus."
+        )
+        
+        # Rendu des pages
+        st.subheader("Pages")
+        pages = pd.DataFrame(metrics.page_stats())
+        if pages.empty:
+            st.info("Aucun rendu mesuré pour le moment.")
+        else:
+            pages.columns = ['Page', 'Rendus', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Requêtes / rendu']
+            st.dataframe(pages.round(1), use_container_width=True, hide_index=True)
+        
+        # Requêtes SQL
+        st.subheader("Requêtes SQL")
+        requetes = pd.DataFrame(metrics.query_stats())
+        if requetes.empty:
+            st.info("Aucune requête mesurée pour le moment.")
+        else:
+            requetes.columns = ['Requête', 'Exécutions', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Total (ms)', 'Lignes (moy.)']
+            st.dataframe(requetes.round(2), use_container_width=True, hide_index=True)
+        
+        # Histogrammes des durées
+        col1, col2 = st.columns(2)
+        for col, kind, titre in ((col1, "page", "Durée des rendus"), (col2, "requete", "Durée des requêtes")):
+            with col:
+                st.write(f"**{titre}**")
+                durations = metrics.durations(kind)
+                if durations:
+                    # Classes dans l'ordre des durées (st.bar_chart les trierait par ordre alphabétique)
+                    classes = pd.DataFrame(histogram(durations), columns=['Durée', 'Nombre'])
+                    st.altair_chart(
+                        alt.Chart(classes).mark_bar().encode(x=alt.X('Durée', sort=None), y='Nombre'),
+                        use_container_width=True
+                    )
+        
+        st.subheader("Exécutions les plus lentes")
+        lentes = pd.DataFrame(metrics.slowest_queries(), columns=['Date', 'Requête', 'Durée (ms)', 'Lignes', 'Page'])
+        if not lentes.empty:
+            lentes['Date'] = lentes['Date'].map(lambda t: datetime.fromtimestamp(t).strftime('%H:%M:%S'))
+            st.dataframe(lentes.round(2), use_container_width=True, hide_index=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("💾 Exporter les mesures"):
+                try:
+                    st.success(f"Mesures exportées : {metrics.export()}")
+                except Exception as e:
+                    st.error(f"Erreur lors de l'export des mesures : {str(e)}")
+        with col2:
+            if st.button("🗑️ Réinitialiser les mesures"):
+                metrics.reset()
+                st.rerun()
 
 # Point d'entrée principal de l'application
 if __name__ == "__main__":
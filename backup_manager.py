@@ -1,53 +1,141 @@
 import os
+import gzip
 import shutil
 from datetime import datetime
 import sqlite3
 import time
+from config import BACKUP_CONFIG, SQLITE_CONFIG, WAL_SHIPPING_CONFIG
+from db_pool import get_pool
+from reference_cache import reference_cache
+from wal_shipping import LocalReplica, restore_replica
+
+try:
+    import zstandard as zstd
+except ImportError:  # Compression "zstd" indisponible sans zstandard
+    zstd = None
+
+# Extensions des sauvegardes selon leur compression
+BACKUP_EXTENSIONS = {None: ".sqlite", "gzip": ".sqlite.gz", "zstd": ".sqlite.zst"}
 
 class BackupManager:
     def __init__(self):
         # Création des dossiers nécessaires
-        self.backup_dir = "data/backups"
+        self.backup_dir = BACKUP_CONFIG["backup_dir"]
         os.makedirs(self.backup_dir, exist_ok=True)
         
         # Configuration
-        self.db_path = "data/memoires_db.sqlite"
-        self.max_backups = 5  # Nombre maximum de sauvegardes à conserver
+        self.db_path = SQLITE_CONFIG["db_path"]
+        self.max_backups = BACKUP_CONFIG["max_backups"]  # Nombre maximum de sauvegardes à conserver
+        self.pages_per_step = BACKUP_CONFIG["pages_per_step"]
+        self.step_sleep = BACKUP_CONFIG["step_sleep"]
+        self.compression = BACKUP_CONFIG["compression"]
+        # Réplique de la sauvegarde continue (restauration à une date)
+        self.wal_replica = LocalReplica(WAL_SHIPPING_CONFIG["replica_dir"])
+    
+    def _is_backup(self, filename):
+        return filename.startswith("backup_") and filename.endswith(tuple(BACKUP_EXTENSIONS.values()))
+    
+    def _online_copy(self, dest_path):
+        """Copie cohérente de la base pendant que l'application l'utilise.
+        
+        La copie avance par étapes de pages_per_step pages, avec une pause entre
+        deux étapes. En mode WAL, elle se fait dans une transaction de lecture :
+        elle voit un instantané figé (elle ne repart pas de zéro quand l'application
+        écrit) et ne bloque pas les écritures. Retourne le nombre d'étapes.
+        """
+        steps = 0
+        
+        def progress(status, remaining, total):
+            nonlocal steps
+            steps += 1
+            # Laisser la main aux autres connexions entre deux étapes
+            time.sleep(self.step_sleep)
         
-    def create_backup(self):
-        """Crée une sauvegarde de la base de données."""
+        with get_pool(self.db_path).connection() as source:
+            if source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            dest = sqlite3.connect(dest_path)
+            try:
+                source.backup(dest, pages=self.pages_per_step, progress=progress)
+                # Sauvegarde autonome : un seul fichier, sans WAL
+                dest.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                dest.close()
+        return steps
+    
+    def _verify(self, path):
+        """Vérifie l'intégrité d'une copie ; retourne la liste des erreurs (vide si elle est saine)."""
+        conn = sqlite3.connect(path)
+        try:
+            result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        finally:
+            conn.close()
+        return [] if result == ["ok"] else result
+    
+    def _open_compressed(self, path, mode, compression):
+        if compression == "gzip":
+            return gzip.open(path, mode)
+        if compression == "zstd":
+            if zstd is None:
+                raise RuntimeError("Le module zstandard n'est pas installé")
+            if mode == "rb":
+                return zstd.ZstdDecompressor().stream_reader(open(path, "rb"))
+            return zstd.ZstdCompressor(level=10, write_checksum=True).stream_writer(open(path, "wb"))
+        raise ValueError(f"Compression inconnue : {compression}")
+    
+    def _compression_of(self, filename):
+        for compression, extension in BACKUP_EXTENSIONS.items():
+            if compression and filename.endswith(extension):
+                return compression
+        return None
+    
+    def create_backup(self, compression=None):
+        """Crée une sauvegarde de la base de données sans interrompre l'application.
+        
+        compression : None (valeur de BACKUP_CONFIG), "gzip" ou "zstd".
+        """
+        compression = compression or self.compression
+        tmp_path = None
         try:
             # Vérifier que la base existe
             if not os.path.exists(self.db_path):
                 print("Base de données non trouvée.")
                 return False
-                
+            
             # Créer le nom du fichier de sauvegarde avec la date
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = os.path.join(self.backup_dir, f"backup_{timestamp}.sqlite")
+            backup_path = os.path.join(self.backup_dir, f"backup_{timestamp}{BACKUP_EXTENSIONS[compression]}")
+            tmp_path = os.path.join(self.backup_dir, f"backup_{timestamp}.sqlite.tmp")
             
-            # Attendre que la base soit disponible
-            while True:
-                try:
-                    # Tester la connexion
-                    conn = sqlite3.connect(self.db_path)
-                    conn.close()
-                    break
-                except sqlite3.OperationalError:
-                    time.sleep(1)
+            # Copie en ligne, puis vérification avant de la publier
+            start = time.time()
+            steps = self._online_copy(tmp_path)
+            erreurs = self._verify(tmp_path)
+            if erreurs:
+                print(f"Sauvegarde corrompue, abandonnée : {'; '.join(erreurs[:5])}")
+                return False
             
-            # Copier le fichier
-            shutil.copy2(self.db_path, backup_path)
-            print(f"Sauvegarde créée : {backup_path}")
+            if compression:
+                with open(tmp_path, "rb") as src, self._open_compressed(backup_path + ".tmp", "wb", compression) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(backup_path + ".tmp", backup_path)
+            else:
+                os.replace(tmp_path, backup_path)
+            print(f"Sauvegarde créée : {backup_path} ({steps} étapes, {time.time() - start:.1f} s)")
             
             # Nettoyer les anciennes sauvegardes
             self._cleanup_old_backups()
             
             return True
-            
+        
         except Exception as e:
             print(f"Erreur lors de la sauvegarde : {str(e)}")
             return False
+        finally:
+            for path in (tmp_path, tmp_path and backup_path + ".tmp"):
+                if path and os.path.exists(path):
+                    os.remove(path)
     
     def _cleanup_old_backups(self):
         """Supprime les sauvegardes les plus anciennes si nécessaire."""
@@ -55,7 +143,7 @@ class BackupManager:
             # Lister toutes les sauvegardes
             backups = []
             for f in os.listdir(self.backup_dir):
-                if f.startswith("backup_") and f.endswith(".sqlite"):
+                if self._is_backup(f):
                     full_path = os.path.join(self.backup_dir, f)
                     backups.append((full_path, os.path.getmtime(full_path)))
             
@@ -66,47 +154,80 @@ class BackupManager:
             for backup_path, _ in backups[self.max_backups:]:
                 os.remove(backup_path)
                 print(f"Ancienne sauvegarde supprimée : {backup_path}")
-                
+        
         except Exception as e:
             print(f"Erreur lors du nettoyage des sauvegardes : {str(e)}")
     
-    def restore_backup(self, backup_name):
-        """Restaure une sauvegarde spécifique."""
+    def restore_backup(self, backup_name=None, point_in_time=None):
+        """Restaure une sauvegarde spécifique.
+        
+        Sans nom de sauvegarde, reconstruit la base depuis la sauvegarde continue
+        du WAL, à la date point_in_time (datetime) ou dans son état le plus récent.
+        """
+        restore_path = None
         try:
-            backup_path = os.path.join(self.backup_dir, backup_name)
-            if not os.path.exists(backup_path):
-                print("Sauvegarde non trouvée.")
+            if backup_name is None:
+                restore_path = os.path.join(self.backup_dir, "wal_restore.sqlite.tmp")
+                restored_at = restore_replica(self.wal_replica, restore_path, point_in_time)
+                backup_path = f"sauvegarde continue au {restored_at.strftime('%Y-%m-%d %H:%M:%S')}"
+            else:
+                backup_path = os.path.join(self.backup_dir, backup_name)
+                if not os.path.exists(backup_path):
+                    print("Sauvegarde non trouvée.")
+                    return False
+            
+            # Décompresser si besoin, et vérifier la sauvegarde avant de toucher à la base
+            compression = backup_name and self._compression_of(backup_name)
+            if compression:
+                restore_path = os.path.join(self.backup_dir, f"{backup_name}.restore.tmp")
+                with self._open_compressed(backup_path, "rb", compression) as src, open(restore_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            erreurs = self._verify(restore_path or backup_path)
+            if erreurs:
+                print(f"Sauvegarde corrompue, restauration annulée : {'; '.join(erreurs[:5])}")
                 return False
             
             # Créer une copie de sécurité avant la restauration
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             safety_copy = f"{self.db_path}.{timestamp}.safety"
-            shutil.copy2(self.db_path, safety_copy)
+            self._online_copy(safety_copy)
             
-            # Restaurer la sauvegarde
-            shutil.copy2(backup_path, self.db_path)
+            # Remplacer le contenu de la base par l'API de sauvegarde (WAL compris),
+            # puis écarter les connexions du pool et leurs requêtes préparées
+            source = sqlite3.connect(restore_path or backup_path)
+            try:
+                with get_pool(self.db_path).connection() as dest:
+                    source.backup(dest)
+            finally:
+                source.close()
+            get_pool(self.db_path).close_all()
+            reference_cache.invalidate()
             print(f"Base de données restaurée depuis : {backup_path}")
             print(f"Une copie de sécurité a été créée : {safety_copy}")
             
             return True
-            
+        
         except Exception as e:
             print(f"Erreur lors de la restauration : {str(e)}")
             return False
+        finally:
+            if restore_path and os.path.exists(restore_path):
+                os.remove(restore_path)
     
     def list_backups(self):
         """Liste toutes les sauvegardes disponibles."""
         try:
             backups = []
             for f in os.listdir(self.backup_dir):
-                if f.startswith("backup_") and f.endswith(".sqlite"):
+                if self._is_backup(f):
                     path = os.path.join(self.backup_dir, f)
                     size = os.path.getsize(path) / (1024 * 1024)  # Taille en MB
                     date = datetime.fromtimestamp(os.path.getmtime(path))
                     backups.append({
                         'name': f,
                         'size': f"{size:.2f} MB",
-                        'date': date.strftime("%Y-%m-%d %H:%M:%S")
+                        'date': date.strftime("%Y-%m-%d %H:%M:%S"),
+                        'compression': self._compression_of(f)
                     })
             return backups
         except Exception as e:
@@ -127,4 +248,4 @@ if __name__ == "__main__":
         print(f"Nom: {backup['name']}")
         print(f"Taille: {backup['size']}")
         print(f"Date: {backup['date']}")
-        print("---") 
\ No newline at end of file
+        print("---")
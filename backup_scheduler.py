@@ -0,0 +1,121 @@
+import random
+import sqlite3
+import threading
+import time
+
+
+class BackupScheduler:
+    """Exécute une sauvegarde périodique dans un thread dédié, hors du chemin des requêtes.
+
+    Un passage est ignoré si la base n'a pas changé depuis la dernière sauvegarde
+    réussie (PRAGMA data_version). L'intervalle varie de ±jitter pour que plusieurs
+    instances ne sauvegardent pas au même moment ; un échec est retenté au plus
+    max_retries fois avec une attente qui double, puis au passage suivant.
+    """
+
+    def __init__(self, db_path, backup, config):
+        self.db_path = db_path
+        self.backup = backup  # Fonction de sauvegarde : retourne le nombre d'octets envoyés
+        self.config = config
+        self._data_version = None  # Version de la base à la dernière sauvegarde réussie
+        self._version_conn = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._metrics = {
+            "passages": 0,
+            "ignores": 0,
+            "reussites": 0,
+            "echecs": 0,
+            "tentatives": 0,
+            "echecs_consecutifs": 0,
+            "octets_envoyes": 0,
+            "derniere_reussite": None,
+            "derniere_duree": None,
+            "derniere_erreur": None
+        }
+
+    def _current_version(self):
+        """Version de la base, qui change à chaque écriture d'une autre connexion."""
+        if self._version_conn is None:
+            self._version_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _count(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                self._metrics[name] += value
+
+    def metrics(self):
+        """Compteurs et état des sauvegardes (copie)."""
+        with self._lock:
+            return dict(self._metrics)
+
+    def run_once(self, force=False):
+        """Sauvegarde si la base a changé (ou si force) ; retourne True si elle est à jour."""
+        self._count(passages=1)
+        version = self._current_version()
+        if not force and version == self._data_version:
+            self._count(ignores=1)
+            return True
+
+        delay = self.config["retry_delay"]
+        for attempt in range(self.config["max_retries"] + 1):
+            if attempt:
+                # Attente interrompue par stop() ; la tentative a quand même lieu
+                self._stop.wait(delay)
+                delay *= 2
+            self._count(tentatives=1)
+            start = time.time()
+            try:
+                sent = self.backup()
+            except Exception as e:
+                with self._lock:
+                    self._metrics["derniere_erreur"] = f"{type(e).__name__}: {e}"
+                print(f"Erreur lors de la sauvegarde (tentative {attempt + 1}): {e}")
+                continue
+            # Les écritures faites pendant la sauvegarde seront envoyées au passage suivant
+            self._data_version = version
+            with self._lock:
+                self._metrics["reussites"] += 1
+                self._metrics["echecs_consecutifs"] = 0
+                self._metrics["octets_envoyes"] += sent or 0
+                self._metrics["derniere_reussite"] = time.time()
+                self._metrics["derniere_duree"] = time.time() - start
+            return True
+
+        self._count(echecs=1, echecs_consecutifs=1)
+        return False
+
+    def _next_delay(self):
+        jitter = self.config["jitter"]
+        return self.config["interval"] * random.uniform(1 - jitter, 1 + jitter)
+
+    def _loop(self, stop):
+        while not stop.wait(self._next_delay()):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Erreur du planificateur de sauvegardes: {e}")
+
+    def start(self):
+        """Démarre les sauvegardes périodiques (une seule fois par instance)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # Nouvel événement : un thread précédent encore en cours de sauvegarde s'arrêtera quand même
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._loop, args=(self._stop,), daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=30):
+        """Arrête le thread après la sauvegarde en cours, puis ferme sa connexion."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)
+        if not thread.is_alive() and self._version_conn is not None:
+            self._version_conn.close()
+            self._version_conn = None
@@ -0,0 +1,7 @@
+"""Banc d'essai reproductible de l'application.
+
+corpus.py génère des corpus synthétiques de mémoires (métadonnées, texte des
+pages et PDFs factices) à la taille voulue ; suite.py mesure les opérations
+principales sur une copie du corpus et écrit les résultats en JSON, à comparer
+d'une exécution à l'autre. En ligne de commande : python -m benchmark --help.
+"""
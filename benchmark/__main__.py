@@ -0,0 +1,54 @@
+import argparse
+
+from benchmark.corpus import generate_corpus, parse_size
+from benchmark.suite import compare_results, run_benchmark
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Banc d'essai de l'application sur un corpus synthétique de mémoires."
+    )
+    commands = parser.add_subparsers(dest="commande", required=True)
+    run_parser = commands.add_parser("run", help="génère (ou réutilise) un corpus et mesure les opérations")
+    corpus_parser = commands.add_parser("corpus", help="génère un corpus sans rien mesurer")
+    for sub in (run_parser, corpus_parser):
+        sub.add_argument("--size", default="1k", help="nombre de mémoires : 1k, 10k, 100k... (défaut : 1k)")
+        sub.add_argument("--seed", type=int, help="graine du générateur (défaut : BENCHMARK_CONFIG)")
+        sub.add_argument("--workspace", help="dossier des corpus et des résultats (défaut : data/benchmark)")
+        sub.add_argument("--force", action="store_true", help="régénère le corpus même s'il existe déjà")
+    run_parser.add_argument("--repeat", type=int, help="mesures par opération (défaut : BENCHMARK_CONFIG)")
+    run_parser.add_argument("--output", help="fichier JSON des résultats")
+    compare_parser = commands.add_parser("compare", help="compare deux fichiers de résultats")
+    compare_parser.add_argument("avant")
+    compare_parser.add_argument("apres")
+    args = parser.parse_args()
+
+    if args.commande == "corpus":
+        generate_corpus(parse_size(args.size), args.seed, args.workspace, force=args.force)
+    elif args.commande == "run":
+        result = run_benchmark(
+            parse_size(args.size), args.seed, args.repeat, args.workspace, args.output, force=args.force
+        )
+        print(f"\n{'Opération':<45} {'p50 (ms)':>10} {'p95 (ms)':>10} {'SQL':>5} {'Volume':>12}")
+        for name, stats in result["operations"].items():
+            if "erreur" in stats:
+                print(f"{name:<45} ! {stats['erreur']}")
+                continue
+            print(
+                f"{name:<45} {_format_ms(stats['p50_ms']):>10} {_format_ms(stats['p95_ms']):>10} "
+                f"{stats['requetes_sql'] if stats['requetes_sql'] is not None else '-':>5} {stats['volume']:>12}"
+            )
+    else:
+        print(f"{'Opération':<45} {'Avant (ms)':>11} {'Après (ms)':>11} {'Écart':>8}")
+        for name, avant, apres, ratio in compare_results(args.avant, args.apres):
+            ecart = "-" if ratio is None else f"{(ratio - 1) * 100:+.0f} %"
+            print(f"{name:<45} {_format_ms(avant):>11} {_format_ms(apres):>11} {ecart:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import io
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import textwrap
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from bulk_import import INSERT_MEMOIRE_QUERY
+from config import BENCHMARK_CONFIG
+from db_pool import get_pool
+from migrations import run_migrations
+from storage import FileStorage
+
+# Chemin de la base, relatif au dossier de travail (comme dans apps.py)
+DB_PATH = "data/memoires_db.sqlite"
+
+# Entités et filières du corpus
+ENTITES = {
+    "ENSGMM": ["Génie Mathématique", "Modélisation Statistique", "Informatique Décisionnelle"],
+    "ENSTP": ["Génie Civil", "Travaux Publics", "Hydraulique et Assainissement"],
+    "INSTI": ["Génie Électrique", "Génie Mécanique", "Informatique et Télécommunications"],
+    "ENSBBA": ["Biotechnologie Végétale", "Agroalimentaire", "Nutrition et Sciences Alimentaires"],
+    "ENSET": ["Génie Énergétique", "Maintenance Industrielle", "Sciences et Techniques de l'Éducation"],
+    "ESTBR": ["Génie Rural", "Gestion des Ressources Naturelles"]
+}
+
+# Années universitaires 2010-2011 à 2024-2025
+SESSIONS = [f"{annee}-{annee + 1}" for annee in range(2010, 2025)]
+
+PRENOMS = [
+    "Koffi", "Afi", "Sèna", "Mawuli", "Rodrigue", "Ghislain", "Aïcha", "Fifamè", "Judicaël", "Armelle",
+    "Boris", "Carine", "Dossou", "Euloge", "Fabrice", "Gérard", "Hermione", "Ismaël", "Josiane", "Kévin",
+    "Laurette", "Marius", "Nadège", "Olivier", "Prisca", "Rachidatou", "Sylvain", "Théophile", "Ulrich",
+    "Valérie", "Wilfried", "Yannick", "Zénabou", "Élodie", "Gildas", "Horace", "Innocent", "Mathias"
+]
+
+NOMS = [
+    "AGOSSOU", "HOUNKPATIN", "DOSSOU", "ADJOVI", "KPADONOU", "AHOUANSOU", "GBAGUIDI", "SOSSOU", "ZINSOU",
+    "TOSSOU", "HOUNSOU", "AKPOVI", "DANSOU", "ASSOGBA", "BIAOU", "CHABI", "SOUROU", "YAROU", "BOKO",
+    "ALLADAYE", "KOUDJO", "MENSAH", "AZONHIHO", "GANDONOU", "QUENUM", "SALAMI", "ADAMOU", "OROU", "DEGLA"
+]
+
+ACTIONS = [
+    "Conception et réalisation", "Mise en place", "Étude et dimensionnement", "Modélisation",
+    "Analyse des performances", "Optimisation", "Évaluation", "Développement", "Contribution à l'étude",
+    "Étude comparative", "Caractérisation", "Simulation numérique", "Diagnostic et réhabilitation"
+]
+
+OBJETS = [
+    "d'un système d'information", "d'une application mobile", "d'un réseau de distribution d'eau potable",
+    "d'un pont en béton armé", "d'un modèle de prévision", "d'un procédé de transformation du manioc",
+    "d'une plateforme de commerce électronique", "d'une centrale solaire photovoltaïque",
+    "d'un réseau d'assainissement pluvial", "d'un entrepôt de données", "d'un séchoir solaire",
+    "d'une chaussée revêtue", "d'un système de télésurveillance", "d'un bâtiment R+4",
+    "d'un algorithme de classification", "d'une unité de production de jus d'ananas",
+    "d'un réseau local sans fil", "d'un système d'irrigation goutte-à-goutte", "d'un moteur asynchrone",
+    "d'un modèle épidémiologique"
+]
+
+BUTS = [
+    "pour la gestion des stocks", "pour le suivi des patients", "pour la réduction des pertes",
+    "pour l'amélioration de la qualité", "pour la gestion des inscriptions", "pour l'électrification rurale",
+    "pour la maîtrise des inondations", "pour la prévision de la demande", "pour la traçabilité des produits",
+    "pour la sécurité alimentaire", "pour la gestion du courrier", "pour l'aide à la décision",
+    "pour la conservation des récoltes", "pour la maintenance préventive", "pour le recouvrement des impayés"
+]
+
+LIEUX = [
+    "la ville de Cotonou", "la commune d'Abomey-Calavi", "Lokossa", "Porto-Novo", "Parakou", "la SONEB",
+    "la SBEE", "Natitingou", "Bohicon", "Ouidah", "Djougou", "Kandi", "l'hôpital de zone de Comè",
+    "Grand-Popo", "la mairie de Dassa-Zoumè", "Savalou", "Malanville", "Allada"
+]
+
+# Vocabulaire du texte des mémoires, du plus fréquent au moins fréquent : les
+# mots sont tirés selon une loi de Zipf, comme dans un texte réel
+VOCABULAIRE = (
+    "de la le les des et en du une un pour dans est par sur au avec que qui ce sont plus "
+    "cette ont nous être aux été ses leur entre ainsi donc mais comme fait deux "
+    "système étude données gestion résultats analyse projet réseau méthode travail modèle eau "
+    "production développement mise place qualité conception application utilisateurs "
+    "traitement réalisation évaluation paramètres structure matériaux énergie béton "
+    "performance coût calcul dimensionnement simulation optimisation processus contrôle "
+    "information base maintenance sécurité environnement population terrain enquête "
+    "échantillon variables température pression débit charge tension puissance courant "
+    "solaire rendement installation équipement consommation stockage distribution "
+    "assainissement hydraulique sol fondation ouvrage chaussée trafic route pont poutre "
+    "armature résistance compression flexion déformation essai laboratoire norme "
+    "programme logiciel serveur interface architecture module fonctionnalités requête "
+    "algorithme classification apprentissage prédiction précision régression statistique "
+    "probabilité distribution estimation hypothèse test corrélation série temporelle "
+    "manioc maïs ananas soja fermentation séchage conservation transformation nutritionnel "
+    "protéines microbiologique hygiène emballage récolte rendement agricole irrigation "
+    "parcelle semences engrais pluviométrie climat inondation bassin versant ruissellement "
+    "drainage collecteur canalisation forage pompe château réservoir adduction potable "
+    "municipal commune quartier ménages usagers enquêtés questionnaire entretien "
+    "recommandations perspectives contraintes limites objectif spécifique général "
+    "problématique hypothèses méthodologie revue littérature cadre théorique conceptuel "
+    "rapport mémoire soutenance encadrement promotion licence master ingénieur "
+    "Cotonou Bénin Porto-Novo Parakou Abomey-Calavi Lokossa Natitingou Ouémé Atlantique "
+    "Mono Couffo Zou Collines Borgou Alibori Atacora Donga Littoral Plateau "
+    "photovoltaïque onduleur batterie transformateur disjoncteur câblage éclairage "
+    "moteur vitesse couple vibration roulement usure lubrification panne fiabilité "
+    "disponibilité maintenabilité indicateur tableau bord décision entrepôt OLAP "
+    "mobile Android web base_de_données SQL MySQL PostgreSQL Python Java Django "
+    "authentification chiffrement sauvegarde réplication latence bande passante "
+    "routeur commutateur antenne fréquence signal propagation couverture Wi-Fi "
+    "hydrologie géotechnique topographie cartographie SIG télédétection érosion "
+    "biodiversité déforestation reboisement carbone émissions pollution déchets "
+    "compostage biogaz méthanisation épuration boues lixiviat décharge tri recyclage"
+).split()
+
+# Poids cumulés de la loi de Zipf (exposant 1) sur le vocabulaire
+POIDS_CUMULES = list(itertools.accumulate(1 / rang for rang in range(1, len(VOCABULAIRE) + 1)))
+
+
+@contextmanager
+def working_directory(path):
+    """Travaille dans path (chemins relatifs de l'application), puis revient au dossier courant."""
+    previous = os.getcwd()
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+
+
+def corpus_dir(size, seed=None, workspace=None):
+    """Dossier du corpus de size mémoires généré avec la graine seed."""
+    seed = BENCHMARK_CONFIG["seed"] if seed is None else seed
+    workspace = workspace or BENCHMARK_CONFIG["workspace"]
+    return os.path.abspath(os.path.join(workspace, f"corpus_{size}_{seed}"))
+
+
+def parse_size(value):
+    """Taille de corpus : '1k' -> 1000, '100k' -> 100000, '2m' -> 2000000."""
+    value = str(value).strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+
+def _sentence(rng, min_words=8, max_words=20):
+    words = rng.choices(VOCABULAIRE, cum_weights=POIDS_CUMULES, k=rng.randint(min_words, max_words))
+    sentence = " ".join(words).replace("_", " ")
+    return sentence[0].upper() + sentence[1:] + "."
+
+
+def _text(rng, words):
+    """Paragraphe d'environ words mots."""
+    sentences = []
+    while words > 0:
+        sentence = _sentence(rng)
+        sentences.append(sentence)
+        words -= sentence.count(" ") + 1
+    return " ".join(sentences)
+
+
+def _person(rng):
+    return f"{rng.choice(PRENOMS)} {rng.choice(NOMS)}"
+
+
+def make_memoire(rng, filieres, sessions):
+    """Métadonnées d'un mémoire : dict des colonnes du fichier d'import."""
+    filiere_nom, entite_nom = rng.choice(filieres)
+    annee = rng.choice(sessions)
+    objet = rng.choice(OBJETS)
+    titre = f"{rng.choice(ACTIONS)} {objet} {rng.choice(BUTS)} : cas de {rng.choice(LIEUX)}"
+    mots_cles = rng.sample(VOCABULAIRE[40:], rng.randint(3, 6))
+    # Soutenu au cours de la seconde année de la session
+    date_ajout = datetime(int(annee[-4:]), 1, 1) + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+    return {
+        "titre": titre,
+        "auteurs": ", ".join(_person(rng) for _ in range(rng.randint(1, 3))),
+        "encadreur": f"{rng.choice(['Dr', 'Pr', 'Dr Ir.', 'M.'])} {_person(rng)}",
+        "resume": f"Ce travail porte sur le thème « {titre} ». " + _text(rng, rng.randint(80, 160)),
+        "tags": ", ".join(mot.replace("_", " ") for mot in mots_cles),
+        "filiere_nom": filiere_nom,
+        "entite_nom": entite_nom,
+        "annee_universitaire": annee,
+        "version": rng.choice(["1.0", "1.0", "1.1", "2.0"]),
+        "date_ajout": date_ajout.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def _pdf_string(text):
+    data = text.encode("cp1252", "replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def make_pdf(pages, size=0, rng=None):
+    """PDF valide d'une page par texte (Helvetica, texte extractible par pypdf).
+
+    Complété jusqu'à environ size octets par un flux d'octets aléatoires, qui
+    tient lieu des images d'un vrai mémoire (incompressible, comme un JPEG).
+    """
+    rng = rng or random.Random()
+    count = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(count))}] /Count {count} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    ]
+    for i, text in enumerate(pages):
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode())
+        lines = textwrap.wrap(text, 95)[:55]
+        content = b"BT /F1 10 Tf 14 TL 50 800 Td\n" + b"\n".join(
+            b"(" + _pdf_string(line) + b") '" for line in lines
+        ) + b"\nET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+
+    current = sum(len(obj) + 20 for obj in objects) + 20 * len(objects) + 100
+    if size > current:
+        filler = rng.randbytes(size - current)
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(filler), filler))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, obj))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def _pdf_size(rng, config):
+    """Taille de PDF tirée entre pdf_min_size et pdf_max_size, petits fichiers plus fréquents."""
+    low, high = math.log(config["pdf_min_size"]), math.log(config["pdf_max_size"])
+    return int(math.exp(rng.uniform(low, high)))
+
+
+def _make_pdf_file(rng, config):
+    pages = [_text(rng, config["words_per_page"]) for _ in range(rng.randint(1, 8))]
+    return make_pdf(pages, _pdf_size(rng, config), rng)
+
+
+def _seed_reference_data(conn):
+    """Entités, filières et sessions ; retourne (filières [(nom, entité)], sessions, ids)."""
+    conn.executemany("INSERT OR IGNORE INTO entites (nom) VALUES (?)", [(nom,) for nom in ENTITES])
+    entites = dict(conn.execute("SELECT nom, id FROM entites").fetchall())
+    conn.executemany(
+        "INSERT OR IGNORE INTO filieres (nom, entite_id) VALUES (?, ?)",
+        [(filiere, entites[entite]) for entite, filieres in ENTITES.items() for filiere in filieres]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO sessions (annee_universitaire) VALUES (?)", [(annee,) for annee in SESSIONS]
+    )
+    filiere_ids = {
+        (nom, entite): id_ for id_, nom, entite in conn.execute(
+            "SELECT f.id, f.nom, e.nom FROM filieres f JOIN entites e ON e.id = f.entite_id"
+        ).fetchall()
+    }
+    session_ids = dict(conn.execute("SELECT annee_universitaire, id FROM sessions").fetchall())
+    return filiere_ids, session_ids
+
+
+def _write_import_set(rng, config, filieres):
+    """Fichier d'import en masse (import/memoires.csv) et son dossier de PDFs (import/pdfs)."""
+    pdf_folder = os.path.join("import", "pdfs")
+    os.makedirs(pdf_folder, exist_ok=True)
+    rows = []
+    for i in range(config["import_size"]):
+        memoire = make_memoire(rng, filieres, SESSIONS)
+        memoire["nom_fichier"] = f"import_{i + 1:05d}.pdf"
+        with open(os.path.join(pdf_folder, memoire["nom_fichier"]), "wb") as f:
+            f.write(_make_pdf_file(rng, config))
+        rows.append(memoire)
+    columns = ["titre", "auteurs", "encadreur", "resume", "tags", "filiere_nom",
+               "annee_universitaire", "version", "nom_fichier"]
+    pd.DataFrame(rows, columns=columns).to_csv(os.path.join("import", "memoires.csv"), index=False)
+
+
+def load_manifest(directory):
+    """Description du corpus généré dans directory (corpus.json), ou None."""
+    path = os.path.join(directory, "corpus.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _parameters(size, seed, config):
+    """Paramètres qui déterminent le corpus (sous la forme relue depuis corpus.json)."""
+    parameters = {"taille": size, "graine": seed}
+    for key in ("pdf_files", "pdf_min_size", "pdf_max_size", "pages_per_memoire", "words_per_page", "import_size"):
+        parameters[key] = list(config[key]) if isinstance(config[key], tuple) else config[key]
+    return parameters
+
+
+def generate_corpus(size, seed=None, workspace=None, config=None, force=False):
+    """Génère (ou réutilise) un corpus de size mémoires et retourne sa description.
+
+    Le corpus est un dossier de travail complet de l'application (data/ avec la
+    base et les fichiers stockés), plus un fichier d'import en masse (import/).
+    Les mémoires et le texte de leurs pages sont insérés directement, comme
+    après extraction ; leurs PDFs sont pris dans un ensemble de pdf_files
+    fichiers stockés, que le stockage adressé par contenu partage entre mémoires.
+    Tout est tiré d'un générateur initialisé avec seed : même taille, même
+    graine et mêmes paramètres donnent le même corpus, qui n'est alors pas
+    régénéré (sauf si force).
+    """
+    config = config or BENCHMARK_CONFIG
+    seed = config["seed"] if seed is None else seed
+    directory = corpus_dir(size, seed, workspace or config["workspace"])
+    parameters = _parameters(size, seed, config)
+
+    manifest = load_manifest(directory)
+    if manifest is not None and manifest["parametres"] == parameters and not force:
+        print(f"✓ Corpus existant réutilisé : {directory}")
+        return manifest
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+
+    rng = random.Random(seed)
+    start = time.time()
+    with working_directory(directory):
+        db_path = os.path.abspath(DB_PATH)
+        run_migrations(db_path)
+        pool = get_pool(db_path)
+
+        with pool.transaction() as conn:
+            filiere_ids, session_ids = _seed_reference_data(conn)
+        filieres = sorted(filiere_ids)
+
+        # Ensemble de PDFs partagés, stockés comme par l'application
+        storage = FileStorage(db_path)
+        fichiers, octets = [], 0
+        for i in range(config["pdf_files"]):
+            pdf = _make_pdf_file(rng, config)
+            fichier_url, _, taille = storage.save_stream(io.BytesIO(pdf), f"corpus_{i}.pdf")
+            fichiers.append(fichier_url)
+            octets += taille
+
+        pages_min, pages_max = config["pages_per_memoire"]
+        pages_total = 0
+        for batch_start in range(0, size, config["batch_size"]):
+            with pool.transaction() as conn:
+                for _ in range(min(config["batch_size"], size - batch_start)):
+                    m = make_memoire(rng, filieres, SESSIONS)
+                    fichier_url = rng.choice(fichiers)
+                    memoire_id = conn.execute(INSERT_MEMOIRE_QUERY, (
+                        m["titre"], m["auteurs"], m["encadreur"], m["resume"], fichier_url, m["tags"],
+                        filiere_ids[(m["filiere_nom"], m["entite_nom"])], session_ids[m["annee_universitaire"]],
+                        m["version"], m["date_ajout"]
+                    )).lastrowid
+                    pages = [
+                        (memoire_id, page_num, _text(rng, config["words_per_page"]))
+                        for page_num in range(1, rng.randint(pages_min, pages_max) + 1)
+                    ]
+                    conn.executemany(
+                        "INSERT INTO pdf_content (memoire_id, page_num, content) VALUES (?, ?, ?)", pages
+                    )
+                    conn.execute("""
+                    INSERT INTO extraction_jobs
+                    (memoire_id, fichier_url, statut, pages_total, pages_extraites, date_creation, date_maj)
+                    VALUES (?, ?, 'termine', ?, ?, ?, ?)
+                    """, (memoire_id, fichier_url, len(pages), len(pages), m["date_ajout"], m["date_ajout"]))
+                    pages_total += len(pages)
+            print(f"  {min(batch_start + config['batch_size'], size)}/{size} mémoires générés")
+
+        _write_import_set(rng, config, filieres)
+
+        # Base autonome (WAL vidé) : le corpus peut être copié tel quel
+        with pool.connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        pool.close_all()
+
+        manifest = {
+            "parametres": parameters,
+            "memoires": size,
+            "pages": pages_total,
+            "fichiers_pdf": len(set(fichiers)),
+            "octets_pdf": octets,
+            "octets_base": os.path.getsize(db_path),
+            "duree_generation_s": round(time.time() - start, 1),
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        with open("corpus.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"✓ Corpus généré : {directory} ({manifest['duree_generation_s']} s)")
+    return manifest
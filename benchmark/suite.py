@@ -0,0 +1,217 @@
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import time
+from datetime import datetime
+
+from backup_manager import BackupManager
+from benchmark.corpus import corpus_dir, generate_corpus, make_pdf, working_directory
+from config import BENCHMARK_CONFIG
+from instrumentation import metrics, percentile
+
+# Saisies des recherches mesurées : mot très fréquent, deux mots, préfixe,
+# trois mots, mot rare et mot absent du corpus
+SEARCH_QUERIES = ["système", "béton armé", "optim", "réseau eau Cotonou", "méthanisation", "xylophone"]
+
+
+def measure(func, repeat, warmup=True):
+    """Appelle func repeat fois (après un appel de chauffe) et résume les durées.
+
+    func retourne un volume (lignes, octets...) gardé pour vérifier que deux
+    exécutions font le même travail. Les requêtes SQL de chaque appel sont
+    comptées par l'instrumentation (voir instrumentation.py), si elle est active.
+    """
+    if warmup:
+        func()
+    durations, requetes, sql_ms = [], [], []
+    volume = None
+    for _ in range(repeat):
+        metrics.reset()
+        start = time.perf_counter()
+        volume = func()
+        durations.append((time.perf_counter() - start) * 1000)
+        queries = metrics.durations("requete")
+        requetes.append(len(queries))
+        sql_ms.append(sum(queries))
+    return {
+        "repetitions": repeat,
+        "min_ms": round(min(durations), 3),
+        "p50_ms": round(percentile(durations, 50), 3),
+        "p95_ms": round(percentile(durations, 95), 3),
+        "max_ms": round(max(durations), 3),
+        "moyenne_ms": round(sum(durations) / repeat, 3),
+        "requetes_sql": percentile(requetes, 50) if metrics.enabled else None,
+        "duree_sql_ms": round(percentile(sql_ms, 50), 3) if metrics.enabled else None,
+        "volume": volume
+    }
+
+
+def _environment():
+    """Machine et version du code mesurées."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plateforme": platform.platform(),
+        "processeurs": os.cpu_count(),
+        "commit": commit
+    }
+
+
+def _run_operations(source, repeat, rng, config):
+    """Mesure les opérations dans le dossier de travail courant (copie du corpus)."""
+    # Importé ici : apps crée son stockage et ses pools dans le dossier courant
+    import apps
+
+    # Tâches de fond sans rapport avec les opérations mesurées
+    for job in (apps.file_server, apps.tiering_job, apps.wal_shipper, apps.log_retention_job):
+        job.stop()
+
+    results = {}
+
+    def run(name, func, repeat=repeat, warmup=True):
+        print(f"  {name}")
+        try:
+            results[name] = measure(func, repeat, warmup)
+        except Exception as e:
+            print(f"! {name} : {e}")
+            results[name] = {"erreur": f"{type(e).__name__}: {e}"}
+
+    for query in SEARCH_QUERIES:
+        run(f"search_memoires[{query}]", lambda query=query: len(apps.search_memoires(query)))
+    run("search_memoires[entité]", lambda: len(apps.search_memoires("", entity=1)))
+    for query in SEARCH_QUERIES:
+        run(f"search_in_pdf_content[{query}]", lambda query=query: len(apps.search_in_pdf_content(query)))
+    run("get_statistics", lambda: int(apps.get_statistics()["total_memoires"]))
+    run("get_all_memoires", lambda: len(apps.get_all_memoires()))
+
+    # Stockage : un fichier différent à chaque écriture (sinon dédupliqué)
+    local = apps.storage.backends["local"]
+    contenus = [
+        make_pdf([f"Fichier de mesure {i}"], config["file_size"], rng) for i in range(repeat + 1)
+    ]
+    stored = []
+
+    def save_file():
+        content = contenus.pop()
+        success, file_path = local.save_file(io.BytesIO(content), "benchmark.pdf")
+        if not success:
+            raise RuntimeError("Fichier non sauvegardé")
+        stored.append(file_path)
+        return len(content)
+
+    run("FileStorage.save_file", save_file)
+    lectures = itertools.cycle(stored)
+    run("FileStorage.get_file", lambda: len(local.get_file(next(lectures))))
+
+    manager = BackupManager()
+
+    def create_backup():
+        # Sauvegardes nommées à la seconde près : chacune est mesurée puis supprimée,
+        # pour que la répétition suivante ne la remplace pas
+        avant = set(os.listdir(manager.backup_dir))
+        if not manager.create_backup():
+            raise RuntimeError("Sauvegarde non créée")
+        nouvelles = [f for f in os.listdir(manager.backup_dir) if f.startswith("backup_") and f not in avant]
+        if len(nouvelles) != 1:
+            raise RuntimeError(f"Sauvegarde introuvable dans {manager.backup_dir}")
+        backup_path = os.path.join(manager.backup_dir, nouvelles[0])
+        size = os.path.getsize(backup_path)
+        os.remove(backup_path)
+        return size
+
+    run("BackupManager.create_backup", create_backup, warmup=False)
+
+    # En dernier : l'import ajoute des mémoires au corpus, et ne se rejoue pas
+    # (un second passage reprendrait l'import déjà terminé)
+    def bulk_import():
+        with open(os.path.join(source, "import", "memoires.csv"), "rb") as metadata_file:
+            success, report = apps.bulk_import_memoires(metadata_file, os.path.join(source, "import", "pdfs"))
+        if not success:
+            raise RuntimeError(report)
+        return report["success_count"]
+
+    run("bulk_import_memoires", bulk_import, repeat=1, warmup=False)
+    # Extraction du texte des mémoires importés : hors mesure
+    apps.pdf_pipeline.shutdown()
+    return results
+
+
+def run_benchmark(size, seed=None, repeat=None, workspace=None, output=None, config=None, force=False):
+    """Mesure les opérations principales sur un corpus de size mémoires.
+
+    Le corpus est généré au premier appel (voir corpus.generate_corpus), puis
+    copié dans workspace/run avant chaque exécution : les mesures partent
+    toujours du même état. Les résultats sont écrits en JSON dans
+    workspace/results (ou output) et retournés. Une exécution par processus :
+    apps est importé dans la copie de travail.
+    """
+    config = config or BENCHMARK_CONFIG
+    seed = config["seed"] if seed is None else seed
+    repeat = repeat or config["repeat"]
+    workspace = os.path.abspath(workspace or config["workspace"])
+    date = datetime.now()
+    output = os.path.abspath(
+        output or os.path.join(workspace, "results", f"benchmark_{size}_{date.strftime('%Y%m%d_%H%M%S')}.json")
+    )
+
+    manifest = generate_corpus(size, seed, workspace, config, force)
+    source = corpus_dir(size, seed, workspace)
+    run_dir = os.path.join(workspace, "run")
+    if os.path.exists(run_dir):
+        shutil.rmtree(run_dir)
+    shutil.copytree(os.path.join(source, "data"), os.path.join(run_dir, "data"))
+
+    print(f"Mesures sur {size} mémoires ({repeat} répétitions)")
+    with working_directory(run_dir):
+        operations = _run_operations(source, repeat, random.Random(seed), config)
+
+    result = {
+        "date": date.strftime("%Y-%m-%d %H:%M:%S"),
+        "environnement": _environment(),
+        "corpus": manifest,
+        "repetitions": repeat,
+        "operations": operations
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"✓ Résultats écrits : {output}")
+    result["fichier"] = output
+    return result
+
+
+def compare_results(before, after):
+    """Compare deux fichiers de résultats : [(opération, p50 avant, p50 après, ratio)].
+
+    ratio = après / avant (inférieur à 1 : plus rapide). Une opération absente
+    ou en erreur dans l'un des deux fichiers a des valeurs None.
+    """
+    runs = []
+    for path in (before, after):
+        with open(path, encoding="utf-8") as f:
+            runs.append(json.load(f))
+    if runs[0]["corpus"]["parametres"] != runs[1]["corpus"]["parametres"]:
+        print("! Les deux exécutions n'ont pas été mesurées sur le même corpus")
+
+    rows = []
+    names = list(runs[0]["operations"]) + [
+        name for name in runs[1]["operations"] if name not in runs[0]["operations"]
+    ]
+    for name in names:
+        avant, apres = (run["operations"].get(name, {}).get("p50_ms") for run in runs)
+        ratio = apres / avant if avant and apres is not None else None
+        rows.append((name, avant, apres, ratio))
+    return rows
@@ -0,0 +1,266 @@
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from config import BULK_IMPORT_CONFIG
+from db_pool import get_pool
+
+REQUIRED_COLUMNS = [
+    'titre', 'auteurs', 'encadreur', 'resume',
+    'filiere_nom', 'annee_universitaire', 'nom_fichier'
+]
+
+INSERT_MEMOIRE_QUERY = """
+INSERT INTO memoires
+(titre, auteurs, encadreur, resume, fichier_url, tags, filiere_id, session_id, version, date_ajout)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def validate_memoires(df, pdf_folder, filieres_map, sessions_map):
+    """Valide toutes les lignes du fichier de métadonnées en une seule passe.
+
+    Retourne (lignes valides avec leur chemin de PDF, message d'erreur par ligne).
+    """
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing_columns)}")
+
+    lignes = "Ligne " + (df.index.to_series() + 2).astype(str)
+    erreurs = pd.Series(None, index=df.index, dtype=object)
+
+    # Chaque ligne ne garde que la première erreur rencontrée
+    manquants = df[REQUIRED_COLUMNS].isna().any(axis=1)
+    erreurs[manquants] = lignes[manquants] + ": Champs obligatoires manquants"
+
+    filiere_inconnue = erreurs.isna() & ~df['filiere_nom'].isin(list(filieres_map))
+    erreurs[filiere_inconnue] = (
+        lignes + ": Filière '" + df['filiere_nom'].astype(str) + "' non trouvée"
+    )[filiere_inconnue]
+
+    session_inconnue = erreurs.isna() & ~df['annee_universitaire'].isin(list(sessions_map))
+    erreurs[session_inconnue] = (
+        lignes + ": Année universitaire '" + df['annee_universitaire'].astype(str) + "' non trouvée"
+    )[session_inconnue]
+
+    pdf_paths = df['nom_fichier'].astype(str).map(lambda nom: os.path.join(pdf_folder, nom))
+    restants = erreurs.isna()
+    fichier_present = (
+        pdf_paths[restants].map(os.path.isfile).astype(bool).reindex(df.index, fill_value=False)
+    )
+    fichier_absent = restants & ~fichier_present
+    erreurs[fichier_absent] = (
+        lignes + ": Fichier PDF '" + df['nom_fichier'].astype(str) + "' non trouvé"
+    )[fichier_absent]
+
+    valides = df[erreurs.isna()].copy()
+    valides['pdf_path'] = pdf_paths[erreurs.isna()]
+    return valides, erreurs.dropna()
+
+
+class MemoireImporter:
+    """Import en masse : validation vectorisée, copies des PDFs en parallèle
+    et insertions groupées par transactions de chunk_size mémoires.
+
+    Chaque import est journalisé ligne par ligne (import_jobs / import_lignes) :
+    relancer le même fichier avec le même dossier reprend l'import là où il
+    s'était arrêté, sans recopier les PDFs déjà stockés ni dupliquer les mémoires.
+    """
+
+    def __init__(self, db_path, storage, max_workers=None, chunk_size=None):
+        self.pool = get_pool(db_path)
+        self.storage = storage
+        self.max_workers = max_workers or BULK_IMPORT_CONFIG["max_workers"]
+        self.chunk_size = chunk_size or BULK_IMPORT_CONFIG["chunk_size"]
+
+    def _get_or_create_job(self, df, pdf_folder):
+        """Retourne (job_id, reprise) pour ce fichier de métadonnées et ce dossier."""
+        digest = hashlib.sha256("|".join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+        digest.update(os.path.abspath(pdf_folder).encode())
+        cle = digest.hexdigest()
+
+        date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.transaction() as conn:
+            row = conn.execute("SELECT id FROM import_jobs WHERE cle = ?", (cle,)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE import_jobs SET statut='en_cours', date_maj=? WHERE id=?",
+                    (date_now, row[0])
+                )
+                return row[0], True
+            cursor = conn.execute("""
+            INSERT INTO import_jobs (cle, pdf_folder, statut, lignes_total, date_creation, date_maj)
+            VALUES (?, ?, 'en_cours', ?, ?, ?)
+            """, (cle, os.path.abspath(pdf_folder), len(df), date_now, date_now))
+            return cursor.lastrowid, False
+
+    def _set_ligne(self, job_id, ligne, statut, **fields):
+        """Met à jour l'état d'une ligne du journal d'import."""
+        fields["statut"] = statut
+        assignments = ", ".join(f"{name}=?" for name in fields)
+        with self.pool.transaction() as conn:
+            conn.execute(
+                f"UPDATE import_lignes SET {assignments} WHERE job_id=? AND ligne=?",
+                (*fields.values(), job_id, ligne)
+            )
+
+    def _store_pdf(self, task):
+        """Copie un PDF dans le stockage (exécuté dans un thread du pool).
+
+        Retourne (chemin stocké, erreur). Le point de reprise est enregistré dès la
+        copie terminée, pour qu'un arrêt brutal ne laisse pas de fichier orphelin.
+        """
+        job_id, ligne, pdf_path, stored_path = task
+        if stored_path and self.storage.exists(stored_path):
+            return stored_path, None
+        try:
+            with open(pdf_path, 'rb') as pdf_file:
+                stored_path, sha256, _ = self.storage.save_stream(pdf_file, f"{uuid.uuid4()}.pdf")
+            self._set_ligne(job_id, ligne, "fichier_stocke", fichier_url=stored_path, hash=sha256)
+            return stored_path, None
+        except Exception as e:
+            return None, str(e)
+
+    def _insert_chunk(self, job_id, chunk, report):
+        """Insère un lot de mémoires et marque leurs lignes comme insérées, atomiquement.
+
+        En cas d'échec, supprime leurs fichiers copiés.
+        """
+        try:
+            with self.pool.transaction() as conn:
+                conn.executemany(INSERT_MEMOIRE_QUERY, [params for _, params, _ in chunk])
+                # Références comptées : un fichier supprimé entre-temps est réécrit
+                for _, params, pdf_path in chunk:
+                    self.storage.ensure_stored(params[4], pdf_path)
+                conn.executemany(
+                    "UPDATE import_lignes SET statut='insere', erreur=NULL WHERE job_id=? AND ligne=?",
+                    [(job_id, ligne) for ligne, _, _ in chunk]
+                )
+            report['success_count'] += len(chunk)
+        except Exception as e:
+            message = f"Lignes {chunk[0][0]} à {chunk[-1][0]}: Erreur lors de l'insertion: {e}"
+            for ligne, params, _ in chunk:
+                self.storage.delete_file(params[4])
+                self._set_ligne(job_id, ligne, "erreur", fichier_url=None, erreur=message)
+            report['error_count'] += len(chunk)
+            report['errors'].append(message)
+
+    def run(self, df, pdf_folder, filieres_map, sessions_map):
+        """Importe (ou reprend l'import) des mémoires décrits par df et retourne le rapport."""
+        job_id, resumed = self._get_or_create_job(df, pdf_folder)
+        with self.pool.connection() as conn:
+            etats = {
+                ligne: (statut, fichier_url)
+                for ligne, statut, fichier_url in conn.execute(
+                    "SELECT ligne, statut, fichier_url FROM import_lignes WHERE job_id=?", (job_id,)
+                )
+            }
+        inseres = {ligne for ligne, (statut, _) in etats.items() if statut == "insere"}
+        stockes = {
+            ligne: fichier_url for ligne, (statut, fichier_url) in etats.items()
+            if statut == "fichier_stocke" and fichier_url
+        }
+
+        # Les lignes déjà insérées lors d'un passage précédent sont ignorées
+        a_traiter = df[~(df.index.to_series() + 2).isin(inseres)]
+        valides, erreurs = validate_memoires(a_traiter, pdf_folder, filieres_map, sessions_map)
+
+        # Journal : nouvelles lignes valides, erreurs de validation
+        journal = [
+            (job_id, idx + 2, "erreur", str(a_traiter.at[idx, 'nom_fichier']), None, None, message)
+            for idx, message in erreurs.items()
+        ]
+        journal += [
+            (job_id, idx + 2, "valide", str(nom_fichier), None, None, None)
+            for idx, nom_fichier in valides['nom_fichier'].items()
+            if idx + 2 not in stockes
+        ]
+        with self.pool.transaction() as conn:
+            conn.executemany("""
+            INSERT INTO import_lignes (job_id, ligne, statut, nom_fichier, hash, fichier_url, erreur)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (job_id, ligne) DO UPDATE SET
+                statut = excluded.statut, nom_fichier = excluded.nom_fichier,
+                hash = excluded.hash, fichier_url = excluded.fichier_url, erreur = excluded.erreur
+            """, journal)
+        # Fichiers copiés pour des lignes devenues invalides
+        for idx in erreurs.index:
+            if idx + 2 in stockes:
+                self.storage.delete_file(stockes[idx + 2])
+
+        # Valeurs manquantes des colonnes optionnelles : NULL comme les autres
+        optionnels = pd.DataFrame(index=valides.index)
+        for col in ('tags', 'version'):
+            values = valides[col] if col in valides.columns else pd.Series('', index=valides.index)
+            optionnels[col] = values.astype(object).where(values.notna(), None)
+
+        date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        records = zip(
+            valides.index + 2,
+            valides['titre'], valides['auteurs'], valides['encadreur'], valides['resume'],
+            optionnels['tags'],
+            valides['filiere_nom'].map(filieres_map),
+            valides['annee_universitaire'].map(sessions_map),
+            optionnels['version']
+        )
+        tasks = [
+            (job_id, idx + 2, pdf_path, stockes.get(idx + 2))
+            for idx, pdf_path in valides['pdf_path'].items()
+        ]
+
+        report = {
+            'job_id': job_id,
+            'resumed': resumed,
+            'skipped_count': len(inseres),
+            'success_count': 0,
+            'error_count': len(erreurs),
+            'errors': erreurs.tolist()
+        }
+        chunk = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # map() conserve l'ordre des lignes ; les copies avancent pendant les insertions
+            stored = executor.map(self._store_pdf, tasks)
+            for record, task, (stored_path, error) in zip(records, tasks, stored):
+                ligne, titre, auteurs, encadreur, resume, tags, filiere_id, session_id, version = record
+                if error:
+                    self._set_ligne(job_id, ligne, "erreur", erreur=error)
+                    report['error_count'] += 1
+                    report['errors'].append(f"Ligne {ligne}: {error}")
+                    continue
+
+                chunk.append((ligne, (
+                    titre, auteurs, encadreur, resume, stored_path, tags,
+                    int(filiere_id), int(session_id), version, date_now
+                ), task[2]))
+                if len(chunk) >= self.chunk_size:
+                    self._insert_chunk(job_id, chunk, report)
+                    chunk = []
+
+        if chunk:
+            self._insert_chunk(job_id, chunk, report)
+
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "UPDATE import_jobs SET statut='termine', date_maj=? WHERE id=?",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id)
+            )
+        return report
+
+    def get_unfinished_jobs(self):
+        """Retourne les imports en cours ou interrompus, avec leur avancement."""
+        with self.pool.connection() as conn:
+            return pd.read_sql_query("""
+            SELECT j.id, j.pdf_folder, j.lignes_total,
+                   COUNT(CASE WHEN l.statut = 'insere' THEN 1 END) AS lignes_inserees,
+                   j.date_maj
+            FROM import_jobs j
+            LEFT JOIN import_lignes l ON l.job_id = j.id
+            WHERE j.statut = 'en_cours'
+            GROUP BY j.id
+            ORDER BY j.date_maj DESC
+            """, conn)
@@ -17,6 +17,151 @@ AWS_CONFIG = {
     "bucket_name": "memoires-unstim"
 }
 
+# Configuration SQLite (pool de connexions partagé, voir db_pool.py)
+SQLITE_CONFIG = {
+    "db_path": "data/memoires_db.sqlite",
+    "pool_size": 8,  # Connexions libres conservées par base
+    "timeout": 30,  # Secondes d'attente sur un verrou
+    "cached_statements": 256,  # Requêtes préparées gardées en cache par connexion
+    "pragmas": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "cache_size": -16000,  # 16 MB
+        "busy_timeout": 30000
+    }
+}
+
+# Extraction du texte des PDFs en arrière-plan (voir pdf_extraction.py)
+PDF_EXTRACTION_CONFIG = {
+    "max_workers": 2,  # Processus d'extraction parallèles
+    "batch_size": 100,  # Pages écrites par transaction
+    "download_workers": 2,  # Threads qui préparent les fichiers (copie locale depuis S3)
+    "max_local_copies": 4  # Copies locales en attente d'extraction au plus
+}
+
+# Import en masse des mémoires (voir bulk_import.py)
+BULK_IMPORT_CONFIG = {
+    "max_workers": 4,  # Copies de PDFs en parallèle
+    "chunk_size": 500  # Mémoires insérés par transaction
+}
+
+# Serveur de fichiers (diffusion des PDFs par plages d'octets, voir file_server.py)
+FILE_SERVER_CONFIG = {
+    "host": os.getenv("FILE_SERVER_HOST", "0.0.0.0"),
+    "port": int(os.getenv("FILE_SERVER_PORT", "8502")),
+    # Adresse vue par le navigateur (à adapter derrière un proxy)
+    "public_url": os.getenv("FILE_SERVER_PUBLIC_URL", "http://localhost:8502"),
+    # Clé de signature des liens ; générée au démarrage si absente
+    "secret": os.getenv("FILE_SERVER_SECRET"),
+    "url_expires": 3600  # Durée de validité des liens en secondes
+}
+
+# Stockage des fichiers (voir storage.py)
+STORAGE_CONFIG = {
+    # Pilote des nouveaux fichiers : "local" (data/files) ou "s3"
+    "backend": os.getenv("STORAGE_BACKEND", "local"),
+    # Fichiers nommés par leur SHA-256 : un même PDF n'est stocké qu'une fois
+    "content_addressed": True,
+    "chunk_size": 1024 * 1024,  # Taille des blocs de copie
+    "temp_dir": "data/temp",
+    # Stockage compatible S3 (AWS, MinIO...), voir s3_storage.py
+    "s3": {
+        "bucket": os.getenv("S3_BUCKET"),
+        # Adresse d'un service compatible (MinIO) ; None pour AWS
+        "endpoint_url": os.getenv("S3_ENDPOINT_URL"),
+        "region_name": os.getenv("AWS_REGION", AWS_CONFIG["region_name"]),
+        "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+        "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+        "multipart_threshold": 8 * 1024 * 1024,  # Envoi en plusieurs parties au-delà
+        "multipart_chunksize": 8 * 1024 * 1024,
+        "max_concurrency": 4
+    },
+    # Niveau froid : PDFs locaux peu consultés recompressés en zstd (voir tiering.py)
+    "cold_tier": {
+        "enabled": os.getenv("COLD_TIER_ENABLED", "0") == "1",
+        "after_days": 365,  # Sans consultation depuis ce délai : niveau froid
+        "rewarm_after": 3,  # Consultations d'un fichier froid avant son retour au niveau chaud
+        "level": 19,  # Niveau zstd (la décompression reste rapide quel que soit le niveau)
+        "min_gain": 0.05,  # Gain de place minimal, sinon le fichier reste chaud
+        "interval": 600,  # Secondes entre deux passages
+        "batch_size": 100  # Fichiers lus en base par requête
+    }
+}
+
+# Sauvegardes de la base (API de sauvegarde en ligne de SQLite, voir backup_manager.py)
+BACKUP_CONFIG = {
+    "backup_dir": "data/backups",
+    "max_backups": 5,  # Nombre maximum de sauvegardes à conserver
+    "pages_per_step": 256,  # Pages copiées par étape (1 MB avec des pages de 4 KB)
+    "step_sleep": 0.005,  # Pause entre deux étapes, en secondes
+    # Compression des sauvegardes : None, "gzip" ou "zstd" (module zstandard)
+    "compression": os.getenv("BACKUP_COMPRESSION") or None
+}
+
+# Sauvegarde continue : envoi des nouvelles trames du WAL (voir wal_shipping.py)
+WAL_SHIPPING_CONFIG = {
+    "enabled": os.getenv("WAL_SHIPPING", "0") == "1",
+    "replica_dir": "data/backups/wal",
+    "interval": 10,  # Secondes entre deux envois (précision de la restauration à une date)
+    "snapshot_interval": 24 * 3600,  # Nouvelle génération (instantané complet) chaque jour
+    "max_generations": 3,  # Générations conservées
+    # Segments en attente d'envoi (réplique indisponible) ; au-delà, nouvelle génération
+    "max_spool_bytes": 512 * 1024 * 1024,
+    "jitter": 0.2,  # Variation aléatoire de l'intervalle (±20 %)
+    "max_retries": 3,  # Nouvelles tentatives après un échec d'envoi
+    "retry_delay": 2  # Secondes avant la première nouvelle tentative (doublées ensuite)
+}
+
+# Journal d'audit en écriture différée (voir log_queue.py)
+LOG_QUEUE_CONFIG = {
+    "max_size": 10000,  # Entrées en attente au plus ; au-delà, add() attend
+    "put_timeout": 2,  # Secondes d'attente d'une place avant l'écriture directe
+    "batch_size": 500,  # Entrées écrites par transaction au plus
+    "flush_interval": 0.5,  # Secondes pendant lesquelles les entrées sont regroupées
+    "max_retries": 3,  # Nouvelles tentatives d'écriture d'un lot
+    # Lignes refusées même une par une, gardées en JSON Lines plutôt que perdues
+    "spill_file": "data/write_behind_rejets.jsonl"
+}
+
+# Rétention des logs : archives mensuelles et agrégats quotidiens (voir log_retention.py)
+LOG_RETENTION_CONFIG = {
+    "enabled": os.getenv("LOG_RETENTION", "1") == "1",
+    "archive_dir": "data/logs_archive",  # Un fichier SQLite par mois
+    "hot_days": 90,  # Jours gardés dans la table logs
+    "archive_months": 24,  # Mois d'archives détaillées conservés (les agrégats restent)
+    "events_days": 365,  # Jours d'événements détaillés conservés (voir activity.py)
+    "interval": 3600,  # Secondes entre deux passages
+    "batch_size": 5000,  # Entrées archivées par transaction
+    "page_size": 50  # Lignes par page du journal d'activité
+}
+
+# Mesure des requêtes SQL et du rendu des pages (voir instrumentation.py)
+INSTRUMENTATION_CONFIG = {
+    "enabled": os.getenv("INSTRUMENTATION", "1") == "1",
+    "max_queries": 5000,  # Dernières requêtes gardées en mémoire
+    "max_pages": 1000,  # Derniers rendus de pages gardés en mémoire
+    "export_dir": "data/perf"  # Exports JSON Lines depuis la page Performance
+}
+
+# Banc d'essai : corpus synthétique et mesure des opérations principales (voir benchmark/)
+BENCHMARK_CONFIG = {
+    "workspace": "data/benchmark",  # Corpus générés, copie de travail et résultats JSON
+    "seed": 42,  # Même graine et même taille : même corpus
+    "repeat": 5,  # Mesures par opération, après un appel de chauffe
+    "pdf_files": 200,  # Fichiers PDF distincts, partagés entre les mémoires du corpus
+    "pdf_min_size": 20 * 1024,  # Bornes de la taille des PDFs (répartition log-uniforme)
+    "pdf_max_size": 2 * 1024 * 1024,
+    "pages_per_memoire": (1, 5),  # Pages de texte extrait par mémoire (bornes incluses)
+    "words_per_page": 150,
+    "file_size": 1024 * 1024,  # Taille des fichiers de la mesure du stockage
+    "import_size": 100,  # Mémoires du fichier d'import en masse
+    "batch_size": 2000  # Mémoires insérés par transaction lors de la génération
+}
+
+# Cache mémoire des fichiers téléchargés depuis l'interface (voir storage.FileCache)
+FILE_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
 # Autres configurations
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100 MB
 ALLOWED_EXTENSIONS = {'pdf'} 
\ No newline at end of file
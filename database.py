@@ -1,16 +1,23 @@
 import sqlite3
 import os
-from datetime import datetime
+from db_pool import get_pool
+from log_queue import LogQueue
+from migrations import run_migrations
+from reference_cache import reference_cache
 
 class DatabaseManager:
     def __init__(self):
         self.db_path = "data/memoires_db.sqlite"
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.pool = get_pool(self.db_path)
         self.init_db()
+        # Logs écrits par lots en arrière-plan
+        self.log_queue = LogQueue(self.db_path)
+        self.log_queue.start()
     
     def get_connection(self):
-        """Retourne une connexion à la base de données."""
-        return sqlite3.connect(self.db_path)
+        """Retourne une connexion du pool partagé (close() la rend au pool)."""
+        return self.pool.acquire()
     
     def reset_db(self):
         """Réinitialise la base de données en supprimant toutes les tables."""
@@ -18,115 +25,45 @@ class DatabaseManager:
             conn = self.get_connection()
             c = conn.cursor()
             
-            # Supprimer toutes les tables existantes
+            # Supprimer toutes les tables existantes (les triggers FTS partent avec memoires/pdf_content)
+            c.execute("DROP TABLE IF EXISTS memoires_fts")
+            c.execute("DROP TABLE IF EXISTS pdf_content_fts")
+            c.execute("DROP TABLE IF EXISTS extraction_jobs")
+            c.execute("DROP TABLE IF EXISTS pdf_content")
+            c.execute("DROP TABLE IF EXISTS statistiques")
+            c.execute("DROP TABLE IF EXISTS import_lignes")
+            c.execute("DROP TABLE IF EXISTS import_jobs")
+            c.execute("DROP TABLE IF EXISTS evenements_quotidiens")
+            c.execute("DROP TABLE IF EXISTS evenements")
+            c.execute("DROP TABLE IF EXISTS fichiers_acces")
+            c.execute("DROP TABLE IF EXISTS fichiers")
             c.execute("DROP TABLE IF EXISTS favoris")
             c.execute("DROP TABLE IF EXISTS memoires")
             c.execute("DROP TABLE IF EXISTS filieres")
             c.execute("DROP TABLE IF EXISTS entites")
             c.execute("DROP TABLE IF EXISTS sessions")
+            c.execute("DROP TABLE IF EXISTS logs_quotidiens")
             c.execute("DROP TABLE IF EXISTS logs")
             c.execute("DROP TABLE IF EXISTS utilisateurs")
+            c.execute("DROP TABLE IF EXISTS schema_version")
             
             conn.commit()
             conn.close()
             
             # Réinitialiser la base de données
             self.init_db()
+            reference_cache.invalidate()
             return True, "Base de données réinitialisée avec succès."
         except Exception as e:
             return False, f"Erreur lors de la réinitialisation de la base de données : {str(e)}"
     
     def init_db(self):
-        """Initialise une nouvelle base de données."""
+        """Met le schéma à jour et crée le compte administrateur par défaut."""
+        run_migrations(self.db_path)
+        
         conn = self.get_connection()
         c = conn.cursor()
         
-        # Table utilisateurs
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS utilisateurs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nom TEXT NOT NULL,
-            prenom TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            mot_de_passe TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'user',
-            date_naissance TEXT,
-            genre TEXT,
-            telephone TEXT,
-            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Table entites
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS entites (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nom TEXT NOT NULL UNIQUE
-        )
-        ''')
-        
-        # Table filieres
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS filieres (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nom TEXT NOT NULL,
-            entite_id INTEGER NOT NULL,
-            FOREIGN KEY (entite_id) REFERENCES entites (id),
-            UNIQUE(nom, entite_id)
-        )
-        ''')
-        
-        # Table sessions
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            annee_universitaire TEXT NOT NULL UNIQUE
-        )
-        ''')
-        
-        # Table memoires
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS memoires (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            titre TEXT NOT NULL,
-            auteurs TEXT NOT NULL,
-            encadreur TEXT NOT NULL,
-            resume TEXT,
-            fichier_url TEXT NOT NULL,
-            tags TEXT,
-            filiere_id INTEGER NOT NULL,
-            session_id INTEGER NOT NULL,
-            version TEXT,
-            date_ajout TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (filiere_id) REFERENCES filieres (id),
-            FOREIGN KEY (session_id) REFERENCES sessions (id)
-        )
-        ''')
-        
-        # Table favoris
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS favoris (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            memoire_id INTEGER NOT NULL,
-            date_ajout TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES utilisateurs (id),
-            FOREIGN KEY (memoire_id) REFERENCES memoires (id),
-            UNIQUE(user_id, memoire_id)
-        )
-        ''')
-        
-        # Table logs
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action TEXT NOT NULL,
-            user_id INTEGER,
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES utilisateurs (id)
-        )
-        ''')
-        
         # Création du compte administrateur par défaut si aucun admin n'existe
         c.execute("SELECT COUNT(*) FROM utilisateurs WHERE role='admin'")
         admin_count = c.fetchone()[0]
@@ -167,15 +104,13 @@ class DatabaseManager:
         """
         Ajoute une nouvelle entrée dans la table des logs.
         
+        L'entrée est mise en file et écrite en arrière-plan (voir log_queue.py).
+        
         Args:
             action (str): Description de l'action effectuée
             user_id (int, optional): ID de l'utilisateur ayant effectué l'action
         """
-        query = """
-        INSERT INTO logs (action, user_id, date)
-        VALUES (?, ?, ?)
-        """
-        self.execute_query(query, (action, user_id, datetime.now()), fetch=False)
+        self.log_queue.add(action, user_id)
 
     def get_logs(self, limit=100, user_id=None):
         """
@@ -188,6 +123,7 @@ class DatabaseManager:
         Returns:
             list: Liste des logs avec les détails de chaque action
         """
+        self.log_queue.flush()
         if user_id:
             query = """
             SELECT l.*, u.nom, u.email 
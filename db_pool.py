@@ -0,0 +1,162 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from config import SQLITE_CONFIG
+from instrumentation import TimedCursor, metrics
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connexion SQLite dont close() la rend au pool au lieu de la fermer.
+
+    Ses requêtes sont mesurées (voir instrumentation.py), y compris celles de
+    pd.read_sql_query, qui passe par cursor().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._generation = 0
+        self._checked_out = False
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = TimedCursor if metrics.enabled else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def _close_for_real(self):
+        self._pool = None
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, db_path, pool_size=None, timeout=None, cached_statements=None, pragmas=None):
+        self.db_path = db_path
+        self.pool_size = pool_size or SQLITE_CONFIG["pool_size"]
+        self.timeout = timeout or SQLITE_CONFIG["timeout"]
+        self.cached_statements = cached_statements or SQLITE_CONFIG["cached_statements"]
+        self.pragmas = dict(SQLITE_CONFIG["pragmas"])
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        # Au-delà de pool_size connexions libres, les connexions rendues sont fermées
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def _create_connection(self):
+        """Ouvre une nouvelle connexion et applique les pragmas configurés."""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=PooledConnection
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        conn._pool = self
+        conn._generation = self._generation
+        return conn
+
+    def acquire(self):
+        """Emprunte une connexion libre du pool, ou en ouvre une nouvelle."""
+        conn = None
+        while conn is None:
+            try:
+                candidate = self._idle.get_nowait()
+            except queue.Empty:
+                candidate = self._create_connection()
+            if candidate._generation == self._generation:
+                conn = candidate
+            else:
+                candidate._close_for_real()
+
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        """Rend une connexion au pool en annulant toute transaction laissée ouverte."""
+        with self._lock:
+            if not conn._checked_out:
+                return
+            conn._checked_out = False
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            if conn._generation == self._generation and self._idle.qsize() < self.pool_size:
+                self._idle.put(conn)
+            else:
+                conn._close_for_real()
+        except sqlite3.Error as e:
+            print(f"Connexion SQLite écartée du pool: {e}")
+            conn._close_for_real()
+
+    @contextmanager
+    def connection(self):
+        """Contexte qui emprunte une connexion et la rend à la sortie."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Contexte transactionnel : commit en sortie normale, rollback sinon."""
+        with self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close_all(self):
+        """Ferme les connexions libres ; celles empruntées le seront à leur retour."""
+        with self._lock:
+            self._generation += 1
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn._close_for_real()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=None):
+    """Retourne le pool partagé associé au fichier de base de données."""
+    path = os.path.abspath(db_path or SQLITE_CONFIG["db_path"])
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path)
+        return _pools[path]
+
+
+def get_connection(db_path=None):
+    """Emprunte une connexion ; conn.close() la rend au pool."""
+    return get_pool(db_path).acquire()
@@ -0,0 +1,151 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from urllib.parse import quote, urlencode
+
+from werkzeug.exceptions import Forbidden, HTTPException, NotFound
+from werkzeug.routing import Map, Rule
+from werkzeug.serving import make_server
+from werkzeug.utils import send_file
+from werkzeug.wrappers import Request, Response
+
+from config import FILE_SERVER_CONFIG
+
+# Clé de signature des liens (partagée par tous les threads du processus)
+_secret = (FILE_SERVER_CONFIG["secret"] or secrets.token_hex(32)).encode()
+
+
+def _sign(filename, expires):
+    message = f"{filename}:{expires}".encode()
+    return hmac.new(_secret, message, hashlib.sha256).hexdigest()
+
+
+def get_file_url(file_path, download=False, expires=None):
+    """Retourne un lien signé et temporaire vers un fichier 'local://'."""
+    if not file_path.startswith("local://"):
+        raise ValueError("Le chemin du fichier doit commencer par 'local://'")
+
+    filename = file_path.replace("local://", "")
+    # Échéance arrondie à la demi-durée suivante : le lien reste identique d'un
+    # rerun à l'autre, et le navigateur réutilise sa copie (ETag) au lieu de
+    # recharger le PDF (validité entre expires et 1,5 x expires)
+    expires = expires or FILE_SERVER_CONFIG["url_expires"]
+    window = max(1, expires // 2)
+    expires_at = -(-(int(time.time()) + expires) // window) * window
+    params = {"expires": expires_at, "signature": _sign(filename, expires_at)}
+    if download:
+        params["download"] = 1
+    return f"{FILE_SERVER_CONFIG['public_url']}/files/{quote(filename)}?{urlencode(params)}"
+
+
+class FileServer:
+    """Petit serveur WSGI qui diffuse les fichiers du stockage local par morceaux.
+
+    Les réponses gèrent les requêtes partielles (Range), ETag et Last-Modified,
+    ce qui permet au lecteur PDF du navigateur de ne charger que les pages affichées.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.url_map = Map([Rule("/files/<path:filename>", endpoint="file")])
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def serve_file(self, request, filename):
+        expires = request.args.get("expires", type=int)
+        signature = request.args.get("signature", "")
+        if not expires or expires < time.time():
+            raise Forbidden("Lien expiré")
+        if not hmac.compare_digest(signature, _sign(filename, expires)):
+            raise Forbidden("Signature invalide")
+
+        # Résolution par le stockage (sous-dossiers, anciens chemins à plat)
+        file_path = f"local://{filename}"
+        full_path = self.storage.get_download_url(file_path)
+        if full_path is None:
+            if not self.storage.exists(file_path):
+                raise NotFound()
+        elif not os.path.isfile(full_path):
+            raise NotFound()
+
+        # Une consultation compte une fois, pas à chaque plage lue par le lecteur PDF
+        if request.range is None or request.range.ranges[0][0] == 0:
+            self.storage.record_access(file_path)
+
+        download = request.args.get("download") == "1"
+        mimetype = "application/pdf" if filename.lower().endswith(".pdf") else None
+        if full_path is None:
+            return self.stream_file(request, file_path, mimetype, download)
+        return send_file(
+            full_path,
+            request.environ,
+            mimetype=mimetype,
+            as_attachment=download,
+            download_name=os.path.basename(filename),
+            conditional=True,
+            etag=True,
+            max_age=FILE_SERVER_CONFIG["url_expires"]
+        )
+
+    def stream_file(self, request, file_path, mimetype, download):
+        """Diffuse un fichier froid décompressé à la volée (plages et ETag compris)."""
+        size = self.storage.size(file_path)
+        name = os.path.basename(file_path)
+        response = Response(self.storage.stream(file_path), mimetype=mimetype, direct_passthrough=True)
+        if download:
+            response.headers.set("Content-Disposition", "attachment", filename=name)
+        response.cache_control.max_age = FILE_SERVER_CONFIG["url_expires"]
+        if size is None:
+            return response
+        response.content_length = size
+        # Nom adressé par le contenu (SHA-256) : il suffit à identifier la version
+        response.set_etag(f"{name}-{size}")
+        response = response.make_conditional(request, accept_ranges=True, complete_length=size)
+        if response.status_code == 206:
+            # Lecture limitée à la plage demandée, au lieu de découper le flux complet
+            # (le flux d'origine, jamais commencé, n'a pas ouvert le fichier)
+            content_range = response.content_range
+            response.response = self.storage.stream(file_path, content_range.start, content_range.stop - 1)
+        return response
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        adapter = self.url_map.bind_to_environ(environ)
+        try:
+            endpoint, values = adapter.match()
+            response = self.serve_file(request, **values)
+        except HTTPException as e:
+            response = e
+        return response(environ, start_response)
+
+    def start(self, host=None, port=None):
+        """Démarre le serveur dans un thread d'arrière-plan (une seule fois par instance)."""
+        with self._lock:
+            if self._thread is not None:
+                return True
+            try:
+                self._server = make_server(
+                    host or FILE_SERVER_CONFIG["host"],
+                    port or FILE_SERVER_CONFIG["port"],
+                    self,
+                    threaded=True
+                )
+            except OSError as e:
+                print(f"Erreur lors du démarrage du serveur de fichiers: {e}")
+                return False
+
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+            print(f"✓ Serveur de fichiers démarré sur le port {self._server.server_port}")
+            return True
+
+    def stop(self):
+        with self._lock:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server = None
+                self._thread = None
@@ -23,12 +23,13 @@ from theme import setup_theme, section_title, card, metric_card, info_card, acti
 setup_theme()
 
 from apps import (
-    show_login_page, get_all_memoires, get_download_link, 
+    show_login_page, search_memoires_page, get_download_link, track_event,
     show_home_page as show_admin_home, show_search_page, 
     show_statistics_page, show_entities_management,
     show_filieres_management, show_sessions_management,
-    show_memoires_management, show_logs
+    show_memoires_management, show_logs, show_performance_page
 )
+from instrumentation import metrics
 
 def show_welcome_page():
     # En-tête principal avec logos
@@ -102,7 +103,7 @@ def show_welcome_page():
         </h2>
     """, unsafe_allow_html=True)
     
-    memoires = get_all_memoires().head(5)
+    memoires, _, _ = search_memoires_page(page_size=5)
     
     if len(memoires) == 0:
         st.markdown("""
@@ -175,7 +176,8 @@ def show_welcome_page():
                                 st.rerun()
                     else:
                         if st.button("📥 Télécharger", key=f"download_{memoire['id']}", use_container_width=True):
-                            get_download_link(memoire['fichier_pdf'], "Télécharger le PDF")
+                            track_event("telechargement", memoire['id'])
+                            st.markdown(get_download_link(memoire['fichier_url'], "Télécharger le PDF"), unsafe_allow_html=True)
                 
                 st.info(memoire['resume'])
                 st.markdown(f"**🏷️ Mots-clés:** {memoire['tags']}")
@@ -478,7 +480,8 @@ def main():
             if st.session_state.user_role == "admin":
                 menu = st.radio("Navigation", 
                     ["Accueil", "Recherche", "Statistiques", "Gestion des Entités", 
-                    "Gestion des Filières", "Gestion des Sessions", "Gestion des Mémoires", "Journal d'activité"])
+                    "Gestion des Filières", "Gestion des Sessions", "Gestion des Mémoires", "Journal d'activité",
+                    "Performance"])
             else:
                 menu = st.radio("Navigation", ["Accueil", "Recherche", "Statistiques"])
             
@@ -492,28 +495,34 @@ def main():
                 st.rerun()
         
         # Navigation vers les différentes pages
-        if menu == "Accueil":
-            show_home_page()
-        elif menu == "Recherche":
-            show_search_page()
-        elif menu == "Statistiques":
-            show_statistics_page()
-        elif menu == "Gestion des Entités" and st.session_state.user_role == "admin":
-            show_entities_management()
-        elif menu == "Gestion des Filières" and st.session_state.user_role == "admin":
-            show_filieres_management()
-        elif menu == "Gestion des Sessions" and st.session_state.user_role == "admin":
-            show_sessions_management()
-        elif menu == "Gestion des Mémoires" and st.session_state.user_role == "admin":
-            show_memoires_management()
-        elif menu == "Journal d'activité" and st.session_state.user_role == "admin":
-            show_logs()
+        with metrics.page_timer(menu):
+            if menu == "Accueil":
+                show_home_page()
+            elif menu == "Recherche":
+                show_search_page()
+            elif menu == "Statistiques":
+                show_statistics_page()
+            elif menu == "Gestion des Entités" and st.session_state.user_role == "admin":
+                show_entities_management()
+            elif menu == "Gestion des Filières" and st.session_state.user_role == "admin":
+                show_filieres_management()
+            elif menu == "Gestion des Sessions" and st.session_state.user_role == "admin":
+                show_sessions_management()
+            elif menu == "Gestion des Mémoires" and st.session_state.user_role == "admin":
+                show_memoires_management()
+            elif menu == "Journal d'activité" and st.session_state.user_role == "admin":
+                show_logs()
+            elif menu == "Performance" and st.session_state.user_role == "admin":
+                show_performance_page()
     elif st.session_state.show_login:
-        if show_login_page():
+        with metrics.page_timer("Connexion"):
+            logged_in = show_login_page()
+        if logged_in:
             st.session_state.show_login = False
             st.rerun()
     else:
-        show_welcome_page()
+        with metrics.page_timer("Bienvenue"):
+            show_welcome_page()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+
+from config import INSTRUMENTATION_CONFIG
+
+# Bornes (ms) des classes des histogrammes de durée
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Forme canonique d'une requête : littéraux remplacés par ?, espaces réduits."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?, ...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def percentile(values, p):
+    """Percentile p (0-100) par rang le plus proche ; None pour une liste vide."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def histogram(durations_ms):
+    """Nombre de durées par classe : [(libellé, nombre)]."""
+    counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    for duration in durations_ms:
+        index = 0
+        while index < len(HISTOGRAM_BOUNDS) and duration > HISTOGRAM_BOUNDS[index]:
+            index += 1
+        counts[index] += 1
+    labels = [f"≤ {bound} ms" for bound in HISTOGRAM_BOUNDS] + [f"> {HISTOGRAM_BOUNDS[-1]} ms"]
+    return list(zip(labels, counts))
+
+
+class Metrics:
+    """Mesures récentes des requêtes SQL et des pages, en mémoire.
+
+    Deux tampons circulaires bornés (max_queries et max_pages entrées) : les
+    mesures les plus anciennes sont oubliées. Une requête exécutée pendant le
+    rendu d'une page (voir page_timer) lui est rattachée.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or INSTRUMENTATION_CONFIG
+        self.enabled = self.config["enabled"]
+        self._queries = deque(maxlen=self.config["max_queries"])
+        self._pages = deque(maxlen=self.config["max_pages"])
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, duration, rows):
+        entry = (time.time(), sql, duration * 1000, rows, getattr(self._local, "page", None))
+        with self._lock:
+            self._queries.append(entry)
+
+    def record_page(self, name, duration):
+        with self._lock:
+            self._pages.append((time.time(), name, duration * 1000))
+
+    @contextmanager
+    def page_timer(self, name):
+        """Mesure le rendu d'une page et y rattache ses requêtes."""
+        if not self.enabled:
+            yield
+            return
+        previous, self._local.page = getattr(self._local, "page", None), name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.page = previous
+            self.record_page(name, time.perf_counter() - start)
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._queries), list(self._pages)
+
+    def query_stats(self):
+        """Statistiques par requête normalisée, de la plus coûteuse au total à la moins coûteuse."""
+        queries, _ = self._snapshot()
+        groups = {}
+        for _, sql, duration, rows, _ in queries:
+            group = groups.setdefault(normalize_sql(sql), ([], []))
+            group[0].append(duration)
+            group[1].append(rows)
+        stats = [
+            {
+                "requete": sql,
+                "nombre": len(durations),
+                "p50_ms": percentile(durations, 50),
+                "p95_ms": percentile(durations, 95),
+                "max_ms": max(durations),
+                "total_ms": sum(durations),
+                "lignes_moy": sum(rows) / len(rows)
+            }
+            for sql, (durations, rows) in groups.items()
+        ]
+        return sorted(stats, key=lambda stat: stat["total_ms"], reverse=True)
+
+    def page_stats(self):
+        """Statistiques par page, avec le nombre moyen de requêtes par rendu."""
+        queries, pages = self._snapshot()
+        requetes_par_page = {}
+        for _, _, _, _, page in queries:
+            requetes_par_page[page] = requetes_par_page.get(page, 0) + 1
+        groups = {}
+        for _, name, duration in pages:
+            groups.setdefault(name, []).append(duration)
+        stats = [
+            {
+                "page": name,
+                "rendus": len(durations),
+                "p50_ms": percentile(durations, 50),
+                "p95_ms": percentile(durations, 95),
+                "max_ms": max(durations),
+                "requetes_par_rendu": requetes_par_page.get(name, 0) / len(durations)
+            }
+            for name, durations in groups.items()
+        ]
+        return sorted(stats, key=lambda stat: stat["p95_ms"], reverse=True)
+
+    def slowest_queries(self, limit=20):
+        """Exécutions les plus lentes : (date, requête, durée en ms, lignes, page)."""
+        queries, _ = self._snapshot()
+        return sorted(queries, key=lambda entry: entry[2], reverse=True)[:limit]
+
+    def durations(self, kind="page"):
+        """Durées (ms) des pages ou des requêtes, pour les histogrammes."""
+        queries, pages = self._snapshot()
+        return [entry[2] for entry in pages] if kind == "page" else [entry[2] for entry in queries]
+
+    def export(self, path=None):
+        """Écrit les mesures en JSON Lines (une mesure par ligne) ; retourne le chemin."""
+        path = path or os.path.join(
+            self.config["export_dir"], f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        queries, pages = self._snapshot()
+        with open(path, "w", encoding="utf-8") as f:
+            for date, sql, duration, rows, page in queries:
+                f.write(json.dumps({
+                    "type": "requete", "date": date, "requete": normalize_sql(sql),
+                    "duree_ms": round(duration, 3), "lignes": rows, "page": page
+                }, ensure_ascii=False) + "\n")
+            for date, name, duration in pages:
+                f.write(json.dumps({
+                    "type": "page", "date": date, "page": name, "duree_ms": round(duration, 3)
+                }, ensure_ascii=False) + "\n")
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._pages.clear()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Curseur qui mesure chaque requête : exécution, puis lecture des lignes.
+
+    La mesure est enregistrée à la requête suivante, à la lecture de toutes les
+    lignes (fetchall) ou à la fermeture du curseur.
+    """
+
+    _pending = None
+
+    def _finish(self):
+        if self._pending is not None:
+            sql, duration, rows = self._pending
+            self._pending = None
+            metrics.record_query(sql, duration, rows if rows else max(self.rowcount, 0))
+
+    def _timed(self, method, sql, *args):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            self._pending = [sql, time.perf_counter() - start, 0]
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def _fetched(self, start, count):
+        if self._pending is not None:
+            self._pending[1] += time.perf_counter() - start
+            self._pending[2] += count
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        self._fetched(start, 1)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+# Instance partagée par tout le processus
+metrics = Metrics()
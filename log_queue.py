@@ -0,0 +1,144 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from config import LOG_QUEUE_CONFIG
+from db_pool import get_pool
+
+INSERT_LOG_QUERY = "INSERT INTO logs (action, user_id, date) VALUES (?, ?, ?)"
+
+
+class WriteBehindQueue:
+    """Insertions en écriture différée, par lots.
+
+    put() met la ligne en file et rend la main sans transaction ; un thread
+    l'écrit avec celles arrivées dans les flush_interval secondes suivantes
+    (batch_size au plus), en une seule transaction. La file est bornée : pleine,
+    put() attend jusqu'à put_timeout secondes, puis écrit la ligne directement
+    plutôt que de la perdre. Les lignes en attente sont écrites à l'arrêt.
+    Un lot encore en échec après max_retries nouvelles tentatives est écrit ligne
+    par ligne ; les lignes refusées une à une sont ajoutées à spill_file.
+    """
+
+    def __init__(self, db_path, insert_query, config=None):
+        self.pool = get_pool(db_path)
+        self.insert_query = insert_query
+        self.config = config or LOG_QUEUE_CONFIG
+        self._queue = queue.Queue(maxsize=self.config["max_size"])
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _write(self, rows):
+        with self.pool.transaction() as conn:
+            conn.executemany(self.insert_query, rows)
+
+    def _write_rows(self, rows):
+        """Écrit les lignes une par une : une ligne invalide ne fait pas perdre les autres."""
+        for row in rows:
+            try:
+                self._write([row])
+            except Exception as e:
+                self._spill(row, e)
+
+    def _spill(self, row, error):
+        """Garde une ligne refusée dans spill_file (JSON Lines), pour la rejouer plus tard."""
+        path = self.config["spill_file"]
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(
+                    {"requete": self.insert_query, "ligne": list(row), "erreur": str(error)},
+                    ensure_ascii=False, default=str
+                ) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            print(f"Ligne non écrite, conservée dans {path}: {error}")
+        except OSError as e:
+            print(f"Ligne perdue ({error}) : impossible d'écrire dans {path}: {e}")
+
+    def put(self, row):
+        """Met une ligne en file (écrite directement si le thread n'est pas démarré)."""
+        if self._thread is None:
+            self._write([row])
+            return
+        try:
+            self._queue.put(row, timeout=self.config["put_timeout"])
+        except queue.Full:
+            print("File d'écriture pleine : écriture directe de la ligne")
+            self._write([row])
+
+    def _next_batch(self):
+        """Attend une ligne, puis regroupe celles qui arrivent pendant flush_interval."""
+        batch = [self._queue.get(timeout=self.config["flush_interval"])]
+        deadline = time.monotonic() + self.config["flush_interval"]
+        while len(batch) < self.config["batch_size"]:
+            remaining = deadline - time.monotonic()
+            try:
+                # À l'arrêt, on vide la file sans attendre
+                batch.append(self._queue.get_nowait() if self._stop.is_set() or remaining <= 0
+                             else self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            try:
+                batch = self._next_batch()
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+
+            for attempt in range(self.config["max_retries"] + 1):
+                try:
+                    self._write(batch)
+                    break
+                except Exception as e:
+                    print(f"Erreur lors de l'écriture de {len(batch)} ligne(s) (tentative {attempt + 1}): {e}")
+                    time.sleep(self.config["flush_interval"])
+            else:
+                self._write_rows(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout=5):
+        """Attend que les lignes en file soient écrites (au plus timeout secondes)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def start(self):
+        """Démarre l'écriture en arrière-plan (une seule fois par instance)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        """Écrit les lignes en attente puis arrête le thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)
+
+
+class LogQueue(WriteBehindQueue):
+    """Journal d'audit en écriture différée : add() ne fait aucune transaction."""
+
+    def __init__(self, db_path=None, config=None):
+        super().__init__(db_path, INSERT_LOG_QUERY, config)
+
+    def add(self, action, user_id=None):
+        """Ajoute une entrée au journal (horodatée maintenant, écrite plus tard)."""
+        self.put((action, user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
@@ -0,0 +1,232 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from config import LOG_RETENTION_CONFIG
+from db_pool import get_pool
+from migrations import run_migrations
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    action TEXT NOT NULL,
+    user_id INTEGER,
+    date TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_logs_date ON logs (date);
+CREATE INDEX IF NOT EXISTS idx_logs_user_date ON logs (user_id, date);
+"""
+
+UPSERT_QUOTIDIEN_QUERY = """
+INSERT INTO logs_quotidiens (jour, categorie, user_id, nb) VALUES (?, ?, ?, ?)
+ON CONFLICT (jour, categorie, user_id) DO UPDATE SET nb = nb + excluded.nb
+"""
+
+
+def log_category(action):
+    """Catégorie d'une action : son libellé sans le détail variable (titre, email...)."""
+    return re.split(r":| pour | avec ", action, maxsplit=1)[0].strip()
+
+
+def archive_path(month, archive_dir=None):
+    """Fichier d'archive du mois 'AAAA-MM'."""
+    archive_dir = archive_dir or LOG_RETENTION_CONFIG["archive_dir"]
+    return os.path.join(archive_dir, f"logs_{month.replace('-', '_')}.sqlite")
+
+
+def list_archives(archive_dir=None):
+    """Mois archivés ('AAAA-MM'), du plus récent au plus ancien."""
+    archive_dir = archive_dir or LOG_RETENTION_CONFIG["archive_dir"]
+    if not os.path.isdir(archive_dir):
+        return []
+    months = [
+        filename[len("logs_"):-len(".sqlite")].replace("_", "-")
+        for filename in os.listdir(archive_dir)
+        if re.fullmatch(r"logs_\d{4}_\d{2}\.sqlite", filename)
+    ]
+    return sorted(months, reverse=True)
+
+
+def query_logs(db_path=None, user_id=None, action=None, date_from=None, date_to=None,
+               cursor=None, limit=None, month=None):
+    """Une page du journal, du plus récent au plus ancien.
+
+    user_id : 0 pour les visiteurs ; action : texte contenu dans l'action ;
+    date_from / date_to : dates (incluses) ; cursor : curseur retourné pour la
+    page précédente ; month : 'AAAA-MM' pour lire une archive plutôt que la table
+    logs. Retourne (lignes (id, action, utilisateur, date), curseur suivant ou None).
+    """
+    limit = limit or LOG_RETENTION_CONFIG["page_size"]
+    conditions, params = [], []
+    if user_id == 0:
+        conditions.append("user_id IS NULL")
+    elif user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if action:
+        conditions.append("action LIKE ?")
+        params.append(f"%{action}%")
+    if date_from:
+        conditions.append("date >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        conditions.append("date < ?")
+        params.append((date_to + timedelta(days=1)).isoformat())
+    if cursor:
+        # Pagination par clé : reprend juste après la dernière ligne affichée
+        conditions.append("date <= ? AND (date < ? OR id < ?)")
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT id, action, user_id, date FROM logs {where} ORDER BY date DESC, id DESC LIMIT ?"
+
+    pool = get_pool(db_path)
+    if month:
+        path = archive_path(month)
+        if not os.path.exists(path):
+            return [], None
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute(query, (*params, limit + 1)).fetchall()
+        finally:
+            conn.close()
+    else:
+        with pool.connection() as conn:
+            rows = conn.execute(query, (*params, limit + 1)).fetchall()
+
+    next_cursor = (rows[limit - 1][3], rows[limit - 1][0]) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    # Noms des seuls utilisateurs de la page
+    user_ids = sorted({row[2] for row in rows if row[2] is not None})
+    noms = {}
+    if user_ids:
+        with pool.connection() as conn:
+            noms = dict(conn.execute(
+                f"SELECT id, nom FROM utilisateurs WHERE id IN ({', '.join('?' * len(user_ids))})",
+                user_ids
+            ).fetchall())
+    return [(id_, action, noms.get(uid), date) for id_, action, uid, date in rows], next_cursor
+
+
+class LogRetentionJob:
+    """Archive par mois les logs plus anciens que hot_days et les résume par jour.
+
+    Les entrées quittent la table logs pour un fichier SQLite par mois (voir
+    archive_path) ; chaque lot est compté dans logs_quotidiens par la transaction
+    qui le supprime de logs. Les archives de plus de archive_months mois sont
+    supprimées : seuls leurs agrégats quotidiens restent. De même, les
+    événements de plus de events_days jours sont supprimés ; leurs compteurs
+    quotidiens (evenements_quotidiens) sont conservés.
+    """
+
+    def __init__(self, db_path=None, config=None):
+        self.pool = get_pool(db_path)
+        self.config = config or LOG_RETENTION_CONFIG
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _archive(self, month, rows):
+        """Écrit des logs dans l'archive du mois (sans doublon si un lot est repris)."""
+        os.makedirs(self.config["archive_dir"], exist_ok=True)
+        conn = sqlite3.connect(archive_path(month, self.config["archive_dir"]))
+        try:
+            conn.executescript(ARCHIVE_SCHEMA)
+            conn.executemany("INSERT OR IGNORE INTO logs (id, action, user_id, date) VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run_once(self):
+        """Effectue un passage complet et retourne son bilan."""
+        report = {"archives": 0, "mois": set(), "fichiers_supprimes": 0, "evenements_supprimes": 0}
+        limite = (datetime.now() - timedelta(days=self.config["hot_days"])).strftime("%Y-%m-%d")
+        while not self._stop.is_set():
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, action, user_id, date FROM logs WHERE date < ? ORDER BY date, id LIMIT ?",
+                    (limite, self.config["batch_size"])
+                ).fetchall()
+            if not rows:
+                break
+
+            by_month = {}
+            quotidiens = Counter()
+            for row in rows:
+                date = str(row[3])
+                by_month.setdefault(date[:7], []).append(row)
+                quotidiens[(date[:10], log_category(row[1]), row[2] or 0)] += 1
+            # Archive écrite avant de supprimer les entrées de la base
+            for month, month_rows in by_month.items():
+                self._archive(month, month_rows)
+            with self.pool.transaction() as conn:
+                conn.executemany(UPSERT_QUOTIDIEN_QUERY, [(*key, nb) for key, nb in quotidiens.items()])
+                conn.executemany("DELETE FROM logs WHERE id = ?", [(row[0],) for row in rows])
+            report["archives"] += len(rows)
+            report["mois"].update(by_month)
+
+        limite = (datetime.now() - timedelta(days=self.config["events_days"])).strftime("%Y-%m-%d")
+        while not self._stop.is_set():
+            with self.pool.transaction() as conn:
+                deleted = conn.execute(
+                    "DELETE FROM evenements WHERE id IN (SELECT id FROM evenements WHERE date < ? LIMIT ?)",
+                    (limite, self.config["batch_size"])
+                ).rowcount
+            if not deleted:
+                break
+            report["evenements_supprimes"] += deleted
+
+        now = datetime.now()
+        annee, mois = divmod(now.year * 12 + now.month - 1 - self.config["archive_months"], 12)
+        premier_conserve = f"{annee:04d}-{mois + 1:02d}"
+        for month in list_archives(self.config["archive_dir"]):
+            if month < premier_conserve:
+                os.remove(archive_path(month, self.config["archive_dir"]))
+                report["fichiers_supprimes"] += 1
+        return report
+
+    def _loop(self):
+        while not self._stop.wait(self.config["interval"]):
+            try:
+                report = self.run_once()
+                if report["archives"] or report["fichiers_supprimes"] or report["evenements_supprimes"]:
+                    print(
+                        f"✓ Logs : {report['archives']} entrée(s) archivée(s), "
+                        f"{report['fichiers_supprimes']} archive(s) expirée(s) supprimée(s), "
+                        f"{report['evenements_supprimes']} événement(s) ancien(s) supprimé(s)"
+                    )
+            except Exception as e:
+                print(f"Erreur lors de l'archivage des logs: {e}")
+
+    def start(self):
+        """Démarre l'archivage périodique (une seule fois par instance)."""
+        with self._lock:
+            if self._thread is not None:
+                return True
+            if not self.config["enabled"]:
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    # python log_retention.py [chemin_de_la_base] : un passage immédiat
+    db_path = sys.argv[1] if len(sys.argv) > 1 else None
+    run_migrations(db_path)
+    report = LogRetentionJob(db_path).run_once()
+    print(
+        f"✓ {report['archives']} entrée(s) archivée(s) ({', '.join(sorted(report['mois'])) or 'aucun mois'}), "
+        f"{report['fichiers_supprimes']} archive(s) expirée(s) supprimée(s), "
+        f"{report['evenements_supprimes']} événement(s) ancien(s) supprimé(s)"
+    )
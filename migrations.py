@@ -0,0 +1,443 @@
+import threading
+from datetime import datetime
+
+from db_pool import get_pool
+
+# Migrations du schéma, appliquées une seule fois et dans l'ordre.
+# Toute évolution du schéma doit être ajoutée ici sous un nouveau numéro de
+# version, jamais en modifiant une migration déjà livrée.
+MIGRATIONS = [
+    (1, "Schéma initial", [
+        '''
+        CREATE TABLE IF NOT EXISTS utilisateurs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom TEXT NOT NULL,
+            prenom TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            mot_de_passe TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            date_naissance TEXT,
+            genre TEXT,
+            telephone TEXT,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS entites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom TEXT NOT NULL UNIQUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS filieres (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom TEXT NOT NULL,
+            entite_id INTEGER NOT NULL,
+            FOREIGN KEY (entite_id) REFERENCES entites (id),
+            UNIQUE(nom, entite_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            annee_universitaire TEXT NOT NULL UNIQUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS memoires (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titre TEXT NOT NULL,
+            auteurs TEXT NOT NULL,
+            encadreur TEXT NOT NULL,
+            resume TEXT,
+            fichier_url TEXT NOT NULL,
+            tags TEXT,
+            filiere_id INTEGER NOT NULL,
+            session_id INTEGER NOT NULL,
+            version TEXT,
+            date_ajout TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (filiere_id) REFERENCES filieres (id),
+            FOREIGN KEY (session_id) REFERENCES sessions (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS favoris (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            memoire_id INTEGER NOT NULL,
+            date_ajout TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES utilisateurs (id),
+            FOREIGN KEY (memoire_id) REFERENCES memoires (id),
+            UNIQUE(user_id, memoire_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT NOT NULL,
+            user_id INTEGER,
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES utilisateurs (id)
+        )
+        '''
+    ]),
+
+    (2, "Texte extrait des PDFs et suivi des extractions", [
+        '''
+        CREATE TABLE IF NOT EXISTS pdf_content (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            memoire_id INTEGER NOT NULL,
+            page_num INTEGER NOT NULL,
+            content TEXT,
+            FOREIGN KEY (memoire_id) REFERENCES memoires (id),
+            UNIQUE(memoire_id, page_num)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS extraction_jobs (
+            memoire_id INTEGER PRIMARY KEY,
+            fichier_url TEXT NOT NULL,
+            statut TEXT NOT NULL DEFAULT 'en_attente',
+            pages_total INTEGER,
+            pages_extraites INTEGER DEFAULT 0,
+            erreur TEXT,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date_maj TIMESTAMP,
+            FOREIGN KEY (memoire_id) REFERENCES memoires (id)
+        )
+        '''
+    ]),
+
+    (3, "Index plein texte des mémoires et du contenu des PDFs", [
+        # Métadonnées des mémoires (sans accents, avec préfixes)
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS memoires_fts USING fts5(
+            titre, auteurs, encadreur, resume, tags,
+            content='memoires',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS memoires_fts_ai AFTER INSERT ON memoires BEGIN
+            INSERT INTO memoires_fts (rowid, titre, auteurs, encadreur, resume, tags)
+            VALUES (new.id, new.titre, new.auteurs, new.encadreur, new.resume, new.tags);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS memoires_fts_ad AFTER DELETE ON memoires BEGIN
+            INSERT INTO memoires_fts (memoires_fts, rowid, titre, auteurs, encadreur, resume, tags)
+            VALUES ('delete', old.id, old.titre, old.auteurs, old.encadreur, old.resume, old.tags);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS memoires_fts_au AFTER UPDATE ON memoires BEGIN
+            INSERT INTO memoires_fts (memoires_fts, rowid, titre, auteurs, encadreur, resume, tags)
+            VALUES ('delete', old.id, old.titre, old.auteurs, old.encadreur, old.resume, old.tags);
+            INSERT INTO memoires_fts (rowid, titre, auteurs, encadreur, resume, tags)
+            VALUES (new.id, new.titre, new.auteurs, new.encadreur, new.resume, new.tags);
+        END
+        ''',
+        "INSERT INTO memoires_fts (memoires_fts) VALUES ('rebuild')",
+
+        # Contenu des PDFs, page par page
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS pdf_content_fts USING fts5(
+            content,
+            content='pdf_content',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS pdf_content_fts_ai AFTER INSERT ON pdf_content BEGIN
+            INSERT INTO pdf_content_fts (rowid, content) VALUES (new.id, new.content);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS pdf_content_fts_ad AFTER DELETE ON pdf_content BEGIN
+            INSERT INTO pdf_content_fts (pdf_content_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS pdf_content_fts_au AFTER UPDATE ON pdf_content BEGIN
+            INSERT INTO pdf_content_fts (pdf_content_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO pdf_content_fts (rowid, content) VALUES (new.id, new.content);
+        END
+        ''',
+        "INSERT INTO pdf_content_fts (pdf_content_fts) VALUES ('rebuild')"
+    ]),
+
+    (4, "Index secondaires", [
+        "CREATE INDEX IF NOT EXISTS idx_memoires_filiere ON memoires (filiere_id)",
+        "CREATE INDEX IF NOT EXISTS idx_memoires_session ON memoires (session_id)",
+        # L'id (rowid) est implicitement inclus : sert aussi la pagination (date_ajout, id)
+        "CREATE INDEX IF NOT EXISTS idx_memoires_date_ajout ON memoires (date_ajout)",
+        "CREATE INDEX IF NOT EXISTS idx_filieres_entite ON filieres (entite_id)",
+        "CREATE INDEX IF NOT EXISTS idx_favoris_memoire ON favoris (memoire_id)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_date ON logs (date)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_user ON logs (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_extraction_jobs_statut ON extraction_jobs (statut)"
+    ]),
+
+    (5, "Compteurs de statistiques par entité, filière et session", [
+        # Une ligne par (dimension, clé) ; 'total' n'a qu'une clé : 0
+        '''
+        CREATE TABLE IF NOT EXISTS statistiques (
+            dimension TEXT NOT NULL,
+            cle INTEGER NOT NULL,
+            nombre INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, cle)
+        ) WITHOUT ROWID
+        ''',
+        # Les triggers s'exécutent dans la transaction de l'écriture sur memoires
+        '''
+        CREATE TRIGGER IF NOT EXISTS statistiques_ai AFTER INSERT ON memoires BEGIN
+            INSERT INTO statistiques (dimension, cle, nombre) VALUES ('total', 0, 1)
+                ON CONFLICT (dimension, cle) DO UPDATE SET nombre = nombre + 1;
+            INSERT INTO statistiques (dimension, cle, nombre) VALUES ('filiere', new.filiere_id, 1)
+                ON CONFLICT (dimension, cle) DO UPDATE SET nombre = nombre + 1;
+            INSERT INTO statistiques (dimension, cle, nombre) VALUES ('session', new.session_id, 1)
+                ON CONFLICT (dimension, cle) DO UPDATE SET nombre = nombre + 1;
+            INSERT INTO statistiques (dimension, cle, nombre)
+                SELECT 'entite', entite_id, 1 FROM filieres WHERE id = new.filiere_id
+                ON CONFLICT (dimension, cle) DO UPDATE SET nombre = nombre + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS statistiques_ad AFTER DELETE ON memoires BEGIN
+            UPDATE statistiques SET nombre = nombre - 1
+            WHERE (dimension = 'total' AND cle = 0)
+               OR (dimension = 'filiere' AND cle = old.filiere_id)
+               OR (dimension = 'session' AND cle = old.session_id)
+               OR (dimension = 'entite' AND cle = (SELECT entite_id FROM filieres WHERE id = old.filiere_id));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS statistiques_au AFTER UPDATE OF filiere_id, session_id ON memoires
+        WHEN old.filiere_id IS NOT new.filiere_id OR old.session_id IS NOT new.session_id BEGIN
+            UPDATE statistiques SET nombre = nombre - 1
+            WHERE (dimension = 'filiere' AND cle = old.filiere_id)
+               OR (dimension = 'session' AND cle = old.session_id)
+               OR (dimension = 'entite' AND cle = (SELECT entite_id FROM filieres WHERE id = old.filiere_id));
+            INSERT INTO statistiques (dimension, cle, nombre) VALUES ('filiere', new.filiere_id, 1)
+                ON CONFLICT (dimension, cle) DO UPDATE SET nombre = nombre + 1;
+            INSERT INTO statistiques (dimension, cle, nombre) VALUES ('session', new.session_id, 1)
+                ON CONFLICT (dimension, cle) DO UPDATE SET nombre = nombre + 1;
+            INSERT INTO statistiques (dimension, cle, nombre)
+                SELECT 'entite', entite_id, 1 FROM filieres WHERE id = new.filiere_id
+                ON CONFLICT (dimension, cle) DO UPDATE SET nombre = nombre + 1;
+        END
+        ''',
+        # Remplissage initial à partir des mémoires existants
+        "INSERT INTO statistiques (dimension, cle, nombre) SELECT 'total', 0, COUNT(*) FROM memoires",
+        "INSERT INTO statistiques (dimension, cle, nombre) SELECT 'filiere', filiere_id, COUNT(*) FROM memoires GROUP BY filiere_id",
+        "INSERT INTO statistiques (dimension, cle, nombre) SELECT 'session', session_id, COUNT(*) FROM memoires GROUP BY session_id",
+        '''
+        INSERT INTO statistiques (dimension, cle, nombre)
+        SELECT 'entite', f.entite_id, COUNT(*)
+        FROM memoires m JOIN filieres f ON m.filiere_id = f.id
+        GROUP BY f.entite_id
+        '''
+    ]),
+
+    (6, "Journal des imports en masse", [
+        # Un import est identifié par le contenu des métadonnées et le dossier des PDFs
+        '''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cle TEXT NOT NULL UNIQUE,
+            pdf_folder TEXT NOT NULL,
+            statut TEXT NOT NULL DEFAULT 'en_cours',
+            lignes_total INTEGER NOT NULL,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date_maj TIMESTAMP
+        )
+        ''',
+        # État de chaque ligne : valide -> fichier_stocke -> insere (ou erreur)
+        '''
+        CREATE TABLE IF NOT EXISTS import_lignes (
+            job_id INTEGER NOT NULL,
+            ligne INTEGER NOT NULL,
+            statut TEXT NOT NULL,
+            nom_fichier TEXT,
+            hash TEXT,
+            fichier_url TEXT,
+            erreur TEXT,
+            PRIMARY KEY (job_id, ligne),
+            FOREIGN KEY (job_id) REFERENCES import_jobs (id)
+        ) WITHOUT ROWID
+        '''
+    ]),
+
+    (7, "Compteur de références des fichiers stockés", [
+        # Nombre de mémoires pointant vers chaque fichier (fichiers dédupliqués)
+        '''
+        CREATE TABLE IF NOT EXISTS fichiers (
+            fichier_url TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS fichiers_ai AFTER INSERT ON memoires BEGIN
+            INSERT INTO fichiers (fichier_url, refcount) VALUES (new.fichier_url, 1)
+                ON CONFLICT (fichier_url) DO UPDATE SET refcount = refcount + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS fichiers_ad AFTER DELETE ON memoires BEGIN
+            UPDATE fichiers SET refcount = refcount - 1 WHERE fichier_url = old.fichier_url;
+            DELETE FROM fichiers WHERE fichier_url = old.fichier_url AND refcount <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS fichiers_au AFTER UPDATE OF fichier_url ON memoires
+        WHEN old.fichier_url IS NOT new.fichier_url BEGIN
+            UPDATE fichiers SET refcount = refcount - 1 WHERE fichier_url = old.fichier_url;
+            DELETE FROM fichiers WHERE fichier_url = old.fichier_url AND refcount <= 0;
+            INSERT INTO fichiers (fichier_url, refcount) VALUES (new.fichier_url, 1)
+                ON CONFLICT (fichier_url) DO UPDATE SET refcount = refcount + 1;
+        END
+        ''',
+        "INSERT INTO fichiers (fichier_url, refcount) SELECT fichier_url, COUNT(*) FROM memoires GROUP BY fichier_url"
+    ]),
+
+    (8, "Accès aux fichiers et niveau de stockage (chaud / froid)", [
+        # niveau : 'chaud' (fichier tel quel), 'froid' (conteneur zstd) ou
+        # 'incompressible' (compression jugée sans intérêt, laissé chaud)
+        '''
+        CREATE TABLE IF NOT EXISTS fichiers_acces (
+            fichier_url TEXT PRIMARY KEY,
+            dernier_acces TEXT NOT NULL,
+            nb_acces INTEGER NOT NULL DEFAULT 0,
+            niveau TEXT NOT NULL DEFAULT 'chaud'
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_fichiers_acces_niveau ON fichiers_acces (niveau, dernier_acces)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS fichiers_acces_ai AFTER INSERT ON fichiers BEGIN
+            INSERT OR IGNORE INTO fichiers_acces (fichier_url, dernier_acces)
+            VALUES (new.fichier_url, datetime('now', 'localtime'));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS fichiers_acces_ad AFTER DELETE ON fichiers BEGIN
+            DELETE FROM fichiers_acces WHERE fichier_url = old.fichier_url;
+        END
+        ''',
+        # Sans historique, la date d'ajout du mémoire tient lieu de dernier accès
+        '''
+        INSERT OR IGNORE INTO fichiers_acces (fichier_url, dernier_acces)
+        SELECT fichier_url, COALESCE(MAX(date_ajout), datetime('now', 'localtime'))
+        FROM memoires GROUP BY fichier_url
+        '''
+    ]),
+
+    (9, "Agrégats quotidiens des logs archivés", [
+        # Logs sortis de la table logs (voir log_retention.py) : nombre d'actions
+        # par jour, catégorie et utilisateur (0 pour un visiteur)
+        '''
+        CREATE TABLE IF NOT EXISTS logs_quotidiens (
+            jour TEXT NOT NULL,
+            categorie TEXT NOT NULL,
+            user_id INTEGER NOT NULL DEFAULT 0,
+            nb INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (jour, categorie, user_id)
+        ) WITHOUT ROWID
+        ''',
+        # Journal filtré par utilisateur, du plus récent au plus ancien
+        "CREATE INDEX IF NOT EXISTS idx_logs_user_date ON logs (user_id, date)"
+    ]),
+
+    (10, "Consultations et téléchargements des mémoires", [
+        # type : 'vue' (lecteur PDF ouvert) ou 'telechargement'
+        '''
+        CREATE TABLE IF NOT EXISTS evenements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            memoire_id INTEGER NOT NULL,
+            user_id INTEGER,
+            date TEXT NOT NULL,
+            FOREIGN KEY (memoire_id) REFERENCES memoires (id),
+            FOREIGN KEY (user_id) REFERENCES utilisateurs (id)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_evenements_date ON evenements (date)",
+        "CREATE INDEX IF NOT EXISTS idx_evenements_memoire ON evenements (memoire_id, date)",
+        # Compteurs par jour, type et mémoire, maintenus par trigger
+        '''
+        CREATE TABLE IF NOT EXISTS evenements_quotidiens (
+            jour TEXT NOT NULL,
+            type TEXT NOT NULL,
+            memoire_id INTEGER NOT NULL,
+            nb INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (jour, type, memoire_id)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_evenements_quotidiens_memoire ON evenements_quotidiens (memoire_id)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS evenements_ai AFTER INSERT ON evenements BEGIN
+            INSERT INTO evenements_quotidiens (jour, type, memoire_id, nb)
+            VALUES (substr(new.date, 1, 10), new.type, new.memoire_id, 1)
+                ON CONFLICT (jour, type, memoire_id) DO UPDATE SET nb = nb + 1;
+        END
+        ''',
+        # Les compteurs d'un mémoire supprimé disparaissent avec lui
+        '''
+        CREATE TRIGGER IF NOT EXISTS evenements_memoire_ad AFTER DELETE ON memoires BEGIN
+            DELETE FROM evenements WHERE memoire_id = old.id;
+            DELETE FROM evenements_quotidiens WHERE memoire_id = old.id;
+        END
+        '''
+    ]),
+]
+
+_migration_lock = threading.Lock()
+
+
+def get_schema_version(conn):
+    """Retourne la dernière version de schéma appliquée (0 pour une base vierge)."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        date_application TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(db_path=None):
+    """Applique les migrations en attente, chacune dans sa propre transaction.
+
+    Retourne la liste des versions appliquées.
+    """
+    applied = []
+    with _migration_lock, get_pool(db_path).connection() as conn:
+        current = get_schema_version(conn)
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+
+            # BEGIN IMMEDIATE : un seul processus applique une migration donnée
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(
+                    "INSERT INTO schema_version (version, description, date_application) VALUES (?, ?, ?)",
+                    (version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Erreur lors de la migration {version} ({description}): {e}")
+                raise
+            applied.append(version)
+            print(f"✓ Migration {version} appliquée : {description}")
+    return applied
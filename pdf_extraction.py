@@ -0,0 +1,254 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from config import PDF_EXTRACTION_CONFIG
+from db_pool import get_pool
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # L'extraction est désactivée sans pypdf
+    PdfReader = None
+
+
+def extract_pages(full_path):
+    """Extrait le texte de chaque page d'un PDF (exécuté dans un processus séparé)."""
+    if PdfReader is None:
+        raise RuntimeError("Le module pypdf n'est pas installé")
+
+    reader = PdfReader(full_path)
+    pages = []
+    for page_num, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        pages.append((page_num, text))
+    return pages
+
+
+class PdfExtractionPipeline:
+    def __init__(self, db_path, storage, max_workers=None, batch_size=None):
+        self.pool = get_pool(db_path)
+        self.storage = storage
+        self.max_workers = max_workers or PDF_EXTRACTION_CONFIG["max_workers"]
+        self.batch_size = batch_size or PDF_EXTRACTION_CONFIG["batch_size"]
+        self._executor = None
+        self._downloader = None
+        # Copies locales (téléchargées depuis S3) en attente d'extraction au plus
+        self._copies = threading.BoundedSemaphore(PDF_EXTRACTION_CONFIG["max_local_copies"])
+        self._lock = threading.Lock()
+        self._submitted = set()  # Mémoires planifiés par ce processus, pas encore terminés
+        self._resumed = False
+        atexit.register(self.shutdown)
+
+    def _get_executor(self):
+        """Crée le pool de processus à la première extraction."""
+        with self._lock:
+            if self._executor is None:
+                # "spawn" évite de dupliquer les threads du serveur Streamlit
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _get_downloader(self):
+        """Threads qui préparent les fichiers (vérification, copie locale) hors du thread appelant."""
+        with self._lock:
+            if self._downloader is None:
+                self._downloader = ThreadPoolExecutor(max_workers=PDF_EXTRACTION_CONFIG["download_workers"])
+            return self._downloader
+
+    def _set_status(self, memoire_id, statut, **fields):
+        """Met à jour l'état d'une tâche d'extraction."""
+        fields["statut"] = statut
+        fields["date_maj"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        assignments = ", ".join(f"{name}=?" for name in fields)
+        with self.pool.transaction() as conn:
+            conn.execute(
+                f"UPDATE extraction_jobs SET {assignments} WHERE memoire_id=?",
+                (*fields.values(), memoire_id)
+            )
+
+    def enqueue(self, memoire_id, fichier_url):
+        """Planifie l'extraction d'un mémoire et rend la main immédiatement."""
+        date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.transaction() as conn:
+            conn.execute("""
+            INSERT OR REPLACE INTO extraction_jobs
+            (memoire_id, fichier_url, statut, pages_total, pages_extraites, erreur, date_creation, date_maj)
+            VALUES (?, ?, 'en_attente', NULL, 0, NULL, ?, ?)
+            """, (memoire_id, fichier_url, date_now, date_now))
+        self._submit(memoire_id, fichier_url)
+
+    def _submit(self, memoire_id, fichier_url):
+        # Seule l'adresse est mise en file : le fichier est lu par un thread de préparation
+        with self._lock:
+            self._submitted.add(memoire_id)
+        self._get_downloader().submit(self._prepare, memoire_id, fichier_url)
+
+    def _done(self, memoire_id):
+        with self._lock:
+            self._submitted.discard(memoire_id)
+
+    def _prepare(self, memoire_id, fichier_url):
+        """Vérifie le fichier, en fait une copie locale si besoin et lance son extraction.
+
+        Exécuté par un thread de préparation : les téléchargements (S3) ne bloquent
+        ni l'appelant ni les autres tâches, et au plus max_local_copies copies
+        attendent leur extraction dans le dossier temporaire.
+        """
+        self._copies.acquire()
+        full_path, temporaire = None, False
+        try:
+            if not self.storage.exists(fichier_url):
+                self._set_status(memoire_id, "erreur", erreur="Fichier introuvable dans le stockage")
+                self._copies.release()
+                self._done(memoire_id)
+                return
+
+            self._set_status(memoire_id, "en_cours")
+            # Les stockages distants (S3) fournissent une copie locale temporaire
+            full_path, temporaire = self.storage.get_local_copy(fichier_url)
+            future = self._get_executor().submit(extract_pages, full_path)
+        except Exception as e:
+            self._copies.release()
+            self._done(memoire_id)
+            if temporaire:
+                os.remove(full_path)
+            try:
+                self._set_status(memoire_id, "erreur", erreur=str(e))
+            except Exception as db_error:
+                print(f"Impossible d'enregistrer l'échec de l'extraction: {db_error}")
+            return
+
+        future.add_done_callback(
+            lambda f: self._on_extracted(memoire_id, f, full_path if temporaire else None)
+        )
+
+    def _on_extracted(self, memoire_id, future, temp_path=None):
+        """Enregistre le résultat d'une extraction terminée."""
+        self._copies.release()
+        self._done(memoire_id)
+        if temp_path:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        try:
+            pages = future.result()
+            if self.store_pages(memoire_id, pages):
+                self._set_status(memoire_id, "termine")
+        except Exception as e:
+            print(f"Erreur lors de l'extraction du mémoire {memoire_id}: {e}")
+            try:
+                self._set_status(memoire_id, "erreur", erreur=str(e))
+            except Exception as db_error:
+                print(f"Impossible d'enregistrer l'échec de l'extraction: {db_error}")
+
+    def store_pages(self, memoire_id, pages):
+        """Remplace le texte d'un mémoire par lots de pages, une transaction par lot.
+
+        Retourne False si le mémoire a été supprimé entre-temps.
+        """
+        pages = list(pages)
+        with self.pool.transaction() as conn:
+            if conn.execute("SELECT 1 FROM memoires WHERE id = ?", (memoire_id,)).fetchone() is None:
+                return False
+            conn.execute("DELETE FROM pdf_content WHERE memoire_id = ?", (memoire_id,))
+            conn.execute(
+                "UPDATE extraction_jobs SET pages_total=?, pages_extraites=0 WHERE memoire_id=?",
+                (len(pages), memoire_id)
+            )
+
+        for start in range(0, len(pages), self.batch_size):
+            batch = pages[start:start + self.batch_size]
+            with self.pool.transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO pdf_content (memoire_id, page_num, content) VALUES (?, ?, ?)",
+                    [(memoire_id, page_num, text) for page_num, text in batch]
+                )
+                conn.execute(
+                    "UPDATE extraction_jobs SET pages_extraites=? WHERE memoire_id=?",
+                    (start + len(batch), memoire_id)
+                )
+        return True
+
+    def enqueue_missing(self, retry_errors=False):
+        """Planifie les mémoires sans texte extrait (et, sur demande, ceux en échec).
+
+        Les mémoires déjà planifiés par ce processus et pas encore terminés sont
+        ignorés : ils ne sont pas extraits deux fois en parallèle.
+        """
+        statuts = ("en_attente", "erreur") if retry_errors else ("en_attente",)
+        placeholders = ", ".join("?" for _ in statuts)
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+            SELECT m.id, m.fichier_url
+            FROM memoires m
+            LEFT JOIN extraction_jobs j ON j.memoire_id = m.id
+            WHERE j.memoire_id IS NULL OR j.statut IN ({placeholders})
+            """, statuts).fetchall()
+        with self._lock:
+            rows = [(memoire_id, fichier_url) for memoire_id, fichier_url in rows if memoire_id not in self._submitted]
+
+        for memoire_id, fichier_url in rows:
+            self.enqueue(memoire_id, fichier_url)
+        return len(rows)
+
+    def resume_interrupted(self):
+        """Relance les tâches restées en cours lors d'un arrêt du serveur.
+
+        Sans effet après le premier appel : les tâches en cours sont alors celles
+        de ce processus.
+        """
+        with self._lock:
+            if self._resumed:
+                return 0
+            self._resumed = True
+        with self.pool.transaction() as conn:
+            conn.execute("UPDATE extraction_jobs SET statut='en_attente' WHERE statut='en_cours'")
+        return self.enqueue_missing()
+
+    def get_progress(self):
+        """Retourne le nombre de tâches par statut."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT statut, COUNT(*) FROM extraction_jobs GROUP BY statut"
+            ).fetchall()
+        progress = {"en_attente": 0, "en_cours": 0, "termine": 0, "erreur": 0}
+        progress.update(dict(rows))
+        return progress
+
+    def get_jobs(self, statut=None, limit=50):
+        """Retourne les dernières tâches d'extraction avec le titre du mémoire."""
+        query = """
+        SELECT j.memoire_id, m.titre, j.statut, j.pages_extraites, j.pages_total, j.erreur, j.date_maj
+        FROM extraction_jobs j
+        LEFT JOIN memoires m ON m.id = j.memoire_id
+        """
+        params = []
+        if statut:
+            query += " WHERE j.statut = ?"
+            params.append(statut)
+        query += " ORDER BY j.date_maj DESC LIMIT ?"
+        params.append(limit)
+
+        with self.pool.connection() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def shutdown(self):
+        """Arrête les processus d'extraction sans attendre les tâches en file."""
+        with self._lock:
+            if self._downloader is not None:
+                self._downloader.shutdown(wait=False, cancel_futures=True)
+                self._downloader = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,44 @@
+import threading
+
+
+class ReferenceCache:
+    """Cache en mémoire des données de référence (entités, filières, sessions).
+
+    Partagé par toutes les sessions du processus. Chaque écriture sur ces tables
+    incrémente le compteur de génération, ce qui invalide toutes les entrées
+    chargées auparavant.
+    """
+
+    def __init__(self):
+        self._generation = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key, loader):
+        """Retourne une copie de la valeur en cache, ou la charge via loader()."""
+        with self._lock:
+            generation = self._generation
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == generation:
+            return entry[1].copy()
+
+        value = loader()
+        with self._lock:
+            # Une écriture pendant le chargement rend la valeur déjà périmée
+            if generation == self._generation:
+                self._entries[key] = (generation, value)
+        return value.copy()
+
+    def invalidate(self):
+        """À appeler après toute écriture sur les entités, filières ou sessions."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+# Instance partagée par l'application
+reference_cache = ReferenceCache()
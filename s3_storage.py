@@ -0,0 +1,150 @@
+import os
+import tempfile
+
+from config import FILE_SERVER_CONFIG, STORAGE_CONFIG
+from storage import StorageBackend
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # Le pilote S3 est désactivé sans boto3
+    boto3 = None
+
+
+class S3Storage(StorageBackend):
+    """Pilote de stockage compatible S3 ('s3://<bucket>/<clé>').
+
+    Les envois volumineux passent en multipart ; les lectures se font par plages
+    d'octets (Range), et le navigateur lit les PDFs via des liens présignés.
+    """
+    scheme = "s3"
+
+    def __init__(self, db_path=None, content_addressed=None, config=None):
+        if boto3 is None:
+            raise RuntimeError("Le module boto3 n'est pas installé")
+        super().__init__(db_path, content_addressed)
+        self.config = config or STORAGE_CONFIG["s3"]
+        self.bucket = self.config["bucket"]
+        self.client = boto3.client(
+            's3',
+            endpoint_url=self.config["endpoint_url"],
+            region_name=self.config["region_name"],
+            aws_access_key_id=self.config["aws_access_key_id"],
+            aws_secret_access_key=self.config["aws_secret_access_key"]
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=self.config["multipart_threshold"],
+            multipart_chunksize=self.config["multipart_chunksize"],
+            max_concurrency=self.config["max_concurrency"]
+        )
+        print(f"✓ Stockage S3 initialisé (bucket {self.bucket})")
+
+    def _split(self, file_path):
+        """Retourne (bucket, clé) d'un chemin 's3://' du bucket configuré."""
+        if not file_path.startswith("s3://"):
+            raise ValueError("Le chemin du fichier doit commencer par 's3://'")
+        bucket, _, key = file_path[len("s3://"):].partition("/")
+        if not bucket or not key:
+            raise ValueError(f"Chemin S3 invalide : {file_path}")
+        # Un chemin ne doit pas donner accès aux autres buckets du compte
+        if bucket != self.bucket:
+            raise ValueError(f"Bucket non autorisé : {bucket}")
+        return bucket, key
+
+    def _object_exists(self, bucket, key):
+        try:
+            self.client.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def save_stream(self, file_obj, filename):
+        """Envoie un fichier et retourne (chemin 's3://', sha256, taille).
+
+        Le fichier transite par un fichier temporaire local pour calculer son
+        empreinte avant l'envoi ; un contenu déjà présent n'est pas renvoyé.
+        """
+        self._check_extension(filename)
+        tmp_path, sha256, size = self._write_temp(file_obj)
+        try:
+            key = self._stored_name(filename, sha256)
+            if not (self.content_addressed and self._object_exists(self.bucket, key)):
+                self.client.upload_file(
+                    tmp_path, self.bucket, key,
+                    ExtraArgs={"ContentType": "application/pdf"} if key.endswith(".pdf") else None,
+                    Config=self.transfer_config
+                )
+        finally:
+            os.remove(tmp_path)
+        return f"s3://{self.bucket}/{key}", sha256, size
+
+    def get_file(self, file_path):
+        try:
+            bucket, key = self._split(file_path)
+            return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        except Exception as e:
+            print(f"Erreur lors de la récupération du fichier {file_path}: {str(e)}")
+            return None
+
+    def stream(self, file_path, start=0, end=None):
+        """Lecture par plage d'octets (GET avec en-tête Range)."""
+        bucket, key = self._split(file_path)
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(Bucket=bucket, Key=key, Range=byte_range)["Body"]
+        try:
+            yield from body.iter_chunks(STORAGE_CONFIG["chunk_size"])
+        finally:
+            body.close()
+
+    def delete_file(self, file_path):
+        """Supprime l'objet s'il n'est plus référencé par aucun mémoire."""
+        try:
+            bucket, key = self._split(file_path)
+            with self._references_locked(), self._lock:
+                if self.content_addressed and self.is_referenced(file_path):
+                    return False
+                if not self._object_exists(bucket, key):
+                    return False
+                self.client.delete_object(Bucket=bucket, Key=key)
+                return True
+        except Exception as e:
+            print(f"Erreur lors de la suppression du fichier: {e}")
+            return False
+
+    def exists(self, file_path):
+        try:
+            return self._object_exists(*self._split(file_path))
+        except Exception as e:
+            print(f"Erreur lors de la vérification du fichier {file_path}: {e}")
+            return False
+
+    def size(self, file_path):
+        bucket, key = self._split(file_path)
+        return self.client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+
+    def presign(self, file_path, download=False, expires=None):
+        """Lien présigné : le navigateur lit le PDF par plages directement depuis S3."""
+        bucket, key = self._split(file_path)
+        params = {"Bucket": bucket, "Key": key}
+        if download:
+            params["ResponseContentDisposition"] = f'attachment; filename="{os.path.basename(key)}"'
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params=params,
+            ExpiresIn=expires or FILE_SERVER_CONFIG["url_expires"]
+        )
+
+    def get_local_copy(self, file_path):
+        """Télécharge l'objet (par plages en parallèle) dans un fichier temporaire."""
+        bucket, key = self._split(file_path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=os.path.splitext(key)[1])
+        os.close(fd)
+        try:
+            self.client.download_file(bucket, key, tmp_path, Config=self.transfer_config)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, True
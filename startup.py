@@ -3,7 +3,7 @@ import streamlit as st
 from backup_manager import BackupManager
 from local_storage import storage
 from datetime import datetime
-import sqlite3
+from migrations import run_migrations
 
 def setup_directories():
     """Crée tous les dossiers nécessaires."""
@@ -22,28 +22,13 @@ def check_database():
     db_path = "data/memoires_db.sqlite"
     if not os.path.exists(db_path):
         print("! Base de données non trouvée, création en cours...")
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Création des tables nécessaires
-        c.execute('''CREATE TABLE IF NOT EXISTS utilisateurs (
-            id INTEGER PRIMARY KEY,
-            nom TEXT NOT NULL,
-            prenom TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            mot_de_passe TEXT NOT NULL,
-            role TEXT NOT NULL,
-            date_naissance TEXT,
-            genre TEXT,
-            telephone TEXT
-        )''')
-        
-        # Autres tables...
-        conn.commit()
-        conn.close()
-        print("✓ Base de données initialisée")
+    
+    # Création / mise à jour du schéma (voir migrations.py)
+    applied = run_migrations(db_path)
+    if applied:
+        print(f"✓ Base de données mise à jour (migrations {', '.join(map(str, applied))})")
     else:
-        print("✓ Base de données existante trouvée")
+        print("✓ Base de données existante à jour")
 
 def create_initial_backup():
     """Crée une sauvegarde initiale."""
@@ -56,7 +41,7 @@ def create_initial_backup():
 def check_storage():
     """Vérifie le système de stockage local."""
     try:
-        test_file = "test.txt"
+        test_file = "test.pdf"
         test_content = b"Test storage system"
         
         # Test de sauvegarde
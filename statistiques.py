@@ -0,0 +1,63 @@
+import sys
+
+from db_pool import get_pool
+from migrations import run_migrations
+
+# Comptage exact à partir de la table memoires, même forme que la table statistiques
+COMPTAGE_QUERY = """
+SELECT 'total' AS dimension, 0 AS cle, COUNT(*) AS nombre FROM memoires
+UNION ALL
+SELECT 'filiere', filiere_id, COUNT(*) FROM memoires GROUP BY filiere_id
+UNION ALL
+SELECT 'session', session_id, COUNT(*) FROM memoires GROUP BY session_id
+UNION ALL
+SELECT 'entite', f.entite_id, COUNT(*)
+FROM memoires m JOIN filieres f ON m.filiere_id = f.id
+GROUP BY f.entite_id
+"""
+
+
+def check_statistics(db_path=None):
+    """Compare les compteurs maintenus par les triggers à un comptage complet.
+
+    Retourne la liste des écarts (dimension, cle, compteur, reel).
+    """
+    with get_pool(db_path).connection() as conn:
+        rows = conn.execute(f"""
+        WITH reel AS ({COMPTAGE_QUERY})
+        SELECT dimension, cle, SUM(compteur), SUM(reel)
+        FROM (
+            SELECT dimension, cle, nombre AS compteur, 0 AS reel FROM statistiques
+            UNION ALL
+            SELECT dimension, cle, 0, nombre FROM reel
+        )
+        GROUP BY dimension, cle
+        HAVING SUM(compteur) != SUM(reel)
+        ORDER BY dimension, cle
+        """).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def rebuild_statistics(db_path=None):
+    """Recalcule tous les compteurs dans une seule transaction."""
+    with get_pool(db_path).transaction() as conn:
+        conn.execute("DELETE FROM statistiques")
+        conn.execute(f"INSERT INTO statistiques (dimension, cle, nombre) {COMPTAGE_QUERY}")
+
+
+if __name__ == "__main__":
+    # python statistiques.py [--check] [chemin_de_la_base]
+    args = [arg for arg in sys.argv[1:] if arg != "--check"]
+    db_path = args[0] if args else None
+    run_migrations(db_path)
+
+    ecarts = check_statistics(db_path)
+    for dimension, cle, compteur, reel in ecarts:
+        print(f"! {dimension} {cle} : compteur={compteur}, réel={reel}")
+
+    if "--check" in sys.argv:
+        print("✓ Compteurs cohérents" if not ecarts else f"! {len(ecarts)} écart(s) détecté(s)")
+        sys.exit(1 if ecarts else 0)
+
+    rebuild_statistics(db_path)
+    print("✓ Compteurs de statistiques recalculés")
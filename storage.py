@@ -1,95 +1,710 @@
 import os
 import io
+import re
 import uuid
 import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from config import FILE_CACHE_MAX_BYTES, STORAGE_CONFIG, MAX_FILE_SIZE, ALLOWED_EXTENSIONS
+from db_pool import get_pool
+from werkzeug.security import safe_join
 
-class FileStorage:
-    def __init__(self):
-        # Créer le dossier de stockage des fichiers
-        self.storage_dir = os.path.join(os.getcwd(), "data", "files")
-        os.makedirs(self.storage_dir, exist_ok=True)
-        print("✓ Système de stockage local initialisé")
+try:
+    import zstandard as zstd
+except ImportError:  # Le niveau froid est désactivé sans zstandard
+    zstd = None
+
+# Nom d'un fichier adressé par son contenu : <sha256><extension>
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}(\.\w+)?$")
+
+# Suffixe des fichiers du niveau froid (conteneur zstd à côté du chemin d'origine)
+COLD_SUFFIX = ".zst"
+
+def shard_path(name):
+    """Chemin relatif réparti sur deux niveaux de sous-dossiers : ab/cd/<nom>.
+    
+    Les noms stockés commencent par un SHA-256 ou un uuid4, donc par des
+    caractères hexadécimaux aléatoires ; les autres sont répartis selon le hash du nom.
+    """
+    prefix = name.lower()
+    if not re.match(r"^[0-9a-f]{4}", prefix):
+        prefix = hashlib.sha256(name.encode()).hexdigest()
+    return f"{prefix[0:2]}/{prefix[2:4]}/{name}"
+
+class StorageBackend:
+    """Interface commune des pilotes de stockage.
+    
+    Chaque pilote gère un schéma de fichier_url ('local://', 's3://'...) ;
+    StorageRouter choisit le pilote d'après le chemin.
+    """
+    scheme = None
+    
+    def __init__(self, db_path=None, content_addressed=None, temp_dir=None):
+        # La base sert à compter les mémoires qui référencent un fichier
+        self.db_path = db_path
+        if content_addressed is None:
+            content_addressed = STORAGE_CONFIG["content_addressed"]
+        self.content_addressed = content_addressed
+        self.temp_dir = temp_dir or STORAGE_CONFIG["temp_dir"]
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Accès aux fichiers, regroupés en mémoire avant écriture (voir flush_access)
+        self.track_access = False
+        self._acces = {}
+        self._acces_lock = threading.Lock()
     
     def save_file(self, file_obj, filename):
-        """Sauvegarde un fichier dans le stockage local."""
+        """Sauvegarde un fichier et retourne (succès, chemin)."""
         try:
-            # Générer un nom unique pour le fichier
-            unique_filename = f"{uuid.uuid4()}_{filename}"
-            file_path = os.path.join(self.storage_dir, unique_filename)
-            
-            # Sauvegarder le fichier
-            if hasattr(file_obj, 'read'):
-                # Si c'est un objet fichier (comme UploadedFile de Streamlit)
-                content = file_obj.read()
-            else:
-                # Si c'est déjà des bytes
-                content = file_obj
-            
-            # Écrire le fichier
-            with open(file_path, 'wb') as f:
-                f.write(content)
-            
-            # Retourner le chemin relatif
-            return True, f"local://{unique_filename}"
-            
+            file_path, _, _ = self.save_stream(file_obj, filename)
+            return True, file_path
         except Exception as e:
             print(f"Erreur lors de la sauvegarde du fichier: {str(e)}")
             return False, None
     
+    def save_stream(self, file_obj, filename):
+        """Écrit un fichier par blocs et retourne (chemin, sha256, taille)."""
+        raise NotImplementedError
+    
     def get_file(self, file_path):
-        """Récupère un fichier depuis le stockage local."""
+        """Retourne le contenu complet du fichier, ou None."""
+        raise NotImplementedError
+    
+    def stream(self, file_path, start=0, end=None):
+        """Itère sur les octets [start, end] du fichier, bloc par bloc."""
+        raise NotImplementedError
+    
+    def delete_file(self, file_path):
+        """Supprime le fichier s'il n'est plus référencé ; retourne True s'il a été supprimé."""
+        raise NotImplementedError
+    
+    def exists(self, file_path):
+        raise NotImplementedError
+    
+    def presign(self, file_path, download=False, expires=None):
+        """Retourne un lien temporaire que le navigateur peut lire directement."""
+        raise NotImplementedError
+    
+    def get_local_copy(self, file_path):
+        """Retourne (chemin local lisible, fichier temporaire à supprimer après usage)."""
+        raise NotImplementedError
+    
+    def get_download_url(self, file_path, expires=3600):
+        """Chemin local du fichier (seul le stockage local en a un)."""
+        return None
+    
+    def size(self, file_path):
+        """Taille du contenu du fichier en octets."""
+        raise NotImplementedError
+    
+    def record_access(self, file_path):
+        """Note une consultation du fichier, sans écrire en base à chaque lecture."""
+        if not self.track_access:
+            return
+        date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._acces_lock:
+            count, _ = self._acces.get(file_path, (0, None))
+            self._acces[file_path] = (count + 1, date_now)
+    
+    def flush_access(self):
+        """Écrit les consultations notées depuis le dernier appel dans fichiers_acces."""
+        with self._acces_lock:
+            acces, self._acces = self._acces, {}
+        if not acces:
+            return 0
         try:
-            if not file_path.startswith("local://"):
-                raise ValueError("Le chemin du fichier doit commencer par 'local://'")
-            
-            # Extraire le nom du fichier
-            filename = file_path.replace("local://", "")
-            full_path = os.path.join(self.storage_dir, filename)
+            with get_pool(self.db_path).transaction() as conn:
+                conn.executemany(
+                    "UPDATE fichiers_acces SET dernier_acces = ?, nb_acces = nb_acces + ? WHERE fichier_url = ?",
+                    [(date, count, file_path) for file_path, (count, date) in acces.items()]
+                )
+        except Exception as e:
+            print(f"Erreur lors de l'enregistrement des accès aux fichiers: {e}")
+            return 0
+        return len(acces)
+    
+    def _stored_name(self, filename, sha256):
+        """Nom de stockage réparti en sous-dossiers (voir shard_path)."""
+        extension = os.path.splitext(filename)[1].lower()
+        if self.content_addressed:
+            # Nommé par son contenu : un doublon n'est pas réécrit
+            return shard_path(f"{sha256}{extension}")
+        return shard_path(f"{uuid.uuid4()}_{filename}")
+    
+    def _check_extension(self, filename):
+        extension = os.path.splitext(filename)[1].lower()
+        if extension.lstrip('.') not in ALLOWED_EXTENSIONS:
+            raise ValueError(f"Extension de fichier non autorisée : '{extension}'")
+    
+    def _write_temp(self, file_obj):
+        """Copie le flux dans un fichier temporaire ; retourne (chemin, sha256, taille).
+        
+        Lève ValueError si le fichier dépasse MAX_FILE_SIZE.
+        """
+        chunk_size = STORAGE_CONFIG["chunk_size"]
+        if not hasattr(file_obj, 'read'):
+            # Si c'est déjà des bytes
+            file_obj = io.BytesIO(file_obj)
+        
+        fd, tmp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=".tmp")
+        try:
+            sha256 = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+                    size += len(chunk)
+                    if size > MAX_FILE_SIZE:
+                        raise ValueError(
+                            f"Fichier trop volumineux (maximum {MAX_FILE_SIZE // (1024 * 1024)} MB)"
+                        )
+                    sha256.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, sha256.hexdigest(), size
+    
+    def _reference_paths(self, file_path):
+        """Chemins sous lesquels les mémoires peuvent référencer ce fichier."""
+        return {file_path}
+    
+    def is_referenced(self, file_path):
+        """Indique si au moins un mémoire référence encore ce fichier."""
+        paths = tuple(self._reference_paths(file_path))
+        with get_pool(self.db_path).connection() as conn:
+            row = conn.execute(
+                f"SELECT MAX(refcount) FROM fichiers WHERE fichier_url IN ({', '.join('?' for _ in paths)})",
+                paths
+            ).fetchone()
+        return row[0] is not None and row[0] > 0
+    
+    @contextmanager
+    def _references_locked(self):
+        """Verrou d'écriture de la base, le temps de vérifier les références puis de supprimer.
+        
+        Une transaction qui ajoute une référence (voir ensure_stored) passe alors
+        entièrement avant ou après la suppression, jamais entre les deux.
+        """
+        with get_pool(self.db_path).connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            finally:
+                conn.rollback()
+    
+    def ensure_stored(self, file_path, source):
+        """Réécrit un fichier dédupliqué supprimé entre sa sauvegarde et sa référence.
+        
+        À appeler dans la transaction qui référence file_path, après l'insertion
+        (verrou d'écriture pris) : un delete_file concurrent a soit déjà eu lieu, et
+        le fichier est réécrit depuis source (chemin ou flux), soit attendra le
+        commit et trouvera la référence.
+        """
+        filename = os.path.basename(file_path)
+        if not CONTENT_ADDRESSED_NAME.match(filename) or self.exists(file_path):
+            return
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                stored_path, _, _ = self.save_stream(f, filename)
+        else:
+            source.seek(0)
+            stored_path, _, _ = self.save_stream(source, filename)
+        if stored_path != file_path:
+            raise ValueError(f"Le contenu fourni ne correspond pas au fichier {file_path}")
+        print(f"! Fichier supprimé pendant son enregistrement, réécrit : {file_path}")
+
+
+class FileStorage(StorageBackend):
+    """Pilote du stockage local ('local://'), dans data/files."""
+    scheme = "local"
+    
+    def __init__(self, db_path=None, content_addressed=None):
+        # Créer le dossier de stockage des fichiers
+        self.storage_dir = os.path.join(os.getcwd(), "data", "files")
+        os.makedirs(self.storage_dir, exist_ok=True)
+        # Fichiers temporaires sur le même disque : le renommage final reste atomique
+        super().__init__(db_path, content_addressed, temp_dir=self.storage_dir)
+        print("✓ Système de stockage local initialisé")
+    
+    def save_stream(self, file_obj, filename):
+        """Écrit un fichier par blocs et retourne (chemin 'local://', sha256, taille).
+        
+        Le contenu est écrit dans un fichier temporaire, synchronisé sur disque puis
+        renommé atomiquement : un fichier stocké n'est jamais partiel. Lève ValueError
+        si l'extension n'est pas autorisée ou si le fichier dépasse MAX_FILE_SIZE.
+        """
+        self._check_extension(filename)
+        tmp_path, sha256, size = self._write_temp(file_obj)
+        try:
+            stored_name = self._stored_name(filename, sha256)
+            full_path = os.path.join(self.storage_dir, stored_name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with self._lock:
+                if self._is_stored(full_path):
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, full_path)
+                    self._fsync_dir(os.path.dirname(full_path))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return f"local://{stored_name}", sha256, size
+    
+    def _fsync_dir(self, directory):
+        """Rend le renommage durable (sans effet sur les systèmes qui ne le permettent pas)."""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    
+    def _reference_paths(self, file_path):
+        """Ancien chemin à plat et chemin réparti en sous-dossiers du même fichier."""
+        filename = file_path.replace("local://", "")
+        return {file_path, f"local://{shard_path(os.path.basename(filename))}"}
+    
+    def _is_stored(self, full_path):
+        """Le fichier existe, dans le niveau chaud ou dans le niveau froid."""
+        return os.path.exists(full_path) or os.path.exists(full_path + COLD_SUFFIX)
+    
+    def _open(self, full_path):
+        """Ouvre un fichier en lecture, décompressé à la volée s'il est dans le niveau froid."""
+        try:
+            return open(full_path, 'rb')
+        except FileNotFoundError:
+            if zstd is None or not os.path.exists(full_path + COLD_SUFFIX):
+                raise
+        return zstd.ZstdDecompressor().stream_reader(open(full_path + COLD_SUFFIX, 'rb'))
+    
+    def _full_path(self, file_path):
+        """Chemin absolu d'un fichier 'local://', y compris pour un ancien chemin à plat."""
+        if not file_path.startswith("local://"):
+            raise ValueError("Le chemin du fichier doit commencer par 'local://'")
+        
+        filename = file_path.replace("local://", "")
+        full_path = safe_join(self.storage_dir, filename)
+        if full_path is None:
+            raise ValueError(f"Chemin de fichier invalide : {file_path}")
+        
+        if "/" not in filename and not self._is_stored(full_path):
+            # Fichier déplacé depuis dans son sous-dossier (voir migrate_layout)
+            sharded = os.path.join(self.storage_dir, shard_path(filename))
+            if self._is_stored(sharded):
+                return sharded
+        return full_path
+    
+    def get_file(self, file_path):
+        """Récupère un fichier depuis le stockage local (décompressé s'il est froid)."""
+        try:
+            full_path = self._full_path(file_path)
             
-            # Vérifier si le fichier existe
-            if not os.path.exists(full_path):
+            # Lire et retourner le contenu du fichier
+            try:
+                with self._open(full_path) as f:
+                    content = f.read()
+            except FileNotFoundError:
                 print(f"Fichier non trouvé: {full_path}")
                 return None
             
-            # Lire et retourner le contenu du fichier
-            with open(full_path, 'rb') as f:
-                return f.read()
+            self.record_access(file_path)
+            return content
                 
         except Exception as e:
             print(f"Erreur lors de la récupération du fichier {file_path}: {str(e)}")
             return None
     
     def delete_file(self, file_path):
-        """Supprime un fichier du stockage local."""
+        """Supprime un fichier du stockage local.
+        
+        Un fichier adressé par son contenu n'est supprimé que s'il n'est plus
+        référencé par aucun mémoire (à appeler après le commit de la suppression).
+        """
         try:
-            if not file_path.startswith("local://"):
-                raise ValueError("Le chemin du fichier doit commencer par 'local://'")
-                
-            filename = file_path.replace("local://", "")
-            full_path = os.path.join(self.storage_dir, filename)
+            full_path = self._full_path(file_path)
             
-            if os.path.exists(full_path):
-                os.remove(full_path)
-                return True
-            return False
+            with self._references_locked(), self._lock:
+                if CONTENT_ADDRESSED_NAME.match(os.path.basename(full_path)) and self.is_referenced(file_path):
+                    return False
+                deleted = False
+                for path in (full_path, full_path + COLD_SUFFIX):
+                    if os.path.exists(path):
+                        os.remove(path)
+                        deleted = True
+                return deleted
         except Exception as e:
             print(f"Erreur lors de la suppression du fichier: {e}")
             return False
     
     def get_download_url(self, file_path, expires=3600):
-        """Retourne le chemin local du fichier pour le téléchargement."""
+        """Retourne le chemin local du fichier pour le téléchargement.
+        
+        None pour un fichier froid : il se lit décompressé à la volée par
+        stream(), sans repasser dans le niveau chaud (TieringJob en décide
+        d'après le nombre de consultations).
+        """
         try:
-            if not file_path.startswith("local://"):
-                raise ValueError("Le chemin du fichier doit commencer par 'local://'")
-                
-            filename = file_path.replace("local://", "")
-            full_path = os.path.join(self.storage_dir, filename)
-            
-            if os.path.exists(full_path):
-                return full_path
-            return None
+            full_path = self._full_path(file_path)
+            return full_path if os.path.exists(full_path) else None
         except Exception as e:
             print(f"Erreur lors de la récupération du chemin: {e}")
-            return None 
\ No newline at end of file
+            return None
+    
+    def size(self, file_path):
+        """Taille du contenu (décompressé pour un fichier froid), ou None si inconnue."""
+        full_path = self._full_path(file_path)
+        if os.path.exists(full_path):
+            return os.path.getsize(full_path)
+        if zstd is None:
+            return None
+        with open(full_path + COLD_SUFFIX, 'rb') as f:
+            # Taille d'origine inscrite dans l'en-tête de la trame (voir compress)
+            size = zstd.frame_content_size(f.read(18))
+        return size if size >= 0 else None
+    
+    def exists(self, file_path):
+        try:
+            return self._is_stored(self._full_path(file_path))
+        except Exception as e:
+            print(f"Erreur lors de la vérification du fichier {file_path}: {e}")
+            return False
+    
+    def stream(self, file_path, start=0, end=None):
+        """Itère sur les octets [start, end] du fichier, bloc par bloc."""
+        chunk_size = STORAGE_CONFIG["chunk_size"]
+        with self._open(self._full_path(file_path)) as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+    
+    def presign(self, file_path, download=False, expires=None):
+        """Lien signé vers le serveur de fichiers (voir file_server.py)."""
+        from file_server import get_file_url
+        return get_file_url(file_path, download=download, expires=expires)
+    
+    def get_local_copy(self, file_path):
+        full_path = self._full_path(file_path)
+        if os.path.exists(full_path):
+            return full_path, False
+        # Fichier froid : copie décompressée, sans le faire repasser dans le niveau chaud
+        fd, tmp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as out, self._open(full_path) as f:
+                shutil.copyfileobj(f, out, STORAGE_CONFIG["chunk_size"])
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, True
+    
+    def _set_niveau(self, file_path, niveau, reset_acces=False):
+        """Met à jour le niveau de stockage d'un fichier dans fichiers_acces."""
+        paths = list(self._reference_paths(file_path))
+        with get_pool(self.db_path).transaction() as conn:
+            conn.execute(f"""
+            UPDATE fichiers_acces
+            SET niveau = ?{", nb_acces = 0" if reset_acces else ""}
+            WHERE fichier_url IN ({", ".join("?" * len(paths))})
+            """, (niveau, *paths))
+    
+    def compress(self, file_path, level=None, min_gain=None):
+        """Fait passer un fichier dans le niveau froid (conteneur zstd).
+        
+        Retourne le nombre d'octets gagnés, ou None si le gain est inférieur à
+        min_gain (le fichier reste alors chaud et est marqué 'incompressible').
+        """
+        if zstd is None:
+            raise RuntimeError("Le module zstandard n'est pas installé")
+        config = STORAGE_CONFIG["cold_tier"]
+        level = level or config["level"]
+        min_gain = config["min_gain"] if min_gain is None else min_gain
+        
+        full_path = self._full_path(file_path)
+        if not os.path.exists(full_path) and os.path.exists(full_path + COLD_SUFFIX):
+            # Déjà froid (niveau en base en retard sur le disque)
+            self._set_niveau(file_path, "froid")
+            return 0
+        
+        size = os.path.getsize(full_path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(full_path, 'rb') as src:
+                zstd.ZstdCompressor(level=level, write_checksum=True).copy_stream(src, dst, size=size)
+                dst.flush()
+                os.fsync(dst.fileno())
+            compressed = os.path.getsize(tmp_path)
+            if compressed > size * (1 - min_gain):
+                os.remove(tmp_path)
+                self._set_niveau(file_path, "incompressible")
+                return None
+            
+            with self._lock:
+                if not os.path.exists(full_path):
+                    # Supprimé pendant la compression
+                    os.remove(tmp_path)
+                    return None
+                os.replace(tmp_path, full_path + COLD_SUFFIX)
+                self._fsync_dir(os.path.dirname(full_path))
+                os.remove(full_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # Les consultations sont recomptées depuis le passage au niveau froid
+        self._set_niveau(file_path, "froid", reset_acces=True)
+        return size - compressed
+    
+    def warm(self, file_path):
+        """Fait repasser un fichier froid dans le niveau chaud (décompression atomique)."""
+        full_path = self._full_path(file_path)
+        cold_path = full_path + COLD_SUFFIX
+        if os.path.exists(cold_path) and not os.path.exists(full_path):
+            fd, tmp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as out, self._open(full_path) as f:
+                    shutil.copyfileobj(f, out, STORAGE_CONFIG["chunk_size"])
+                    out.flush()
+                    os.fsync(out.fileno())
+                with self._lock:
+                    if os.path.exists(full_path) or not os.path.exists(cold_path):
+                        os.remove(tmp_path)
+                    else:
+                        os.replace(tmp_path, full_path)
+                        self._fsync_dir(os.path.dirname(full_path))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        with self._lock:
+            if os.path.exists(full_path) and os.path.exists(cold_path):
+                os.remove(cold_path)
+        self._set_niveau(file_path, "chaud")
+    
+    def migrate_layout(self, batch_size=500):
+        """Range les fichiers à plat dans leurs sous-dossiers et met à jour les chemins en base.
+        
+        Peut être interrompue et relancée : les anciens chemins restent résolus
+        tant que la base n'est pas à jour. Retourne (fichiers déplacés, mémoires mis à jour).
+        """
+        moved = 0
+        for entry in os.scandir(self.storage_dir):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            target = os.path.join(self.storage_dir, shard_path(entry.name))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with self._lock:
+                if os.path.exists(target):
+                    # Même nom, donc même contenu (SHA-256) : l'exemplaire à plat est superflu
+                    os.remove(entry.path)
+                else:
+                    os.replace(entry.path, target)
+            moved += 1
+        
+        # Réécriture des chemins par lots, une transaction par lot
+        updated = 0
+        pool = get_pool(self.db_path)
+        last_id = 0
+        while True:
+            with pool.connection() as conn:
+                rows = conn.execute("""
+                SELECT id, fichier_url FROM memoires
+                WHERE id > ? AND fichier_url LIKE 'local://%' AND instr(substr(fichier_url, 9), '/') = 0
+                ORDER BY id LIMIT ?
+                """, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            
+            renames = {url: f"local://{shard_path(url.replace('local://', ''))}" for _, url in rows}
+            with pool.transaction() as conn:
+                # Les statistiques d'accès suivent le fichier sous son nouveau chemin
+                conn.executemany("""
+                INSERT OR REPLACE INTO fichiers_acces (fichier_url, dernier_acces, nb_acces, niveau)
+                SELECT ?, dernier_acces, nb_acces, niveau FROM fichiers_acces WHERE fichier_url = ?
+                """, [(new, old) for old, new in renames.items()])
+                conn.executemany(
+                    "UPDATE memoires SET fichier_url = ? WHERE id = ?",
+                    [(renames[url], memoire_id) for memoire_id, url in rows]
+                )
+                for table in ("extraction_jobs", "import_lignes"):
+                    conn.executemany(
+                        f"UPDATE {table} SET fichier_url = ? WHERE fichier_url = ?",
+                        [(new, old) for old, new in renames.items()]
+                    )
+            updated += len(rows)
+            last_id = rows[-1][0]
+        
+        return moved, updated
+
+
+class StorageRouter:
+    """Dirige chaque opération vers le pilote correspondant au schéma de fichier_url.
+    
+    Les nouveaux fichiers sont écrits dans le pilote par défaut ; les fichiers
+    existants restent lisibles dans leur pilote d'origine.
+    """
+    
+    def __init__(self, backends, default):
+        self.backends = {backend.scheme: backend for backend in backends}
+        self.default = self.backends[default]
+    
+    def backend_for(self, file_path):
+        scheme = file_path.split("://", 1)[0] if file_path and "://" in file_path else None
+        backend = self.backends.get(scheme)
+        if backend is None:
+            raise ValueError(f"Stockage non pris en charge pour le fichier : {file_path}")
+        return backend
+    
+    def supports(self, file_path):
+        """Indique si un pilote est configuré pour ce chemin."""
+        try:
+            self.backend_for(file_path)
+            return True
+        except ValueError:
+            return False
+    
+    @property
+    def storage_dir(self):
+        return self.backends["local"].storage_dir
+    
+    def save_file(self, file_obj, filename):
+        return self.default.save_file(file_obj, filename)
+    
+    def save_stream(self, file_obj, filename):
+        return self.default.save_stream(file_obj, filename)
+    
+    def get_file(self, file_path):
+        try:
+            backend = self.backend_for(file_path)
+        except ValueError as e:
+            print(f"Erreur lors de la récupération du fichier {file_path}: {e}")
+            return None
+        return backend.get_file(file_path)
+    
+    def stream(self, file_path, start=0, end=None):
+        return self.backend_for(file_path).stream(file_path, start, end)
+    
+    def delete_file(self, file_path):
+        try:
+            backend = self.backend_for(file_path)
+        except ValueError as e:
+            print(f"Erreur lors de la suppression du fichier: {e}")
+            return False
+        return backend.delete_file(file_path)
+    
+    def exists(self, file_path):
+        return self.supports(file_path) and self.backend_for(file_path).exists(file_path)
+    
+    def presign(self, file_path, download=False, expires=None):
+        return self.backend_for(file_path).presign(file_path, download=download, expires=expires)
+    
+    def get_local_copy(self, file_path):
+        return self.backend_for(file_path).get_local_copy(file_path)
+    
+    def size(self, file_path):
+        return self.backend_for(file_path).size(file_path)
+    
+    def get_download_url(self, file_path, expires=3600):
+        if not self.supports(file_path):
+            return None
+        return self.backend_for(file_path).get_download_url(file_path, expires)
+    
+    def is_referenced(self, file_path):
+        return self.backend_for(file_path).is_referenced(file_path)
+    
+    def ensure_stored(self, file_path, source):
+        self.backend_for(file_path).ensure_stored(file_path, source)
+    
+    def record_access(self, file_path):
+        if self.supports(file_path):
+            self.backend_for(file_path).record_access(file_path)
+    
+    def flush_access(self):
+        return sum(backend.flush_access() for backend in self.backends.values())
+
+
+def create_storage(db_path=None):
+    """Construit le stockage de l'application d'après STORAGE_CONFIG."""
+    backends = [FileStorage(db_path)]
+    if STORAGE_CONFIG["s3"]["bucket"]:
+        from s3_storage import S3Storage, boto3
+        if boto3 is not None:
+            backends.append(S3Storage(db_path))
+        else:
+            print("! Stockage S3 désactivé : le module boto3 n'est pas installé")
+    default = STORAGE_CONFIG["backend"]
+    if default not in {backend.scheme for backend in backends}:
+        # Pilote demandé non configuré (S3 sans S3_BUCKET ou sans boto3) : les
+        # nouveaux fichiers restent en local plutôt que d'empêcher le démarrage
+        print(f"! Stockage '{default}' indisponible : les nouveaux fichiers seront stockés en local")
+        default = "local"
+    return StorageRouter(backends, default=default)
+
+
+class FileCache:
+    """Cache LRU du contenu des fichiers, borné par une taille totale en octets."""
+
+    def __init__(self, storage, max_bytes=FILE_CACHE_MAX_BYTES):
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, file_path):
+        """Retourne le contenu du fichier, lu depuis le stockage seulement en cas d'absence."""
+        with self._lock:
+            if file_path in self._entries:
+                self._entries.move_to_end(file_path)
+                content = self._entries[file_path]
+            else:
+                content = None
+        if content is not None:
+            # Une lecture servie par le cache reste une consultation du fichier
+            self.storage.record_access(file_path)
+            return content
+
+        content = self.storage.get_file(file_path)
+        if content is None or len(content) > self.max_bytes:
+            return content
+
+        with self._lock:
+            if file_path not in self._entries:
+                self._entries[file_path] = content
+                self._size += len(content)
+            # Évincer les fichiers les moins récemment utilisés
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return content
+
+    def invalidate(self, file_path):
+        """Retire un fichier du cache (après suppression ou remplacement)."""
+        with self._lock:
+            content = self._entries.pop(file_path, None)
+            if content is not None:
+                self._size -= len(content)
+
+
+if __name__ == "__main__":
+    # python storage.py : range les fichiers existants dans l'arborescence ab/cd/
+    from migrations import run_migrations
+    run_migrations()
+    moved, updated = FileStorage().migrate_layout()
+    print(f"✓ {moved} fichier(s) déplacé(s), {updated} mémoire(s) mis à jour")
@@ -0,0 +1,121 @@
+import atexit
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from config import STORAGE_CONFIG
+from db_pool import get_pool
+from migrations import run_migrations
+from storage import FileStorage, zstd
+
+
+class TieringJob:
+    """Déplace en arrière-plan les fichiers locaux entre niveau chaud et niveau froid.
+
+    Un fichier sans consultation depuis after_days est recompressé en zstd ; un
+    fichier froid consulté rewarm_after fois depuis son passage au froid est
+    décompressé. Les mémoires récents restent donc servis tels quels.
+    """
+
+    def __init__(self, storage, db_path=None, config=None):
+        self.storage = storage
+        self.pool = get_pool(db_path)
+        self.config = config or STORAGE_CONFIG["cold_tier"]
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _candidates(self, niveau, condition, params):
+        """Parcourt par lots les fichiers locaux d'un niveau qui vérifient la condition."""
+        last = ("", "")
+        while not self._stop.is_set():
+            with self.pool.connection() as conn:
+                rows = conn.execute(f"""
+                SELECT dernier_acces, fichier_url FROM fichiers_acces
+                WHERE niveau = ? AND fichier_url LIKE 'local://%' AND {condition}
+                  AND (dernier_acces, fichier_url) > (?, ?)
+                ORDER BY dernier_acces, fichier_url
+                LIMIT ?
+                """, (niveau, *params, *last, self.config["batch_size"])).fetchall()
+            if not rows:
+                return
+            for _, fichier_url in rows:
+                yield fichier_url
+            last = tuple(rows[-1])
+
+    def run_once(self):
+        """Effectue un passage complet et retourne son bilan."""
+        self.storage.flush_access()
+        report = {"compresses": 0, "rechauffes": 0, "incompressibles": 0, "octets_gagnes": 0, "erreurs": []}
+
+        for fichier_url in list(self._candidates("froid", "nb_acces >= ?", (self.config["rewarm_after"],))):
+            try:
+                self.storage.warm(fichier_url)
+                report["rechauffes"] += 1
+            except Exception as e:
+                report["erreurs"].append(f"{fichier_url}: {e}")
+
+        limite = (datetime.now() - timedelta(days=self.config["after_days"])).strftime("%Y-%m-%d %H:%M:%S")
+        for fichier_url in list(self._candidates("chaud", "dernier_acces < ?", (limite,))):
+            try:
+                gain = self.storage.compress(fichier_url, self.config["level"], self.config["min_gain"])
+                if gain is None:
+                    report["incompressibles"] += 1
+                else:
+                    report["compresses"] += 1
+                    report["octets_gagnes"] += gain
+            except Exception as e:
+                report["erreurs"].append(f"{fichier_url}: {e}")
+        return report
+
+    def _loop(self):
+        while not self._stop.wait(self.config["interval"]):
+            try:
+                report = self.run_once()
+                if report["compresses"] or report["rechauffes"]:
+                    print(
+                        f"✓ Niveau froid : {report['compresses']} fichier(s) compressé(s), "
+                        f"{report['rechauffes']} réchauffé(s), "
+                        f"{report['octets_gagnes'] // (1024 * 1024)} MB gagnés"
+                    )
+                for erreur in report["erreurs"]:
+                    print(f"Erreur lors du changement de niveau de {erreur}")
+            except Exception as e:
+                print(f"Erreur lors du passage du niveau froid: {e}")
+
+    def start(self):
+        """Démarre le passage périodique (une seule fois par instance)."""
+        with self._lock:
+            if self._thread is not None:
+                return True
+            if not self.config["enabled"]:
+                return False
+            if zstd is None:
+                print("Niveau froid désactivé : le module zstandard n'est pas installé")
+                return False
+
+            self.storage.track_access = True
+            atexit.register(self.storage.flush_access)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+            print("✓ Niveau froid du stockage activé")
+            return True
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    # python tiering.py [chemin_de_la_base] : un passage immédiat
+    db_path = sys.argv[1] if len(sys.argv) > 1 else None
+    run_migrations(db_path)
+    report = TieringJob(FileStorage(db_path), db_path).run_once()
+    for erreur in report["erreurs"]:
+        print(f"! {erreur}")
+    print(
+        f"✓ {report['compresses']} fichier(s) compressé(s), {report['rechauffes']} réchauffé(s), "
+        f"{report['incompressibles']} incompressible(s), {report['octets_gagnes']} octets gagnés"
+    )
@@ -0,0 +1,466 @@
+import atexit
+import os
+import secrets
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from backup_scheduler import BackupScheduler
+from config import BACKUP_CONFIG, WAL_SHIPPING_CONFIG
+from db_pool import get_pool
+
+WAL_HEADER_SIZE = 32
+FRAME_HEADER_SIZE = 24
+WAL_INDEX_HEADER_SIZE = 48
+# Horodatage des générations et des segments (l'ordre alphabétique suit l'ordre chronologique)
+STAMP_FORMAT = "%Y%m%dT%H%M%S"
+
+
+def read_wal_header(wal_path):
+    """Lit l'en-tête du fichier WAL ; None s'il est absent ou vide."""
+    try:
+        with open(wal_path, "rb") as wal:
+            data = wal.read(WAL_HEADER_SIZE)
+    except FileNotFoundError:
+        return None
+    if len(data) < WAL_HEADER_SIZE:
+        return None
+    _, _, page_size, checkpoint_seq, salt1, salt2 = struct.unpack(">6I", data[:24])
+    return {"page_size": page_size, "salts": data[16:24], "cycle": (salt1, salt2, checkpoint_seq)}
+
+
+def read_wal_index(shm_path):
+    """Lit l'en-tête de l'index du WAL (fichier -shm, format documenté par SQLite).
+
+    Retourne (dernière trame validée, sels du WAL) ; None si l'index est absent
+    ou en cours de modification. À lire pendant que les écritures sont bloquées.
+    """
+    try:
+        with open(shm_path, "rb") as shm:
+            data = shm.read(2 * WAL_INDEX_HEADER_SIZE)
+    except FileNotFoundError:
+        return None
+    # Deux copies identiques de l'en-tête, marqué initialisé
+    if len(data) < 2 * WAL_INDEX_HEADER_SIZE or data[:WAL_INDEX_HEADER_SIZE] != data[WAL_INDEX_HEADER_SIZE:] or not data[12]:
+        return None
+    mx_frame, = struct.unpack("=I", data[16:20])
+    return mx_frame, data[32:40]
+
+
+def compact_frames(data, frame_size, salts):
+    """Ne garde que la dernière version de chaque page, comme un checkpoint.
+
+    La dernière trame porte la taille finale de la base. Retourne None si une
+    trame n'appartient pas au cycle du WAL (sels différents).
+    """
+    latest = {}
+    db_pages = 0
+    for offset in range(0, len(data), frame_size):
+        if data[offset + 8:offset + 16] != salts:
+            return None
+        page_number, commit_pages = struct.unpack(">II", data[offset:offset + 8])
+        latest[page_number] = offset
+        if commit_pages:
+            db_pages = commit_pages
+    pages = [page_number for page_number in sorted(latest) if page_number <= db_pages]
+    return b"".join(
+        struct.pack(">II", page_number, db_pages if i == len(pages) - 1 else 0)
+        + data[latest[page_number] + 8:latest[page_number] + frame_size]
+        for i, page_number in enumerate(pages)
+    )
+
+
+class LocalReplica:
+    """Destination des sauvegardes continues dans un dossier local."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def put_file(self, name, local_path):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(local_path, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def put_bytes(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def get_file(self, name, local_path):
+        shutil.copyfile(self._path(name), local_path)
+
+    def size(self, name):
+        return os.path.getsize(self._path(name))
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def get_bytes(self, name):
+        with open(self._path(name), "rb") as f:
+            return f.read()
+
+    def list(self, prefix):
+        """Noms (chemins relatifs) des fichiers sous prefix, triés."""
+        names = []
+        for directory, _, files in os.walk(self._path(prefix)):
+            for filename in files:
+                if not filename.endswith(".tmp"):
+                    path = os.path.relpath(os.path.join(directory, filename), self.root)
+                    names.append(path.replace(os.sep, "/"))
+        return sorted(names)
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(self._path(prefix), ignore_errors=True)
+
+
+class S3Replica:
+    """Destination des sauvegardes continues dans un bucket S3 (client boto3 fourni)."""
+
+    def __init__(self, client, bucket, prefix=""):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def put_file(self, name, local_path):
+        self.client.upload_file(local_path, self.bucket, self.prefix + name)
+
+    def put_bytes(self, name, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + name, Body=data)
+
+    def get_file(self, name, local_path):
+        self.client.download_file(self.bucket, self.prefix + name, local_path)
+
+    def get_bytes(self, name):
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + name)["Body"].read()
+
+    def list(self, prefix):
+        names = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            names.extend(item["Key"][len(self.prefix):] for item in page.get("Contents", []))
+        return sorted(names)
+
+    def delete_prefix(self, prefix):
+        keys = [{"Key": self.prefix + name} for name in self.list(prefix)]
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys[start:start + 1000]})
+
+
+def list_generations(replica):
+    """Générations de la réplique, de la plus ancienne à la plus récente."""
+    return sorted({name.split("/")[1] for name in replica.list("generations/")})
+
+
+def restore_replica(replica, dest_path, point_in_time=None):
+    """Reconstruit la base depuis la réplique : instantané puis segments du WAL.
+
+    point_in_time (datetime) : état au dernier envoi antérieur ou égal à cette
+    date ; None pour l'état le plus récent. Retourne la date de l'état restauré.
+    """
+    limite = point_in_time.strftime(STAMP_FORMAT) if point_in_time else None
+    generations = [
+        generation for generation in list_generations(replica)
+        if limite is None or generation.split("-")[0] <= limite
+    ]
+    if not generations:
+        raise ValueError("Aucune sauvegarde continue antérieure à cette date")
+    generation = generations[-1]
+
+    tmp_path = dest_path + ".tmp"
+    replica.get_file(f"generations/{generation}/snapshot.sqlite", tmp_path)
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            conn.close()
+
+        # Rejouer les trames comme le ferait un checkpoint, puis tronquer à la taille finale
+        restored_at = generation.split("-")[0]
+        frame_size = FRAME_HEADER_SIZE + page_size
+        db_pages = None
+        with open(tmp_path, "r+b") as db:
+            for seq, name in enumerate(replica.list(f"generations/{generation}/wal/")):
+                numero, stamp = name.rsplit("/", 1)[1][:-len(".wal")].split("_")
+                # Segment manquant (perdu avant son envoi) : les suivants ne s'appliquent plus
+                if int(numero) != seq or (limite is not None and stamp > limite):
+                    break
+                data = replica.get_bytes(name)
+                for offset in range(0, len(data), frame_size):
+                    page_number, commit_pages = struct.unpack(">II", data[offset:offset + 8])
+                    db.seek((page_number - 1) * page_size)
+                    db.write(data[offset + FRAME_HEADER_SIZE:offset + frame_size])
+                    if commit_pages:
+                        db_pages = commit_pages
+                restored_at = stamp
+            if db_pages is not None:
+                db.truncate(db_pages * page_size)
+            db.flush()
+            os.fsync(db.fileno())
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return datetime.strptime(restored_at, STAMP_FORMAT)
+
+
+class WalShipper:
+    """Sauvegarde continue : envoie à la réplique les trames du WAL validées depuis
+    le dernier passage, au lieu de recopier toute la base.
+
+    Une génération commence par un instantané complet, suivi de segments de WAL
+    numérotés et horodatés (restauration à une date, voir restore_replica) ; un
+    segment ne garde que la dernière version de chaque page modifiée.
+    L'envoi se charge lui-même des checkpoints (wal_autocheckpoint=0 sur les
+    connexions du pool) : une trame n'est jamais effacée du WAL avant d'avoir été
+    copiée, même par le checkpoint d'un autre processus (voir _open_pin). Si la
+    continuité ne peut pas être garantie (redémarrage de l'application), une
+    nouvelle génération est commencée.
+    Les segments sont d'abord écrits dans un dossier d'attente à côté de la base,
+    puis envoyés dans l'ordre : une réplique indisponible ne fait rien perdre,
+    même en cas d'arrêt brutal. Si l'attente dépasse max_spool_bytes, ses
+    segments sont abandonnés et une nouvelle génération est commencée.
+    """
+
+    def __init__(self, db_path, replica, config=None):
+        self.pool = get_pool(db_path)
+        self.wal_path = self.pool.db_path + "-wal"
+        self.shm_path = self.pool.db_path + "-shm"
+        self.replica = replica
+        self.config = config or WAL_SHIPPING_CONFIG
+        self.generation = None
+        self._generation_started = 0
+        self._cycle = None  # (salt1, salt2, séquence de checkpoint) du WAL suivi
+        self._frame = 0  # Trames du cycle courant déjà copiées
+        self._seq = 0
+        # Segments copiés, pas encore envoyés (y compris ceux d'une exécution précédente)
+        self.spool = LocalReplica(self.pool.db_path + "-spool")
+        self._spooled = sum(self.spool.size(name) for name in self.spool.list("generations/"))
+        self._pin = None  # Lecture ouverte sur le dernier état copié (voir _open_pin)
+        self._lock = threading.Lock()
+        self._started = False
+        # Envois périodiques : ignorés si la base n'a pas changé, retentés en cas d'échec
+        self.scheduler = BackupScheduler(self.pool.db_path, self.ship, self.config)
+
+    def _take_over_checkpoints(self):
+        """Désactive les checkpoints automatiques des connexions du pool."""
+        if self.pool.pragmas.get("wal_autocheckpoint") != 0:
+            self.pool.pragmas["wal_autocheckpoint"] = 0
+            # Les connexions existantes sont remplacées à leur retour au pool
+            self.pool.close_all()
+
+    def _open_pin(self):
+        """Ouvre une transaction de lecture sur l'état courant de la base.
+
+        Tant qu'elle reste ouverte, aucun checkpoint (de ce processus ou d'un
+        autre) ne peut reporter dans la base des trames plus récentes, ni donc
+        les effacer du WAL avant qu'elles aient été copiées. Connexion dédiée :
+        elle n'immobilise pas une connexion du pool entre deux passages.
+        """
+        pin = sqlite3.connect(self.pool.db_path, isolation_level=None, check_same_thread=False)
+        pin.execute("BEGIN")
+        pin.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        return pin
+
+    def _set_pin(self, pin):
+        if self._pin is not None:
+            self._pin.close()
+        self._pin = pin
+
+    def _read_state(self):
+        """(dernière trame validée, sels de l'index, en-tête du WAL), écritures bloquées."""
+        index = read_wal_index(self.shm_path)
+        if index is None:
+            raise RuntimeError("La base n'est pas en mode WAL")
+        return index[0], index[1], read_wal_header(self.wal_path)
+
+    def _collect(self, log, salts, header):
+        """Met en attente les trames validées depuis le dernier passage, jusqu'à log.
+
+        Retourne False si elles ne prolongent pas de façon certaine la génération
+        courante (une nouvelle génération doit alors être commencée).
+        """
+        if log == 0:
+            # WAL remis à zéro après un checkpoint complet : tout avait été copié
+            self._cycle, self._frame = None, 0
+            return True
+        if header is None or header["salts"] != salts:
+            return False
+        if header["cycle"] != self._cycle:
+            # Nouveau cycle : seulement s'il suit directement le cycle copié
+            if self._cycle is not None and header["cycle"][2] != self._cycle[2] + 1:
+                return False
+            self._cycle, self._frame = header["cycle"], 0
+        if log < self._frame:
+            return False
+        if log > self._frame:
+            frame_size = FRAME_HEADER_SIZE + header["page_size"]
+            with open(self.wal_path, "rb") as wal:
+                wal.seek(WAL_HEADER_SIZE + self._frame * frame_size)
+                data = wal.read((log - self._frame) * frame_size)
+            if len(data) != (log - self._frame) * frame_size:
+                return False
+            segment = compact_frames(data, frame_size, salts)
+            if segment is None:
+                return False
+            stamp = datetime.now().strftime(STAMP_FORMAT)
+            # Écrit sur disque avant que le checkpoint efface ces trames du WAL
+            self.spool.put_bytes(f"generations/{self.generation}/wal/{self._seq:010d}_{stamp}.wal", segment)
+            self._spooled += len(segment)
+            self._seq += 1
+            self._frame = log
+        return True
+
+    def ship(self):
+        """Copie et envoie les transactions validées depuis le dernier passage.
+
+        La copie des nouvelles trames et le gros du checkpoint se font sans bloquer
+        les écritures. Celles-ci ne sont suspendues que pour lire l'index du WAL,
+        puis pour rattraper les trames écrites entre-temps et terminer le
+        checkpoint. Retourne le nombre d'octets envoyés.
+        """
+        with self._lock:
+            self._take_over_checkpoints()
+            sent = 0
+            with self.pool.connection() as writer, self.pool.connection() as checkpointer:
+                writer.execute("BEGIN IMMEDIATE")
+                try:
+                    log, salts, header = self._read_state()
+                    pin = self._open_pin()
+                finally:
+                    writer.rollback()
+                try:
+                    due = self.generation is None or time.time() - self._generation_started > self.config["snapshot_interval"]
+                    if due or not self._collect(log, salts, header):
+                        sent += self._new_generation(pin, header, log)
+                except Exception:
+                    pin.close()
+                    raise
+                # Checkpoint limité par le nouveau point d'arrêt aux trames copiées
+                self._set_pin(pin)
+                checkpointer.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+
+                writer.execute("BEGIN IMMEDIATE")
+                try:
+                    log, salts, header = self._read_state()
+                    collected = self._collect(log, salts, header)
+                    if collected:
+                        checkpointer.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                    # WAL entièrement reporté : le point d'arrêt n'empêche pas sa remise à zéro
+                    pin = self._open_pin()
+                finally:
+                    writer.rollback()
+                if not collected:
+                    try:
+                        sent += self._new_generation(pin, header, log)
+                    except Exception:
+                        pin.close()
+                        raise
+                self._set_pin(pin)
+            try:
+                return sent + self._upload_pending()
+            finally:
+                if self._spooled > self.config["max_spool_bytes"]:
+                    self._drop_spool()
+
+    def _upload_pending(self):
+        """Envoie les segments en attente dans l'ordre ; s'arrête au premier échec."""
+        sent = 0
+        for name in self.spool.list("generations/"):
+            data = self.spool.get_bytes(name)
+            self.replica.put_bytes(name, data)
+            self.spool.delete(name)
+            self._spooled -= len(data)
+            sent += len(data)
+        return sent
+
+    def _drop_spool(self):
+        """Abandonne les segments en attente ; la génération courante s'arrête au
+        dernier segment envoyé et la suivante repart d'un instantané complet."""
+        print(
+            f"! Sauvegarde continue : réplique indisponible, {self._spooled / (1024 * 1024):.1f} MB "
+            "de segments abandonnés, nouvelle génération au prochain envoi"
+        )
+        self.spool.delete_prefix("generations/")
+        self._spooled = 0
+        self.generation = None
+
+    def _new_generation(self, reader, header, log):
+        """Commence une génération par un instantané exactement aligné sur le WAL.
+
+        reader est une transaction de lecture ouverte sur l'état de la trame log ;
+        les écritures de l'application ont déjà repris. Retourne la taille envoyée.
+        """
+        generation = f"{datetime.now().strftime(STAMP_FORMAT)}-{secrets.token_hex(4)}"
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.pool.db_path), suffix=".snapshot.tmp")
+        os.close(fd)
+        try:
+            dest = sqlite3.connect(tmp_path)
+            try:
+                reader.backup(
+                    dest,
+                    pages=BACKUP_CONFIG["pages_per_step"],
+                    progress=lambda status, remaining, total: time.sleep(BACKUP_CONFIG["step_sleep"])
+                )
+                dest.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                dest.close()
+            self.replica.put_file(f"generations/{generation}/snapshot.sqlite", tmp_path)
+            size = os.path.getsize(tmp_path)
+        finally:
+            os.remove(tmp_path)
+
+        self.generation = generation
+        self._generation_started = time.time()
+        self._cycle = header["cycle"] if header and log > 0 else None
+        self._frame = log if log > 0 else 0
+        self._seq = 0
+        print(f"✓ Sauvegarde continue : nouvelle génération {generation}")
+        self._prune_generations()
+        return size
+
+    def _prune_generations(self):
+        for generation in list_generations(self.replica)[:-self.config["max_generations"]]:
+            self.replica.delete_prefix(f"generations/{generation}/")
+            self.spool.delete_prefix(f"generations/{generation}/")
+
+    def _final_ship(self):
+        try:
+            self.ship()
+        except Exception as e:
+            print(f"Erreur lors de la dernière sauvegarde continue: {e}")
+
+    def start(self):
+        """Démarre l'envoi périodique (une seule fois par instance)."""
+        with self._lock:
+            if self._started:
+                return True
+            if not self.config["enabled"]:
+                return False
+            self._started = True
+            self.scheduler.start()
+        atexit.register(self._final_ship)
+        print("✓ Sauvegarde continue du WAL activée")
+        return True
+
+    def stop(self):
+        self.scheduler.stop()
+        with self._lock:
+            self._started = False
+            self._set_pin(None)